@@ -9,16 +9,23 @@ Created on Sun Dec 21 23:52:23 2025
 import os
 import streamlit as st
 
+from general_tools.credentials import credentials_from_session
+from general_tools.agent_cache import start_warmup
+
 st.set_page_config(page_title="Services", layout="centered")
 st.title("Service Portal")
 
 # -------------------------------------------------
 # SESSION GUARD (authoritative source = session_state)
 # -------------------------------------------------
+# The OpenAI / BioPortal keys stay in session_state only; the service pages
+# hand them to the agents per session (general_tools/credentials.py), so
+# parallel sessions never see each other's keys. LangSmith tracing is
+# configured per process by the LangSmith client, so it still goes through
+# the environment.
 if "OPENAI_API_KEY" not in st.session_state:
     # Ensure no leaked env vars exist at session start
     for k in [
-        "OPENAI_API_KEY",
         "LANGSMITH_API_KEY",
         "LANGSMITH_TRACING",
         "LANGSMITH_PROJECT",
@@ -26,9 +33,7 @@ if "OPENAI_API_KEY" not in st.session_state:
     ]:
         os.environ.pop(k, None)
 else:
-    # Sync env vars from session (in case of rerun)
-    os.environ["OPENAI_API_KEY"] = st.session_state["OPENAI_API_KEY"]
-
+    # Sync tracing env vars from session (in case of rerun)
     if st.session_state.get("LANGSMITH_API_KEY"):
         os.environ["LANGSMITH_API_KEY"] = st.session_state["LANGSMITH_API_KEY"]
         os.environ["LANGSMITH_TRACING"] = "true"
@@ -67,22 +72,22 @@ with col_save:
         st.session_state["OPENAI_API_KEY"] = openai_key
         st.session_state["LANGSMITH_API_KEY"] = langsmith_key
 
-        # Set environment variables
-        os.environ["OPENAI_API_KEY"] = openai_key
-
+        # Tracing is process level (see above)
         if langsmith_key:
             os.environ["LANGSMITH_API_KEY"] = langsmith_key
             os.environ["LANGSMITH_TRACING"] = "true"
             os.environ["LANGSMITH_PROJECT"] = "KIDA_data"
             os.environ["LANGSMITH_ENDPOINT"] = "https://eu.api.smith.langchain.com"
 
+        # Build the Wikidata agent in the background while the user picks a service
+        start_warmup(credentials_from_session(st.session_state))
+
         st.success("Keys saved for this session.")
 
 with col_clear:
     if st.button("Clear keys", use_container_width=True):
         st.session_state.clear()
         for k in [
-            "OPENAI_API_KEY",
             "LANGSMITH_API_KEY",
             "LANGSMITH_TRACING",
             "LANGSMITH_PROJECT",
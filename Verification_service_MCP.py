@@ -13,104 +13,33 @@ This version calls classify_skos_match through the MCP server tool
 defined in mcp_skos_server.py (classify_skos_match_tool).
 """
 
-import os
-import sys
-import json
-import asyncio
 import streamlit as st
 
-from mcp import ClientSession
-from mcp.client.stdio import stdio_client, StdioServerParameters
+from general_tools.credentials import credentials_from_session, set_credentials, current_credentials
+from general_tools.mcp_skos_client import get_mcp_pool
 
 
 # ---------- MCP client helper ----------
-def _extract_tool_payload(tool_result):
+def classify_skos_match_via_mcp(term_a: str, gen_def: str, term_b: str, onto_def: str):
     """
-    MCP tool calls often return an object whose `content` is a LIST of items.
-    Those items may be TextContent objects (with `.text`) or dict-like objects.
+    Calls MCP tool `classify_skos_match_tool` of mcp_skos_server.py.
 
-    We try to recover a dict like: {"mapping_type": "...", "explanation": "..."}.
-    """
-    # Case 1: already a dict
-    if isinstance(tool_result, dict):
-        return tool_result
-
-    # Case 2: has `.content`
-    content = getattr(tool_result, "content", None)
-    if content is None:
-        # fallback: string
-        return {"mapping_type": "none", "explanation": str(tool_result)}
-
-    # Many SDKs: content is a list
-    if isinstance(content, list) and len(content) > 0:
-        first = content[0]
-
-        # If it's a dict already
-        if isinstance(first, dict):
-            return first
-
-        # If it has `.text` (TextContent)
-        text = getattr(first, "text", None)
-        if isinstance(text, str):
-            # sometimes the tool returns JSON as text
-            try:
-                parsed = json.loads(text)
-                if isinstance(parsed, dict):
-                    return parsed
-            except Exception:
-                return {"mapping_type": "none", "explanation": text}
-
-        # Fallback: stringify first block
-        return {"mapping_type": "none", "explanation": str(first)}
-
-    # Case 3: content isn’t a list
-    if isinstance(content, dict):
-        return content
-
-    return {"mapping_type": "none", "explanation": str(tool_result)}
-
-
-async def _classify_skos_match_via_mcp_async(term_a: str, gen_def: str, term_b: str, onto_def: str):
+    The server subprocess and MCP session are kept open between clicks (one
+    per OpenAI key, see general_tools/mcp_skos_client.py), so only the first
+    call pays the server start-up and handshake.
     """
-    Calls MCP tool `classify_skos_match_tool` by spawning the MCP server
-    as a subprocess using stdio transport.
-    """
-
-    # IMPORTANT: In this MCP version, stdio_client expects StdioServerParameters
-    params = StdioServerParameters(
-        command=sys.executable,                 # use same Python as Streamlit (conda-safe)
-        args=["mcp_skos_server.py"],
-        env={**os.environ},                     # pass OPENAI_API_KEY etc. through
+    return get_mcp_pool().classify_skos_match(
+        term_a, gen_def, term_b, onto_def, creds=current_credentials()
     )
 
-    async with stdio_client(params) as (read, write):
-        async with ClientSession(read, write) as session:
-            await session.initialize()
-
-            tool_result = await session.call_tool(
-                "classify_skos_match_tool",
-                {
-                    "term_a": term_a,
-                    "gen_def": gen_def,
-                    "term_b": term_b,
-                    "onto_def": onto_def,
-                },
-            )
-
-            return _extract_tool_payload(tool_result)
-
-
-def classify_skos_match_via_mcp(term_a: str, gen_def: str, term_b: str, onto_def: str):
-    """
-    Sync wrapper for Streamlit callbacks.
-    """
-    return asyncio.run(_classify_skos_match_via_mcp_async(term_a, gen_def, term_b, onto_def))
-
 
 # ---------- Streamlit UI ----------
 st.set_page_config(page_title="Verification service", layout="centered")
 st.title("Verification service")
 
+# OpenAI key of this session (see Home.py)
+set_credentials(credentials_from_session(st.session_state))
+
 # Back button
 if st.button("← Back to Home"):
     st.switch_page("Home.py")
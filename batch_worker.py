@@ -0,0 +1,112 @@
+# batch_worker.py
+#
+# Background worker for batch mapping jobs. The Mapping page (option "Run in
+# background worker") only stores the job in the SQLite job store
+# (general_tools/job_store.py); workers claim chunks of its rows, map them with
+# the batch engine and write every finished row back to the store.
+#
+# Run from the repository root (the agents read auxiliary_files/ from cwd):
+#
+#   python batch_worker.py                  # one worker process
+#   python batch_worker.py --processes 4    # four worker processes
+#
+# More workers (also on other terminals, sharing the same MAPPING_JOBS_DB)
+# simply claim more chunks. API keys are read from the environment of the
+# worker (OPENAI_API_KEY, BIOPORTAL_API_KEY); they are never stored in the
+# job database.
+
+import os
+import time
+import socket
+import logging
+import argparse
+import multiprocessing
+
+from general_tools.agent_cache import get_agent
+from general_tools.batch_engine import BatchRunner
+from general_tools.job_store import JobStore, runner_options
+from general_tools.result_cache import get_result_cache
+
+logger = logging.getLogger("batch_worker")
+
+
+class Worker:
+    def __init__(self, store: JobStore, name: str, chunk_size: int = 8, lease_seconds: float = 1800.0):
+        self.store = store
+        self.name = name
+        self.chunk_size = chunk_size
+        self.lease_seconds = lease_seconds
+        self.cache = get_result_cache()
+
+    def run_once(self) -> int:
+        """Claim and map one chunk of rows; returns the number of rows mapped."""
+        job, items = self.store.claim_rows(self.name, limit=self.chunk_size, lease_seconds=self.lease_seconds)
+        if not items:
+            return 0
+
+        job_id, cfg = job["job_id"], job["config"]
+        runner = BatchRunner(
+            agents={
+                # one agent per endpoint for all jobs; the ontology lists of the job go with each question
+                endpoint: get_agent(endpoint, parallel_multiagent=bool(cfg.get("parallel_multiagent")))
+                for endpoint in {item.endpoint for item in items if item.engine == "Agent"}
+            },
+            cache=self.cache,
+            **runner_options(cfg),
+        )
+        logger.info("%s: job %s, mapping %d row(s)", self.name, job_id, len(items))
+        runner.run(items, on_result=lambda i, item, out: self.store.save_result(job_id, item.key, out))
+        status = self.store.finish_job(job_id)
+        logger.info("%s: job %s is %s", self.name, job_id, status)
+        return len(items)
+
+    def run_forever(self, poll_seconds: float = 2.0, exit_when_idle: bool = False):
+        while True:
+            if self.run_once():
+                continue
+            if exit_when_idle:
+                return
+            time.sleep(poll_seconds)
+
+
+def _worker_main(n: int, args):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    name = f"{socket.gethostname()}:{os.getpid()}:{n}"
+    worker = Worker(JobStore(args.db), name, chunk_size=args.chunk_size, lease_seconds=args.lease_seconds)
+    try:
+        worker.run_forever(poll_seconds=args.poll, exit_when_idle=args.exit_when_idle)
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Background worker for batch mapping jobs.")
+    parser.add_argument("--db", default=None, help="Job database (default: MAPPING_JOBS_DB or mapping_jobs.sqlite3 in the user cache dir)")
+    parser.add_argument("--processes", type=int, default=1, help="Number of worker processes to start")
+    parser.add_argument("--chunk-size", type=int, default=8, help="Rows claimed per round")
+    parser.add_argument("--lease-seconds", type=float, default=1800.0,
+                        help="Rows of a worker that does not report back within this time are handed out again")
+    parser.add_argument("--poll", type=float, default=2.0, help="Seconds between polls when idle")
+    parser.add_argument("--exit-when-idle", action="store_true", help="Stop once no job has rows left")
+    args = parser.parse_args()
+
+    if not os.environ.get("OPENAI_API_KEY"):
+        raise SystemExit("OPENAI_API_KEY is not set (expected env var).")
+
+    if args.processes <= 1:
+        _worker_main(0, args)
+        return
+
+    procs = [multiprocessing.Process(target=_worker_main, args=(n, args)) for n in range(args.processes)]
+    for p in procs:
+        p.start()
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        for p in procs:
+            p.join()
+
+
+if __name__ == "__main__":
+    main()
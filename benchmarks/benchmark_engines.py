@@ -0,0 +1,152 @@
+# Benchmark the mapping engines (Agent / Pipeline / Retrieve-rank) against each
+# other for latency, tokens and accuracy.
+#
+# Run from the repository root (the modules read auxiliary_files/ from cwd):
+#
+#   python -m benchmarks.benchmark_engines --endpoint Wikidata --limit 10
+#
+# Input: any xlsx/csv with the columns Term, Definition and optionally
+# Expected_IRI / Expected_SKOS (or exactMatch_link, closeMatch_link,
+# relatedMatch_link as in the training spreadsheet). The default is a held-out
+# test table: the training spreadsheet is where the SKOS examples of the
+# prompts come from, so accuracy measured on it is too optimistic. Terms
+# without an expected identifier count for latency and tokens only.
+#
+# Needs OPENAI_API_KEY (and BIOPORTAL_API_KEY for BioPortal / Multiagent).
+
+import argparse
+import os
+import statistics
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+from langchain_core.callbacks import get_usage_metadata_callback
+
+from general_tools.batch_engine import build_agent
+from general_tools.mapping_engine import ENGINES, ENDPOINTS, map_term
+
+DEFAULT_INPUT = Path(__file__).resolve().parent.parent / "auxiliary_files" / "Bioportal_and_wiki_test_multiple.xlsx"
+
+
+def load_cases(path: Path) -> List[Dict[str, object]]:
+    """
+    Returns [{"term", "definition", "expected": {iri: skos, ...}}, ...].
+    """
+    df = pd.read_csv(path) if path.suffix.lower() == ".csv" else pd.read_excel(path)
+    cases = []
+    for row in df.to_dict("records"):
+        term = row.get("Term", row.get("term"))
+        definition = row.get("Definition", row.get("definition"))
+        if pd.isna(term):
+            continue
+
+        expected: Dict[str, str] = {}
+        for col, skos in [("exactMatch_link", "exact"), ("closeMatch_link", "close"), ("relatedMatch_link", "related")]:
+            if col in row and not pd.isna(row[col]):
+                expected[str(row[col]).strip()] = skos
+        if "Expected_IRI" in row and not pd.isna(row["Expected_IRI"]):
+            skos = row.get("Expected_SKOS")
+            expected[str(row["Expected_IRI"]).strip()] = "" if pd.isna(skos) else str(skos).strip().lower()
+
+        cases.append({"term": str(term), "definition": "" if pd.isna(definition) else str(definition), "expected": expected})
+    return cases
+
+
+def score(row: Dict[str, str], expected: Dict[str, str]) -> Tuple[Optional[bool], Optional[bool]]:
+    """(identifier hit, identifier + SKOS class hit); (None, None) without expected identifiers"""
+    if not expected:
+        return None, None
+    iri = (row.get("IRI") or "").strip()
+    if iri not in expected:
+        return False, False
+    exp_skos = expected[iri]
+    return True, (not exp_skos) or exp_skos == (row.get("SKOS") or "").strip().lower()
+
+
+def run_benchmark(cases, endpoint: str, engines: List[str], trusted: List[str], term_onts: List[str]) -> pd.DataFrame:
+    records = []
+    for engine in engines:
+        agent = build_agent(endpoint) if engine == "Agent" else None
+        for case in cases:
+            start = time.perf_counter()
+            with get_usage_metadata_callback() as usage_cb:
+                try:
+                    row = map_term(endpoint, case["term"], case["definition"], engine=engine, agent=agent,
+                                   term_onts=term_onts, trusted_onts=trusted)
+                except Exception as e:
+                    row = {"IRI": "", "SKOS": "", "explanation": f"ERROR: {e}", "status": "error"}
+            seconds = time.perf_counter() - start
+
+            usage = usage_cb.usage_metadata or {}
+            tokens = sum(int(u.get("total_tokens", 0) or 0) for u in usage.values())
+            stats = row.get("stats") or {}
+            id_hit, skos_hit = score(row, case["expected"])
+
+            records.append({
+                "engine": engine,
+                "term": case["term"],
+                "IRI": row.get("IRI", ""),
+                "SKOS": row.get("SKOS", ""),
+                "status": row.get("status", "ok"),
+                "seconds": round(seconds, 2),
+                "tokens": tokens,
+                "tool_calls": stats.get("tool_calls", ""),
+                "id_correct": id_hit,
+                "id_and_skos_correct": skos_hit,
+            })
+            print(f"[{engine}] {case['term']}: {row.get('IRI', '')} ({row.get('SKOS', '')}) {seconds:.1f}s {tokens} tok")
+    return pd.DataFrame(records)
+
+
+def _accuracy(hits: pd.Series) -> Optional[float]:
+    hits = hits.dropna()
+    return round(hits.astype(bool).mean(), 3) if len(hits) else None
+
+
+def summarize(results: pd.DataFrame) -> pd.DataFrame:
+    rows = []
+    for engine, grp in results.groupby("engine", sort=False):
+        rows.append({
+            "engine": engine,
+            "terms": len(grp),
+            "median_s": round(statistics.median(grp["seconds"]), 2),
+            "mean_s": round(grp["seconds"].mean(), 2),
+            "total_tokens": int(grp["tokens"].sum()),
+            "tokens_per_term": round(grp["tokens"].mean(), 1),
+            "scored_terms": int(grp["id_correct"].notna().sum()),
+            "id_accuracy": _accuracy(grp["id_correct"]),
+            "id_and_skos_accuracy": _accuracy(grp["id_and_skos_correct"]),
+        })
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare mapping engines for latency, tokens and accuracy.")
+    parser.add_argument("--input", type=Path, default=DEFAULT_INPUT)
+    parser.add_argument("--endpoint", choices=ENDPOINTS, default="Wikidata")
+    parser.add_argument("--engines", nargs="+", choices=ENGINES, default=["Agent", "Retrieve-rank"])
+    parser.add_argument("--trusted-ontologies", default="MESH,NCIT,LOINC,FOODON")
+    parser.add_argument("--term-ontologies", default="NCIT,NIFSTD,SNOMEDCT")
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N terms")
+    parser.add_argument("--out", type=Path, default=Path("benchmark_engines_results.csv"))
+    args = parser.parse_args()
+
+    if not os.environ.get("OPENAI_API_KEY"):
+        raise SystemExit("OPENAI_API_KEY is not set (expected env var).")
+
+    cases = load_cases(args.input)[: args.limit]
+    trusted = [x.strip() for x in args.trusted_ontologies.split(",") if x.strip()]
+    term_onts = [x.strip() for x in args.term_ontologies.split(",") if x.strip()]
+
+    results = run_benchmark(cases, args.endpoint, args.engines, trusted, term_onts)
+    results.to_csv(args.out, index=False)
+
+    print()
+    print(summarize(results).to_string(index=False))
+    print(f"\nPer-term results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
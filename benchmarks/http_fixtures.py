@@ -0,0 +1,119 @@
+# Recorded Wikidata / BioPortal responses for offline benchmarks.
+#
+# FixtureSession stands in for the requests.Session of
+# general_tools/http_client.py (use_http_session), so every lookup of the
+# tools is either recorded or replayed:
+#
+#   "record" - real requests; every response is appended to the fixture file
+#   "replay" - no network; responses come from the file. A request that was
+#              never recorded gets an empty 200 result in the shape of its API
+#              (no search hits, no entities; see empty_result) and is counted
+#              in `misses`, or raises FixtureMissing with strict=True
+#
+# Fixtures are one JSON object per line (jsonl, optionally .gz) keyed like the
+# response cache: url + query parameters without the BioPortal `apikey`, which
+# is never written to the file.
+
+import gzip
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import requests
+
+from general_tools.http_client import ResponseCache, _IGNORED_PARAMS
+
+FIXTURE_MODES = ["replay", "record"]
+
+
+class FixtureMissing(RuntimeError):
+    pass
+
+
+def empty_result(url: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Body of a successful lookup without hits, so a request without fixture
+    reads like "nothing found" to the tools instead of an HTTP error.
+    """
+    action = (params or {}).get("action")
+    if action == "query":
+        # Wikidata full-text search
+        return {"query": {"search": []}}
+    if action == "wbgetentities":
+        return {"entities": {}}
+    # BioPortal search / mappings / class records
+    return {"collection": []}
+
+
+def _open(path: Path, mode: str):
+    if path.suffix == ".gz":
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+class FixtureSession:
+    def __init__(self, path, mode: str = "replay", strict: bool = False):
+        if mode not in FIXTURE_MODES:
+            raise ValueError(f"mode must be one of {FIXTURE_MODES}")
+        self.path = Path(path)
+        self.mode = mode
+        self.strict = strict
+        self._lock = threading.Lock()
+        self._fixtures: Dict[str, Dict[str, Any]] = {}
+        self._live: Optional[requests.Session] = requests.Session() if mode == "record" else None
+        self.requests = 0
+        self.misses = 0
+        self.recorded = 0
+        if self.path.exists():
+            with _open(self.path, "r") as fh:
+                for line in fh:
+                    if line.strip():
+                        item = json.loads(line)
+                        self._fixtures[item["key"]] = item
+
+    def __len__(self) -> int:
+        return len(self._fixtures)
+
+    def counters(self) -> Dict[str, int]:
+        with self._lock:
+            return {"http_requests": self.requests, "fixture_misses": self.misses, "recorded": self.recorded}
+
+    def get(self, url: str, params: Optional[Dict[str, Any]] = None, headers=None, timeout=None, **kwargs):
+        key = ResponseCache.key(url, params)
+        with self._lock:
+            self.requests += 1
+            item = self._fixtures.get(key)
+
+        if item is None and self.mode == "record":
+            resp = self._live.get(url, params=params, headers=headers, timeout=timeout, **kwargs)
+            item = {
+                "key": key,
+                "url": url,
+                "params": {k: v for k, v in (params or {}).items() if k not in _IGNORED_PARAMS},
+                "status": resp.status_code,
+                "content_type": resp.headers.get("Content-Type", "application/json"),
+                "body": resp.text,
+            }
+            with self._lock:
+                self._fixtures[key] = item
+                self.recorded += 1
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with _open(self.path, "a") as fh:
+                    fh.write(json.dumps(item, ensure_ascii=False) + "\n")
+
+        if item is None:
+            with self._lock:
+                self.misses += 1
+            if self.strict:
+                raise FixtureMissing(f"No fixture for {url} {params!r} in {self.path}")
+            item = {"url": url, "status": 200, "content_type": "application/json",
+                    "body": json.dumps(empty_result(url, params))}
+
+        resp = requests.Response()
+        resp.status_code = item["status"]
+        resp._content = item["body"].encode("utf-8")
+        resp.headers["Content-Type"] = item["content_type"]
+        resp.encoding = "utf-8"
+        resp.url = item["url"]
+        return resp
@@ -0,0 +1,105 @@
+# Import-time profile of the modules the Streamlit pages load at page load.
+#
+# Every module is imported in a fresh interpreter with `python -X importtime`,
+# so the numbers are cold-start numbers. Besides the time, the run checks that
+# the heavy libraries (deepagents, langchain_openai, openai, ...) are NOT
+# pulled in by those modules: they should only be imported when an agent or
+# LLM is first used (see general_tools/agent_cache.py).
+#
+# Run from the repository root:
+#
+#   python -m benchmarks.import_profile
+#   python -m benchmarks.import_profile --max-seconds 1.5      # fail if slower
+#   python -m benchmarks.import_profile --modules wikidata_agent_and_tools.deep_agent_wikidata
+#
+# Exit code 1 if a module is slower than --max-seconds or imports a forbidden
+# module, so it can be used as a regression check.
+
+import re
+import sys
+import argparse
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import pandas as pd
+
+# Imported at load time by Home.py / pages/Mapping_service.py
+PAGE_MODULES = [
+    "general_tools.credentials",
+    "general_tools.agent_cache",
+    "general_tools.mapping_engine",
+    "general_tools.batch_engine",
+    "general_tools.job_store",
+    "general_tools.result_cache",
+]
+
+# Must only be imported on first use
+HEAVY_MODULES = ["deepagents", "langgraph", "langchain", "langchain_openai", "openai"]
+
+_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def profile_module(module: str, python: str = sys.executable) -> Dict[str, object]:
+    """Cold import of one module: seconds, number of modules imported, heaviest imports."""
+    proc = subprocess.run(
+        [python, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        cwd=Path.cwd(),
+    )
+    imports: List[Tuple[str, int, int]] = []
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            imports.append((m.group(4), int(m.group(2)), len(m.group(3))))
+
+    total_us = next((c for name, c, _ in imports if name == module), 0)
+    packages = {name.split(".")[0] for name, _, _ in imports}
+    heaviest = sorted(
+        ((name, c) for name, c, _ in imports if name != module),
+        key=lambda x: x[1],
+        reverse=True,
+    )[:5]
+    return {
+        "module": module,
+        "ok": proc.returncode == 0,
+        "error": proc.stderr.strip().splitlines()[-1] if proc.returncode != 0 and proc.stderr.strip() else "",
+        "seconds": round(total_us / 1e6, 3),
+        "modules_imported": len(imports),
+        "heavy_imported": ", ".join(h for h in HEAVY_MODULES if h in packages),
+        "heaviest": ", ".join(f"{name} {c / 1e6:.2f}s" for name, c in heaviest),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold import times of the app modules.")
+    parser.add_argument("--modules", nargs="+", default=PAGE_MODULES)
+    parser.add_argument("--max-seconds", type=float, default=None, help="Fail if a module takes longer to import")
+    parser.add_argument("--allow-heavy", action="store_true", help="Do not fail when heavy libraries are imported")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per module (the fastest is reported)")
+    parser.add_argument("--out", type=Path, default=None, help="Optional csv with the results")
+    args = parser.parse_args()
+
+    rows = []
+    for module in args.modules:
+        runs = [profile_module(module) for _ in range(max(1, args.repeat))]
+        rows.append(min(runs, key=lambda r: r["seconds"]))
+    results = pd.DataFrame(rows)
+
+    print(results.to_string(index=False))
+    if args.out:
+        results.to_csv(args.out, index=False)
+
+    failed = results[~results["ok"]]
+    if args.max_seconds is not None:
+        failed = pd.concat([failed, results[results["seconds"] > args.max_seconds]])
+    if not args.allow_heavy:
+        failed = pd.concat([failed, results[results["heavy_imported"] != ""]])
+    if len(failed):
+        print(f"\nRegression: {', '.join(sorted(set(failed['module'])))}", file=sys.stderr)
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
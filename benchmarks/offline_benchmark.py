@@ -0,0 +1,170 @@
+# Offline, reproducible benchmark of the mapping engines: no OpenAI, Wikidata
+# or BioPortal traffic, so runs can be compared commit to commit.
+#
+#   - Wikidata / BioPortal responses are replayed from recorded fixtures
+#     (benchmarks/http_fixtures.py), through general_tools.http_client
+#   - every LLM call goes to the deterministic stand-in server of
+#     benchmarks/stub_llm_server.py (OPENAI_BASE_URL), with a configurable
+#     latency per call and per completion token
+#
+# No fixtures are shipped with the repository. Record them once, online (needs
+# BIOPORTAL_API_KEY; the LLM is still the stub, so the recorded requests are
+# the ones the stub trajectory makes):
+#
+#   python -m benchmarks.offline_benchmark --record --limit 20
+#
+# then run offline as often as needed:
+#
+#   python -m benchmarks.offline_benchmark --limit 20 --llm-latency 0.8 --llm-token-latency 0.01
+#   python -m benchmarks.offline_benchmark --endpoints Wikidata --engines Agent Retrieve-rank
+#
+# Per term: wall time, LLM calls, tool calls, prompt / completion tokens, HTTP
+# requests and fixture misses; summary per endpoint and engine. The response
+# cache of http_client is off during the run, so every lookup hits a fixture.
+# A lookup without fixture comes back as "no hits" (see http_fixtures.py) and
+# is counted as a miss; --strict aborts instead.
+
+import os
+import time
+import argparse
+import statistics
+from pathlib import Path
+from typing import Dict, List
+
+import pandas as pd
+
+from benchmarks.benchmark_engines import DEFAULT_INPUT, load_cases
+from benchmarks.http_fixtures import FixtureSession, FixtureMissing
+from benchmarks.stub_llm_server import StubLLMServer
+from general_tools.mapping_engine import ENGINES, ENDPOINTS, map_term
+from general_tools.http_client import response_cache, use_http_session
+
+DEFAULT_FIXTURES = Path(__file__).resolve().parent / "fixtures" / "http_fixtures.jsonl"
+
+
+def _diff(after: Dict[str, int], before: Dict[str, int]) -> Dict[str, int]:
+    return {k: after[k] - before.get(k, 0) for k in after}
+
+
+def run_offline(cases, endpoints: List[str], engines: List[str], trusted: List[str], term_onts: List[str],
+                server: StubLLMServer, fixtures: FixtureSession) -> pd.DataFrame:
+    # imported here: agent_cache builds the agents with the OPENAI_* env set by main()
+    from general_tools.agent_cache import get_agent
+
+    records = []
+    for endpoint in endpoints:
+        for engine in engines:
+            agent = get_agent(endpoint) if engine == "Agent" else None
+            for case in cases:
+                llm_before, http_before = server.stats.snapshot(), fixtures.counters()
+                start = time.perf_counter()
+                try:
+                    row = map_term(endpoint, case["term"], case["definition"], engine=engine, agent=agent,
+                                   term_onts=term_onts, trusted_onts=trusted)
+                except FixtureMissing:
+                    raise
+                except Exception as e:
+                    row = {"IRI": "", "SKOS": "", "explanation": f"ERROR: {e}", "status": "error"}
+                seconds = time.perf_counter() - start
+
+                llm = _diff(server.stats.snapshot(), llm_before)
+                http = _diff(fixtures.counters(), http_before)
+                stats = row.get("stats") or {}
+                records.append({
+                    "endpoint": endpoint,
+                    "engine": engine,
+                    "term": case["term"],
+                    "IRI": row.get("IRI", ""),
+                    "SKOS": row.get("SKOS", ""),
+                    "status": row.get("status", "ok"),
+                    "seconds": round(seconds, 3),
+                    "llm_calls": llm["llm_calls"],
+                    # tool calls the agent executed; the other engines call the lookups directly
+                    "tool_calls": stats.get("tool_calls", llm["tool_calls"]),
+                    "prompt_tokens": llm["prompt_tokens"],
+                    "completion_tokens": llm["completion_tokens"],
+                    "total_tokens": llm["prompt_tokens"] + llm["completion_tokens"],
+                    "http_requests": http["http_requests"],
+                    "fixture_misses": http["fixture_misses"],
+                })
+                print(f"[{endpoint}/{engine}] {case['term']}: {row.get('IRI', '')} {seconds:.2f}s "
+                      f"{llm['llm_calls']} LLM calls, {http['http_requests']} HTTP "
+                      f"({http['fixture_misses']} missing)")
+    return pd.DataFrame(records)
+
+
+def summarize(results: pd.DataFrame) -> pd.DataFrame:
+    rows = []
+    for (endpoint, engine), grp in results.groupby(["endpoint", "engine"], sort=False):
+        seconds = sorted(grp["seconds"])
+        rows.append({
+            "endpoint": endpoint,
+            "engine": engine,
+            "terms": len(grp),
+            "median_s": round(statistics.median(seconds), 3),
+            "p95_s": round(seconds[min(len(seconds) - 1, int(0.95 * len(seconds)))], 3),
+            "mean_s": round(statistics.mean(seconds), 3),
+            "terms_per_min": round(60 * len(seconds) / sum(seconds), 1) if sum(seconds) else None,
+            "llm_calls_per_term": round(grp["llm_calls"].mean(), 2),
+            "tool_calls_per_term": round(pd.to_numeric(grp["tool_calls"], errors="coerce").mean(), 2),
+            "tokens_per_term": round(grp["total_tokens"].mean(), 1),
+            "http_per_term": round(grp["http_requests"].mean(), 2),
+            "fixture_misses": int(grp["fixture_misses"].sum()),
+            "errors": int((grp["status"] == "error").sum()),
+        })
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark with recorded HTTP fixtures and a stub LLM.")
+    parser.add_argument("--input", type=Path, default=DEFAULT_INPUT)
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N terms")
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=ENDPOINTS)
+    parser.add_argument("--engines", nargs="+", choices=ENGINES, default=["Agent"])
+    parser.add_argument("--trusted-ontologies", default="MESH,NCIT,LOINC,FOODON")
+    parser.add_argument("--term-ontologies", default="NCIT,NIFSTD,SNOMEDCT")
+    parser.add_argument("--fixtures", type=Path, default=DEFAULT_FIXTURES)
+    parser.add_argument("--record", action="store_true", help="Fetch missing responses online and add them to --fixtures")
+    parser.add_argument("--strict", action="store_true", help="Abort on a request without fixture")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds per stub LLM call")
+    parser.add_argument("--llm-token-latency", type=float, default=0.0, help="Extra seconds per completion token")
+    parser.add_argument("--out", type=Path, default=Path("offline_benchmark_results.csv"))
+    args = parser.parse_args()
+
+    fixtures = FixtureSession(args.fixtures, mode="record" if args.record else "replay", strict=args.strict)
+    if not args.record and not len(fixtures):
+        # every lookup would find nothing, so the numbers would not mean anything
+        parser.error(f"no recorded fixtures in {args.fixtures}; record them once with --record "
+                     "(online, needs BIOPORTAL_API_KEY) or pass --fixtures")
+    if args.record and not os.environ.get("BIOPORTAL_API_KEY"):
+        print("Warning: BIOPORTAL_API_KEY is not set; BioPortal responses will be recorded as errors.")
+
+    cases = load_cases(args.input)[: args.limit]
+    trusted = [x.strip() for x in args.trusted_ontologies.split(",") if x.strip()]
+    term_onts = [x.strip() for x in args.term_ontologies.split(",") if x.strip()]
+
+    with StubLLMServer(latency=args.llm_latency, token_latency=args.llm_token_latency) as server:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        os.environ["OPENAI_API_KEY"] = "offline-stub"
+        os.environ.setdefault("BIOPORTAL_API_KEY", "offline-stub")
+        os.environ["LANGCHAIN_TRACING_V2"] = "false"
+
+        ttl = response_cache.ttl_seconds
+        response_cache.ttl_seconds = 0
+        try:
+            with use_http_session(fixtures):
+                results = run_offline(cases, args.endpoints, args.engines, trusted, term_onts, server, fixtures)
+        finally:
+            response_cache.ttl_seconds = ttl
+
+    results.to_csv(args.out, index=False)
+    print()
+    print(summarize(results).to_string(index=False))
+    counters = fixtures.counters()
+    print(f"\n{counters['http_requests']} HTTP requests, {counters['fixture_misses']} without fixture, "
+          f"{counters['recorded']} recorded to {args.fixtures}")
+    print(f"Per-term results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+# Deterministic OpenAI-compatible stand-in for offline benchmarks.
+#
+# Serves POST /v1/chat/completions (plain and stream=true) on localhost. The
+# app does not need any change to use it: ChatOpenAI reads OPENAI_BASE_URL,
+# so the agents, the SKOS classifier, the ranking / formatting calls all go
+# here (see benchmarks/offline_benchmark.py, which starts it in-process).
+#
+#   python -m benchmarks.stub_llm_server --port 8790 --latency 0.8 --token-latency 0.01
+#   OPENAI_BASE_URL=http://127.0.0.1:8790/v1 OPENAI_API_KEY=stub streamlit run Home.py
+#
+# Every answer is scripted from the request alone, so a run is reproducible:
+#   - if a lookup tool of the agent has not been called yet, call it with the
+#     term of the question (WikidataEntitySearch -> WikidataEntityDetails with
+#     the Q-id found; find_best_definition for the first term ontology; the
+#     multiagent hands the question to its bioportal-agent via `task`), then
+#     classify_skos_match and agentmapping_format when those tools exist
+#   - otherwise answer: JSON filled from the requested schema (structured
+#     output) with the last identifier seen in the conversation, or the
+#     output of agentmapping_format, or a qid/skos/explanation JSON text
+#
+# Latency per call: --latency + --token-latency * completion tokens. Tokens
+# are estimated as characters / 4. GET /stats returns the counters.
+
+import re
+import json
+import time
+import uuid
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+STUB_SKOS = "exact"
+
+_QID = re.compile(r"\bQ\d+\b")
+_IRI = re.compile(r"https?://[^\s\"',}]+")
+# "ID: ..." lines: candidate lists of the ranking prompt, agent output to format
+_ID_LINE = re.compile(r"\bID:\s*(https?://[^\s\"',}]+|Q\d+\b)")
+_TERM_PATTERNS = [
+    re.compile(r'Map the term "(?P<term>.+?)" with definition "(?P<definition>.*?)" to', re.S),
+    re.compile(r"identifier the term (?P<term>.+?) which definition (?P<definition>.*?) matches with", re.S),
+    re.compile(r"IRI for the term (?P<term>.+?) with definition (?P<definition>.*?)\.\s*\n", re.S),
+]
+_ONTOLOGIES = re.compile(r"Term ontologies:\s*(?P<term>[^\n]*)\n\s*Trusted ontologies:\s*(?P<trusted>[^\n]*)")
+
+
+def _text(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(p.get("text", "") if isinstance(p, dict) else str(p) for p in content)
+    return "" if content is None else str(content)
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class _Conversation:
+    """What the stub needs to know about one request."""
+
+    def __init__(self, body: Dict[str, Any]):
+        self.messages: List[Dict[str, Any]] = body.get("messages") or []
+        self.tools = {
+            t["function"]["name"]: t["function"]
+            for t in body.get("tools") or []
+            if t.get("type") == "function"
+        }
+        rf = body.get("response_format") or {}
+        self.schema = (rf.get("json_schema") or {}).get("schema") if rf.get("type") == "json_schema" else None
+
+        user = next((_text(m.get("content")) for m in self.messages if m.get("role") == "user"), "")
+        self.question = user
+        self.term, self.definition = user.strip()[:80], ""
+        for pattern in _TERM_PATTERNS:
+            m = pattern.search(user)
+            if m:
+                self.term, self.definition = m.group("term").strip(), m.group("definition").strip()
+                break
+        m = _ONTOLOGIES.search(user)
+        onts = [o.strip() for o in (m.group("term") if m else "").split(",") if o.strip() and o.strip() != "(none)"]
+        self.ontology = onts[0] if onts else "NCIT"
+
+        # tool calls made so far and their results
+        self.calls: Dict[str, str] = {}
+        names: Dict[str, str] = {}
+        for m in self.messages:
+            for tc in m.get("tool_calls") or []:
+                names[tc.get("id")] = tc["function"]["name"]
+            if m.get("role") == "tool":
+                self.calls[names.get(m.get("tool_call_id"), "?")] = _text(m.get("content"))
+
+    def identifier(self) -> str:
+        """
+        Q-id / IRI of the latest user or tool message that has one (never the
+        system prompt). Within a message the first "ID: ..." value, else the
+        first identifier at all (the top search hit).
+        """
+        found = ""
+        for m in self.messages:
+            if m.get("role") in {"user", "tool"}:
+                text = _text(m.get("content"))
+                hits = _ID_LINE.findall(text) or _IRI.findall(text) + _QID.findall(text)
+                if hits:
+                    found = min(hits, key=text.find)
+        return found
+
+    def details(self) -> Tuple[str, str]:
+        """(label, definition) of the candidate, from the lookup results."""
+        for name in ["WikidataEntityDetails", "find_best_definition", "task"]:
+            raw = self.calls.get(name)
+            if not raw:
+                continue
+            try:
+                data = json.loads(raw)
+            except ValueError:
+                return self.term, raw[:300]
+            if isinstance(data, dict):
+                return str(data.get("label") or self.term), str(data.get("definition") or "")
+        return self.term, self.definition
+
+
+def _plan(conv: _Conversation) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """Next tool call of the scripted trajectory, or None to answer."""
+    tools, calls = conv.tools, conv.calls
+    if "task" in tools and "bioportal-agent" in (tools["task"].get("description") or "") and "task" not in calls:
+        return "task", {"description": conv.question, "subagent_type": "bioportal-agent"}
+    if "WikidataEntitySearch" in tools and "WikidataEntitySearch" not in calls:
+        return "WikidataEntitySearch", {"search": conv.term}
+    if "WikidataEntityDetails" in tools and "WikidataEntityDetails" not in calls:
+        qid = _QID.search(calls.get("WikidataEntitySearch", ""))
+        if qid:
+            return "WikidataEntityDetails", {"q": qid.group(0)}
+    if "find_best_definition" in tools and "find_best_definition" not in calls:
+        return "find_best_definition", {"term": conv.term, "ontology": conv.ontology}
+    identifier = conv.identifier()
+    if not identifier:
+        return None
+    if "classify_skos_match" in tools and "classify_skos_match" not in calls:
+        label, onto_def = conv.details()
+        return "classify_skos_match", {"term_a": conv.term, "gen_def": conv.definition,
+                                       "term_b": label, "onto_def": onto_def}
+    if "agentmapping_format" in tools and "agentmapping_format" not in calls:
+        return "agentmapping_format", {"output": f"ID: {identifier}\nSKOS: {STUB_SKOS}\nExplanation: stub verdict"}
+    return None
+
+
+def _fill(schema: Dict[str, Any], hints: Dict[str, Any], root: Optional[Dict[str, Any]] = None) -> Any:
+    """Minimal instance of a JSON schema; known field names get the hint values."""
+    root = schema if root is None else root
+    if "$ref" in schema:
+        # pydantic schemas: "#/$defs/Name"
+        target = root
+        for part in schema["$ref"].lstrip("#/").split("/"):
+            target = target[part]
+        schema = target
+    if "anyOf" in schema:
+        schema = next((s for s in schema["anyOf"] if s.get("type") != "null"), schema["anyOf"][0])
+    kind = schema.get("type")
+    if kind == "object" or "properties" in schema:
+        return {
+            name: hints[name.lower()] if name.lower() in hints else _fill(sub, hints, root)
+            for name, sub in (schema.get("properties") or {}).items()
+        }
+    if kind == "array":
+        return [_fill(schema.get("items") or {}, hints, root)]
+    if "enum" in schema:
+        return schema["enum"][0]
+    return {"string": "stub", "boolean": False, "integer": 0, "number": 0}.get(kind, None)
+
+
+def respond(body: Dict[str, Any]) -> Dict[str, Any]:
+    """The assistant message for one chat completion request."""
+    conv = _Conversation(body)
+    step = _plan(conv)
+    if step is not None:
+        name, args = step
+        return {"role": "assistant", "content": None, "tool_calls": [{
+            "id": f"call_{uuid.uuid4().hex[:12]}",
+            "type": "function",
+            "function": {"name": name, "arguments": json.dumps(args, ensure_ascii=False)},
+        }]}
+
+    identifier = conv.identifier()
+    # a one-shot call without tools (SKOS classifier, ranking) always finds a match
+    matched = bool(identifier) or not conv.tools
+    skos = STUB_SKOS if matched else "none"
+    explanation = "stub verdict" if matched else "no identifier found"
+    if conv.schema is not None:
+        hints = {
+            "qid": identifier or "No match", "id": identifier or "No match", "iri": identifier,
+            "skos": skos if identifier else "", "mapping_type": skos, "explanation": explanation,
+            "skos_explanation": explanation,
+            "exact_match": skos == "exact", "close_match": skos == "close", "related_match": skos == "related",
+        }
+        content = json.dumps(_fill(conv.schema, hints), ensure_ascii=False)
+    elif "agentmapping_format" in conv.calls:
+        content = conv.calls["agentmapping_format"]
+    else:
+        content = json.dumps({"qid": identifier or "No match", "skos": skos if identifier else "",
+                              "explanation": explanation})
+    return {"role": "assistant", "content": content}
+
+
+class StubStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.values = {"llm_calls": 0, "tool_calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+    def add(self, **counts: int):
+        with self._lock:
+            for k, v in counts.items():
+                self.values[k] += v
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.values)
+
+
+def make_handler(stats: StubStats, latency: float, token_latency: float):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int, payload: bytes, content_type: str = "application/json"):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/stats"):
+                self._send(200, json.dumps(stats.snapshot()).encode())
+            else:
+                self._send(404, b'{"error": "not found"}')
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send(404, json.dumps({"error": {"message": f"stub: {self.path} not supported"}}).encode())
+                return
+
+            message = respond(body)
+            prompt_tokens = _tokens(json.dumps(body.get("messages")) + json.dumps(body.get("tools") or []))
+            completion_tokens = _tokens(json.dumps(message))
+            stats.add(llm_calls=1, tool_calls=len(message.get("tool_calls") or []),
+                      prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+            time.sleep(latency + token_latency * completion_tokens)
+
+            finish = "tool_calls" if message.get("tool_calls") else "stop"
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                     "total_tokens": prompt_tokens + completion_tokens}
+            base = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "created": int(time.time()),
+                    "model": body.get("model", "stub")}
+            if not body.get("stream"):
+                payload = {**base, "object": "chat.completion", "usage": usage,
+                           "choices": [{"index": 0, "message": message, "finish_reason": finish}]}
+                self._send(200, json.dumps(payload).encode())
+                return
+
+            # one delta with the whole message, then the finish and usage chunks
+            delta = dict(message)
+            if delta.get("tool_calls"):
+                delta["tool_calls"] = [{**tc, "index": i} for i, tc in enumerate(delta["tool_calls"])]
+            chunks = [
+                {**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": delta, "finish_reason": None}]},
+                {**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {}, "finish_reason": finish}]},
+                {**base, "object": "chat.completion.chunk", "choices": [], "usage": usage},
+            ]
+            payload = "".join(f"data: {json.dumps(c)}\n\n" for c in chunks) + "data: [DONE]\n\n"
+            self._send(200, payload.encode(), "text/event-stream")
+
+    return Handler
+
+
+class StubLLMServer:
+    """ThreadingHTTPServer in a daemon thread; `base_url` is what OPENAI_BASE_URL should be."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, token_latency: float = 0.0):
+        self.stats = StubStats()
+        self._server = ThreadingHTTPServer((host, port), make_handler(self.stats, latency, token_latency))
+        self._server.daemon_threads = True
+        self.base_url = f"http://{host}:{self._server.server_address[1]}/v1"
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-llm", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deterministic OpenAI-compatible stand-in server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds per LLM call")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Extra seconds per completion token")
+    args = parser.parse_args()
+
+    with StubLLMServer(args.host, args.port, args.latency, args.token_latency) as server:
+        print(f"Stub LLM listening on {server.base_url} (Ctrl+C to stop)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -6,11 +6,43 @@ Created on Tue Dec 23 00:17:00 2025
 """
 from typing import Tuple,List, Dict, Any, Optional
 import requests
-import os
+
+from general_tools.credentials import require_bioportal_api_key
+from general_tools.http_client import http_get
 
 BASE_URL = "https://data.bioontology.org"
 
 
+def _search_entries(term: str, ontology: str, exact: bool) -> List[Dict[str, Any]]:
+    """Search results of one ontology (the request shared by the lookups below)."""
+    params = {
+        "q": term,
+        "ontologies": ontology,
+        "require_exact_match": str(exact).lower(),
+        "include": "prefLabel,definition,synonym,notation,cui,semanticType",
+        "pagesize": 20,
+        "apikey": require_bioportal_api_key()
+    }
+
+    resp = http_get(f"{BASE_URL}/search", params=params, timeout=15)
+    resp.raise_for_status()
+    return resp.json().get("collection", [])
+
+
+def find_pref_label(term: str, ontology: str, mapped_id: str) -> str:
+    """
+    prefLabel of the concept `mapped_id` that find_term_in_ontology /
+    find_best_definition returned for `term`. Sends the same searches, so
+    with the response cache on they are not fetched again.
+    Returns "" if the concept is not among the results.
+    """
+    for exact in (True, False):
+        for e in _search_entries(term, ontology, exact):
+            if e.get("@id", e.get("id", "")) == mapped_id:
+                return e.get("prefLabel", "") or ""
+    return ""
+
+
 def find_term_in_ontology(
     term: str,
     ontology: str,
@@ -45,18 +77,7 @@ def find_term_in_ontology(
         Returns ("", "") if no match found.
     """
 
-    params = {
-        "q": term,
-        "ontologies": ontology,
-        "require_exact_match": str(exact).lower(),
-        "include": "prefLabel,definition,synonym,notation,cui,semanticType",
-        "pagesize": 20,
-        "apikey": os.environ.get("BIOPORTAL_API_KEY", "").strip()
-    }
-
-    resp = requests.get(f"{BASE_URL}/search", params=params, timeout=15)
-    resp.raise_for_status()
-    entries = resp.json().get("collection", [])
+    entries = _search_entries(term, ontology, exact)
 
     # Apply case sensitivity rule
     if case_sensitive:
@@ -140,18 +161,7 @@ def find_term_in_ontology_with_definition(
     If no match found -> returns an empty string.
     """
 
-    params = {
-        "q": term,
-        "ontologies": ontology,
-        "require_exact_match": str(exact).lower(),
-        "include": "prefLabel,definition,synonym,notation,cui,semanticType",
-        "pagesize": 20,
-        "apikey": os.environ.get("BIOPORTAL_API_KEY", "").strip()
-    }
-
-    resp = requests.get(f"{BASE_URL}/search", params=params, timeout=15)
-    resp.raise_for_status()
-    entries = resp.json().get("collection", [])
+    entries = _search_entries(term, ontology, exact)
 
     # Case sensitivity
     term_cmp = term if case_sensitive else term.lower()
@@ -230,10 +240,10 @@ def find_indirect_definition(term: str, ontology: str) -> Optional[Dict[str, str
         "ontologies": ontology,
         "require_exact_match": "true",
         "pagesize": 1,
-        "apikey": os.environ.get("BIOPORTAL_API_KEY", "").strip()
+        "apikey": require_bioportal_api_key()
     }
     try:
-        r = requests.get(f"{BASE_URL}/search", params=search_params, timeout=15)
+        r = http_get(f"{BASE_URL}/search", params=search_params, timeout=15)
         r.raise_for_status()
     except requests.RequestException:
         return None
@@ -248,8 +258,8 @@ def find_indirect_definition(term: str, ontology: str) -> Optional[Dict[str, str
 
     # 2) Fetch the mapping records
     try:
-        mresp = requests.get(
-            mappings_url, params={"apikey": os.environ.get("BIOPORTAL_API_KEY", "").strip()}, timeout=15
+        mresp = http_get(
+            mappings_url, params={"apikey": require_bioportal_api_key()}, timeout=15
         )
         mresp.raise_for_status()
     except requests.RequestException:
@@ -278,8 +288,8 @@ def find_indirect_definition(term: str, ontology: str) -> Optional[Dict[str, str
 
         # 4) Fetch the full class record to get its definition
         try:
-            c = requests.get(
-                self_link, params={"apikey": os.environ.get("BIOPORTAL_API_KEY", "").strip()}, timeout=15
+            c = http_get(
+                self_link, params={"apikey": require_bioportal_api_key()}, timeout=15
             )
             c.raise_for_status()
         except requests.RequestException:
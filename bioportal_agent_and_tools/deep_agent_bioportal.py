@@ -5,6 +5,9 @@ Created on Mon Dec 22 18:22:58 2025
 @author: yurt3
 """
 
+import warnings
+from typing import Optional
+
 from pydantic import BaseModel, Field
 from deepagents import create_deep_agent
 # from wikidata_tools import WikidataEntitySearch, WikidataEntityDetails 
@@ -12,75 +15,14 @@ from deepagents import create_deep_agent
 
 from bioportal_agent_and_tools.bioportal_tools import find_best_definition, find_term_in_ontology
 from general_tools.skos_tools import classify_skos_match
+from general_tools.tool_memo import memoize_tools
+from general_tools.credentials import require_openai_api_key, session_chat_model
+from general_tools.training_examples import training_examples
 
-import pandas as pd
-from pathlib import Path
-from io import StringIO
-import os
-
-from langchain.chat_models import init_chat_model
-model = init_chat_model(model="gpt-5.1")
-
-file_path = Path.cwd() / "auxiliary_files" / "autoreconcilitation_training_terms_20251203_formatted.xlsx"
-df = pd.read_excel(file_path) 
 
 #trusted_ontologies=['MESH', 'NCIT', 'LOINC', 'FOODON', 'NCBITAXON']
 #term_ontologies =["NCIT","NIFSTD","BERO","OCHV","SNOMEDCT"] # for Independent variable list
 
-#df=pd.read_excel("/content/autoreconcilitation_training_terms_20251203_formatted.xlsx")
-
-def build_match_pairs(
-    df: pd.DataFrame,
-    match_name: str,
-    label_col: str,
-    desc_col: str,
-    term_col: str = "term",
-    def_col: str = "definition",
-):
-    """
-    Build plain-text pairs for a given SKOS match type.
-    Returns a full text block as a string instead of printing.
-    """
-    buffer = StringIO()
-    buffer.write(f"========== {match_name} pairs ==========\n\n")
-
-    subset = df.dropna(subset=[label_col])
-
-    for n, row in enumerate(subset.itertuples(index=False), start=1):
-        term_a = getattr(row, term_col)
-        def_a  = getattr(row, def_col)
-        term_b = getattr(row, label_col)
-        def_b  = getattr(row, desc_col)
-
-        buffer.write(f"{n}) Term A: {term_a}\n")
-        buffer.write(f"   Definition A: {def_a}\n")
-        buffer.write(f"   Term B: {term_b}\n")
-        buffer.write(f"   Definition B: {def_b}\n\n")
-
-    return buffer.getvalue()
-
-exact_text = build_match_pairs(
-    df,
-    match_name="exactMatch",
-    label_col="exactMatch_label",
-    desc_col="exactMatch_description"
-)
-
-close_text = build_match_pairs(
-    df,
-    match_name="closeMatch",
-    label_col="closeMatch_label",
-    desc_col="closeMatch_description"
-)
-
-related_text = build_match_pairs(
-    df,
-    match_name="relatedMatch",
-    label_col="relatedMatch_label",
-    desc_col="relatedMatch_description"
-)
-
-
 
 # research_instructions_onto = f"""You task is to match the term with valid identifiers from bioportal by checking the following ontologies {term_ontologies}
 
@@ -112,16 +54,38 @@ class Bioportalmapping(BaseModel):
     skos: str = Field(description="SKOS_matching. SKOS matching between original term definition and the definition/description of the identified label from bioportal. Example: exact")
     explanation: str = Field(description="SKOS_matching_logic. The explanation for SKOS matching logic retrieved from explanation field of SKOS matching tool" )
 
-def get_agent_bioportal(trusted_ontologies: list[str], term_ontologies: list[str]):
-    # Ensure the key is available in env (set by Streamlit Home page)
-    if not os.environ.get("OPENAI_API_KEY"):
-        raise RuntimeError("OPENAI_API_KEY is not set (expected env var).")
-    if not os.environ.get("BIOPORTAL_API_KEY"):
-        raise RuntimeError("BIOPORTAL_API_KEY is not set.")
+def default_ontologies_text(trusted_ontologies: Optional[list[str]], term_ontologies: Optional[list[str]]) -> str:
+    """
+    Prompt line for the deprecated ontology arguments of get_agent_bioportal /
+    get_multiagent: the lists are only a fallback for requests that name none.
+    """
+    if trusted_ontologies is None and term_ontologies is None:
+        return ""
+    warnings.warn(
+        "The ontology lists are sent with every question now (mapping_engine.build_question); "
+        "trusted_ontologies / term_ontologies only set a fallback for requests without them.",
+        DeprecationWarning,
+        stacklevel=3,
+    )
+    return (f"\nIf the request does not list term ontologies, check the following ontologies {list(term_ontologies or [])}."
+            f"\nIf the request does not list trusted ontologies, the trusted ontologies are {list(trusted_ontologies or [])}.")
+
+
+def get_agent_bioportal(trusted_ontologies: Optional[list[str]] = None, term_ontologies: Optional[list[str]] = None):
+    # Keys are resolved on every request (session / request credentials, env
+    # vars outside of the app; the BioPortal key by the tools on every call)
+    # and the ontology lists come with the question
+    # (mapping_engine.question_bioportal), so one compiled agent serves every
+    # session and ontology selection. The ontology arguments are deprecated.
+    require_openai_api_key()
+    defaults_text = default_ontologies_text(trusted_ontologies, term_ontologies)
+    model = session_chat_model("gpt-5.1")
+    # SKOS example pairs (parsed once per process, see training_examples.py)
+    exact_text, close_text, related_text = training_examples()
 
-    research_instructions_onto = f"""You task is to match the term with valid identifiers from bioportal by checking the following ontologies {term_ontologies}
+    research_instructions_onto = f"""You task is to match the term with valid identifiers from bioportal by checking the term ontologies listed in the request{defaults_text}
 
-    For the trusted ontologies such as {trusted_ontologies} you use the find_term_in_ontology tool to find the matches and do not need to check the definitions.
+    For the trusted ontologies listed in the request you use the find_term_in_ontology tool to find the matches and do not need to check the definitions.
 
     If the ontology is not in the list of trusted, then use find_best_definition tool to get the term with its definition. Then compare the retrieved definition and the provided one.
 
@@ -143,7 +107,7 @@ def get_agent_bioportal(trusted_ontologies: list[str], term_ontologies: list[str
 
     return create_deep_agent(
         model=model,
-        tools=[find_best_definition, find_term_in_ontology, classify_skos_match],
+        tools=memoize_tools([find_best_definition, find_term_in_ontology, classify_skos_match]),
         system_prompt=research_instructions_onto,
         response_format=Bioportalmapping,
     )
@@ -0,0 +1,151 @@
+# Parallel variant of the multiagent system.
+#
+# get_multiagent lets an orchestrator call the BioPortal subagent first and the
+# Wikidata subagent only if BioPortal fails, so the latency of a BioPortal miss
+# is the sum of both searches. Here both specialist agents run concurrently and
+# a small policy picks the result:
+#
+#   1. BioPortal exact match in a trusted ontology  -> take it, cancel Wikidata
+#   2. otherwise the best SKOS class of both (exact > close > related),
+#      BioPortal wins ties
+#
+# If one of the two runs failed, the other one may not be the answer both
+# would have given, so the selected row gets status "error" (shown as such and
+# never cached).
+#
+# The policy only needs the two row dicts, so it can be reused by other engines.
+
+import asyncio
+from typing import List, Dict, Optional
+
+from wikidata_agent_and_tools.deep_agent_wikidata import get_agent_wiki
+from bioportal_agent_and_tools.deep_agent_bioportal import get_agent_bioportal
+from general_tools.mapping_engine import build_question, row_from_run
+from general_tools.agent_budget import AgentBudget, arun_agent_with_budget
+from general_tools.skos_tools import SKOS_RANK
+
+
+def _skos_rank(row: Optional[Dict[str, str]]) -> int:
+    if not row:
+        return 0
+    return SKOS_RANK.get((row.get("SKOS") or "").strip().lower(), 0)
+
+
+def _has_match(row: Optional[Dict[str, str]]) -> bool:
+    iri = (row or {}).get("IRI", "")
+    return bool(iri) and not iri.startswith("No ")
+
+
+def is_trusted_iri(iri: str, trusted_ontologies: List[str]) -> bool:
+    """
+    BioPortal IRIs carry the ontology acronym, e.g.
+    http://purl.bioontology.org/ontology/MESH/D012964 or
+    http://purl.obolibrary.org/obo/NCIT_C29821.
+    """
+    iri_up = (iri or "").upper()
+    for onto in trusted_ontologies:
+        onto_up = onto.upper()
+        if f"/{onto_up}/" in iri_up or f"/{onto_up}_" in iri_up or f"/{onto_up}#" in iri_up:
+            return True
+    return False
+
+
+def is_confirmed_bioportal(row: Optional[Dict[str, str]], trusted_ontologies: List[str]) -> bool:
+    """Policy step 1: a trusted exact BioPortal hit ends the search."""
+    return (
+        _has_match(row)
+        and _skos_rank(row) == SKOS_RANK["exact"]
+        and is_trusted_iri(row["IRI"], trusted_ontologies)
+    )
+
+
+def select_mapping(
+    bio: Optional[Dict[str, str]],
+    wiki: Optional[Dict[str, str]],
+    trusted_ontologies: List[str],
+) -> Dict[str, str]:
+    """
+    Pick the final row from the BioPortal and Wikidata results
+    (either may be None if that search failed or was cancelled).
+    """
+    if is_confirmed_bioportal(bio, trusted_ontologies):
+        return bio
+
+    failed = [r for r in (bio, wiki) if r and r.get("status") == "error"]
+    candidates = [r for r in (bio, wiki) if _has_match(r)]
+    if not candidates:
+        row = {"IRI": "No match", "SKOS": "", "explanation": "", "status": (bio or wiki or {}).get("status", "ok")}
+    else:
+        # max() keeps the first of equal elements -> BioPortal wins ties
+        row = max(candidates, key=_skos_rank)
+    if failed and row.get("status") != "error":
+        errors = " | ".join(r.get("explanation", "") for r in failed)
+        row = {**row, "status": "error", "explanation": f"{errors} | {row['explanation']}" if row["explanation"] else errors}
+    return row
+
+
+class ParallelMultiagent:
+    """
+    Runs the BioPortal and Wikidata agents at the same time.
+
+    Offers the same `map` / `amap` interface as the mapping pipeline and
+    returns {"IRI": ..., "SKOS": ..., "explanation": ...}. The ontology lists
+    are passed per call, so one instance serves every ontology selection.
+    """
+
+    def __init__(self, budget: Optional[AgentBudget] = None):
+        # Applied to each of the two agent runs
+        self.budget = budget
+        self.bio_agent = get_agent_bioportal()
+        self.wiki_agent = get_agent_wiki()
+
+    async def _run(self, agent, endpoint: str, term: str, definition: str, trusted_ontologies: List[str],
+                   term_ontologies: List[str], budget: Optional[AgentBudget] = None, on_event=None) -> Optional[Dict[str, str]]:
+        question = build_question(endpoint, term, definition, term_ontologies, trusted_ontologies)
+        try:
+            run = await arun_agent_with_budget(
+                agent,
+                {"messages": [{"role": "user", "content": question}]},
+                budget=budget or self.budget,
+                # tag progress events with the source agent
+                on_event=(lambda e: on_event({**e, "agent": endpoint})) if on_event else None,
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return {"IRI": "", "SKOS": "", "explanation": f"ERROR ({endpoint}): {e}", "status": "error"}
+        return row_from_run(endpoint, run)
+
+    async def amap(self, term: str, definition: str, budget: Optional[AgentBudget] = None, on_event=None,
+                   trusted_ontologies: Optional[List[str]] = None, term_ontologies: Optional[List[str]] = None) -> Dict[str, str]:
+        trusted, term_onts = list(trusted_ontologies or []), list(term_ontologies or [])
+        bio_task = asyncio.create_task(
+            self._run(self.bio_agent, "Bioportal", term, definition, trusted, term_onts, budget, on_event)
+        )
+        wiki_task = asyncio.create_task(
+            self._run(self.wiki_agent, "Wikidata", term, definition, trusted, term_onts, budget, on_event)
+        )
+
+        try:
+            done, _ = await asyncio.wait({bio_task, wiki_task}, return_when=asyncio.FIRST_COMPLETED)
+
+            # Preferred result confirmed before Wikidata finished -> stop Wikidata
+            if bio_task in done and is_confirmed_bioportal(bio_task.result(), trusted):
+                wiki_task.cancel()
+                return bio_task.result()
+
+            bio, wiki = await asyncio.gather(bio_task, wiki_task)
+        finally:
+            for task in (bio_task, wiki_task):
+                if not task.done():
+                    task.cancel()
+
+        return select_mapping(bio, wiki, trusted)
+
+    def map(self, term: str, definition: str, budget: Optional[AgentBudget] = None, on_event=None,
+            trusted_ontologies: Optional[List[str]] = None, term_ontologies: Optional[List[str]] = None) -> Dict[str, str]:
+        return asyncio.run(self.amap(term, definition, budget, on_event, trusted_ontologies, term_ontologies))
+
+
+def get_parallel_multiagent(budget: Optional[AgentBudget] = None):
+    return ParallelMultiagent(budget=budget)
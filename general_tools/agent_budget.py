@@ -0,0 +1,263 @@
+# Per-term budgets for deep-agent runs.
+#
+# The agent graph is consumed as a stream instead of a single `invoke`, so we
+# can count LLM turns, tool calls, tokens and elapsed time while it runs and
+# stop it as soon as
+#   - one of the budgets is exhausted, or
+#   - classify_skos_match returned "exact" for a candidate (early exit).
+#
+# Budgets are checked between graph steps, so a single slow LLM call can
+# overshoot max_seconds by the duration of that call.
+#
+# Nothing is limited unless the caller passes a budget: AgentBudget() is
+# unlimited, like a plain `invoke`. RECOMMENDED_BUDGET holds the limits the
+# Mapping page and the CLI offer as a preset.
+
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from general_tools.tool_memo import tool_memo_scope
+from general_tools.skos_tools import SKOS_RANK
+
+
+@dataclass
+class AgentBudget:
+    """
+    Limits for one term. None disables a limit; the defaults limit nothing.
+    Limits are checked between graph steps only (after an LLM turn or a tool
+    result), never in the middle of a call.
+    """
+    max_llm_turns: Optional[int] = None
+    max_tool_calls: Optional[int] = None
+    max_tokens: Optional[int] = None
+    max_seconds: Optional[float] = None
+    stop_on_exact: bool = False
+
+
+RECOMMENDED_BUDGET = AgentBudget(max_llm_turns=20, max_tool_calls=30, max_seconds=180.0, stop_on_exact=True)
+
+
+@dataclass
+class RunStats:
+    llm_turns: int = 0
+    tool_calls: int = 0
+    tokens: int = 0
+    seconds: float = 0.0
+    duplicate_tool_calls: int = 0
+    events: List[Dict[str, Any]] = field(default_factory=list)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "llm_turns": self.llm_turns,
+            "tool_calls": self.tool_calls,
+            "tokens": self.tokens,
+            "seconds": round(self.seconds, 2),
+            "duplicate_tool_calls": self.duplicate_tool_calls,
+        }
+
+
+def _load_tool_output(content: Any) -> Any:
+    if isinstance(content, str):
+        try:
+            return json.loads(content)
+        except Exception:
+            return content
+    return content
+
+
+def _candidate_from_tool(name: str, output: Any) -> Optional[str]:
+    """
+    Identifier a lookup tool just returned, if any:
+      WikidataEntityDetails -> {"id": "Q42", ...}
+      find_best_definition  -> {"mapped_id": "http://...", ...}
+      find_term_in_ontology -> ["http://...", "exact"]
+    Repeated calls answered by the tool memo wrap non-dict results as
+    {"result": ..., "note": ...}.
+    """
+    if isinstance(output, dict) and "result" in output and "note" in output:
+        output = output["result"]
+    if name == "WikidataEntityDetails" and isinstance(output, dict):
+        return output.get("id") or None
+    if name == "find_best_definition" and isinstance(output, dict):
+        return output.get("mapped_id") or None
+    if name == "find_term_in_ontology" and isinstance(output, (list, tuple)) and output:
+        return output[0] or None
+    return None
+
+
+def _iter_messages(update: Any):
+    """Messages contained in one node update of the `updates` stream."""
+    if not isinstance(update, dict):
+        return
+    for node_update in update.values():
+        if not isinstance(node_update, dict):
+            continue
+        msgs = node_update.get("messages")
+        # Some middleware wraps the list (e.g. Overwrite(value=[...]))
+        msgs = getattr(msgs, "value", msgs)
+        if isinstance(msgs, list):
+            for m in msgs:
+                yield m
+
+
+def _exceeded(budget: AgentBudget, stats: RunStats) -> Optional[str]:
+    if budget.max_llm_turns is not None and stats.llm_turns >= budget.max_llm_turns:
+        return "llm_turns"
+    if budget.max_tool_calls is not None and stats.tool_calls >= budget.max_tool_calls:
+        return "tool_calls"
+    if budget.max_tokens is not None and stats.tokens >= budget.max_tokens:
+        return "tokens"
+    if budget.max_seconds is not None and stats.seconds >= budget.max_seconds:
+        return "seconds"
+    return None
+
+
+class _BudgetedRun:
+    """
+    Bookkeeping for one budgeted run. `feed` takes one item of
+    agent.stream(..., stream_mode=["updates", "values"], subgraphs=True)
+    and returns True when the run should be stopped.
+    """
+
+    def __init__(self, budget: Optional[AgentBudget], on_event: Optional[Callable[[Dict[str, Any]], None]]):
+        self.budget = budget or AgentBudget()
+        self.on_event = on_event
+        self.stats = RunStats()
+        self.start = time.monotonic()
+        self.final_state = None
+        self.last_candidate: Optional[str] = None
+        self.best: Optional[Dict[str, str]] = None
+        self.status = "ok"
+        # tool calls that failed (raised, or a SKOS classification that errored)
+        self.errors: List[str] = []
+
+    def _emit(self, event: Dict[str, Any]):
+        self.stats.events.append(event)
+        if self.on_event is not None:
+            self.on_event(event)
+
+    def feed(self, item) -> bool:
+        # langchain_core is loaded by the agent anyway; not needed at import
+        from langchain_core.messages import AIMessage, ToolMessage
+
+        namespace, mode, chunk = item
+        if mode == "values":
+            if not namespace:  # root graph only
+                self.final_state = chunk
+            return False
+
+        for msg in _iter_messages(chunk):
+            if isinstance(msg, AIMessage):
+                self.stats.llm_turns += 1
+                usage = getattr(msg, "usage_metadata", None) or {}
+                self.stats.tokens += int(usage.get("total_tokens", 0) or 0)
+                for call in msg.tool_calls or []:
+                    self.stats.tool_calls += 1
+                    self._emit({"type": "tool_call", "tool": call.get("name"), "args": call.get("args", {})})
+
+            elif isinstance(msg, ToolMessage):
+                output = _load_tool_output(msg.content)
+                if getattr(msg, "status", "success") == "error":
+                    self.errors.append(f"{msg.name} failed: {str(msg.content)[:200]}")
+                    continue
+                cand = _candidate_from_tool(msg.name or "", output)
+                if cand:
+                    self.last_candidate = cand
+                    self._emit({"type": "candidate", "tool": msg.name, "id": cand})
+
+                if msg.name == "classify_skos_match" and isinstance(output, dict):
+                    if str(output.get("explanation", "")).startswith("ERROR:"):
+                        self.errors.append(f"SKOS classification of {self.last_candidate or '?'} failed: "
+                                           f"{output['explanation'][len('ERROR:'):].strip()}")
+                        continue
+                    skos = (output.get("mapping_type") or "").lower()
+                    verdict = {"id": self.last_candidate or "", "skos": skos, "explanation": output.get("explanation", "")}
+                    self._emit({"type": "verdict", **verdict})
+                    if self.last_candidate and SKOS_RANK.get(skos, 0) > SKOS_RANK.get((self.best or {}).get("skos", ""), 0):
+                        self.best = verdict
+                    if self.budget.stop_on_exact and skos == "exact" and self.last_candidate:
+                        self.status = "early_exit"
+                        return True
+
+        self.stats.seconds = time.monotonic() - self.start
+        reason = _exceeded(self.budget, self.stats)
+        if reason:
+            self.status = f"budget_exhausted:{reason}"
+            self._emit({"type": "budget_exhausted", "limit": reason, **self.stats.as_dict()})
+            return True
+        return False
+
+    def result(self) -> Dict[str, Any]:
+        self.stats.seconds = time.monotonic() - self.start
+        return {
+            "status": self.status,
+            "final_state": self.final_state if self.status == "ok" else None,
+            "candidate": self.best,
+            "errors": list(self.errors),
+            "stats": self.stats.as_dict(),
+        }
+
+
+def run_agent_with_budget(
+    agent,
+    inputs: Dict[str, Any],
+    budget: Optional[AgentBudget] = None,
+    on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Run a deep agent under `budget`.
+
+    Returns
+    -------
+    {
+        "status": "ok" | "early_exit" | "budget_exhausted:<limit>",
+        "final_state": <last graph state, None if stopped early>,
+        "candidate": {"id": ..., "skos": ..., "explanation": ...} or None,
+        "errors": [<message of every failed tool call>],
+        "stats": {"llm_turns": ..., "tool_calls": ..., "tokens": ..., "seconds": ...,
+                  "duplicate_tool_calls": ...},
+    }
+
+    `candidate` is the best SKOS-verified identifier seen so far
+    (exact > close > related). `on_event` receives small dicts describing
+    tool calls and verdicts while the run is in progress. The agent may
+    carry on after a failed tool call; such failures are listed in `errors`
+    so the row can be flagged instead of looking like a clean answer.
+
+    The run is a tool_memo_scope, so repeated identical tool calls are served
+    from the run cache and counted in duplicate_tool_calls.
+    """
+    run = _BudgetedRun(budget, on_event)
+    with tool_memo_scope("agent run") as memo:
+        stream = agent.stream(inputs, stream_mode=["updates", "values"], subgraphs=True)
+        try:
+            for item in stream:
+                if run.feed(item):
+                    break
+        finally:
+            # Closing the generator stops the graph run
+            stream.close()
+    run.stats.duplicate_tool_calls = sum(memo["duplicates"].values())
+    return run.result()
+
+
+async def arun_agent_with_budget(
+    agent,
+    inputs: Dict[str, Any],
+    budget: Optional[AgentBudget] = None,
+    on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """Async version of run_agent_with_budget (uses agent.astream)."""
+    run = _BudgetedRun(budget, on_event)
+    with tool_memo_scope("agent run") as memo:
+        stream = agent.astream(inputs, stream_mode=["updates", "values"], subgraphs=True)
+        try:
+            async for item in stream:
+                if run.feed(item):
+                    break
+        finally:
+            await stream.aclose()
+    run.stats.duplicate_tool_calls = sum(memo["duplicates"].values())
+    return run.result()
@@ -0,0 +1,182 @@
+# Built agents shared by all sessions of the process.
+#
+# An agent is compiled once per structural configuration, i.e. endpoint (and
+# parallel / orchestrated for the multiagent). The rest is injected when the
+# agent runs:
+#   - API keys: the chat model and the BioPortal tools read them from the
+#     credentials of the calling session (general_tools/credentials.py)
+#   - ontology lists: sent with every question (mapping_engine.build_question)
+# so neither a new session nor an edit of the ontology lists builds a new
+# graph. At most MAPPING_AGENT_CACHE_SIZE agents are kept (least recently used
+# ones are dropped first).
+#
+#   get_agent("Wikidata")                          # built on first use
+#   get_agent("Multiagent", parallel_multiagent=True)
+#   start_warmup(credentials_from_session(st.session_state))   # Home.py
+#   cache_stats()                                  # hits, builds, memory, ...
+#
+# start_warmup builds the Wikidata agent (and loads the SKOS examples) in a
+# background thread right after the keys are saved, so the first mapping does
+# not pay the cold start. A caller asking for an agent that is still being
+# built waits for that build instead of starting a second one.
+#
+# Nothing heavy is imported by this module itself.
+
+import os
+import sys
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from general_tools.credentials import Credentials, use_credentials
+
+logger = logging.getLogger(__name__)
+
+# Endpoints built by start_warmup; BioPortal agents also need the BioPortal
+# key, which is entered on the Mapping page
+WARMUP_ENDPOINTS = ["Wikidata"]
+
+
+def _max_entries() -> int:
+    return max(1, int(os.environ.get("MAPPING_AGENT_CACHE_SIZE") or 4))
+
+
+def _rss_mb() -> float:
+    """Resident memory of the process in MB (peak RSS where the current one is not available)."""
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # bytes on macOS, KB on Linux
+        return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+    except (ImportError, OSError):
+        return 0.0
+
+
+_lock = threading.Lock()
+# key -> {"agent", "built_at", "last_used", "uses", "build_seconds", "rss_delta_mb"}
+_agents: "OrderedDict[Tuple, Dict[str, Any]]" = OrderedDict()
+_building: Dict[Tuple, threading.Lock] = {}
+_warmups: set = set()
+_counters = {"hits": 0, "builds": 0, "build_errors": 0, "evictions": 0}
+
+
+def agent_key(endpoint: str, parallel_multiagent: bool = False) -> Tuple:
+    return (endpoint, bool(parallel_multiagent) and endpoint == "Multiagent")
+
+
+def get_agent(endpoint: str, parallel_multiagent: bool = False):
+    """Agent for endpoint, compiled once per structural configuration."""
+    key = agent_key(endpoint, parallel_multiagent)
+    with _lock:
+        entry = _agents.get(key)
+        if entry is not None:
+            return _use(key, entry)
+        build_lock = _building.setdefault(key, threading.Lock())
+
+    # one build per key; others wait for it
+    with build_lock:
+        with _lock:
+            entry = _agents.get(key)
+            if entry is not None:
+                return _use(key, entry)
+
+        from general_tools.batch_engine import build_agent
+        rss_before, started = _rss_mb(), time.perf_counter()
+        try:
+            agent = build_agent(endpoint, parallel_multiagent=key[1])
+        except Exception:
+            with _lock:
+                _counters["build_errors"] += 1
+            raise
+        entry = {
+            "agent": agent,
+            "built_at": time.time(),
+            "last_used": time.time(),
+            "uses": 1,
+            "build_seconds": round(time.perf_counter() - started, 3),
+            "rss_delta_mb": round(_rss_mb() - rss_before, 1),
+        }
+
+        with _lock:
+            _counters["builds"] += 1
+            _agents[key] = entry
+            _building.pop(key, None)
+            while len(_agents) > _max_entries():
+                old_key, _ = _agents.popitem(last=False)
+                _counters["evictions"] += 1
+                logger.info("Agent cache: dropped %s", old_key)
+        logger.info("Agent cache: built %s in %.1fs (%+.1f MB)", key, entry["build_seconds"], entry["rss_delta_mb"])
+        return agent
+
+
+def _use(key: Tuple, entry: Dict[str, Any]):
+    # called with _lock held
+    _counters["hits"] += 1
+    entry["uses"] += 1
+    entry["last_used"] = time.time()
+    _agents.move_to_end(key)
+    return entry["agent"]
+
+
+def is_ready(endpoint: str, parallel_multiagent: bool = False) -> bool:
+    with _lock:
+        return agent_key(endpoint, parallel_multiagent) in _agents
+
+
+def cache_stats() -> Dict[str, Any]:
+    """Counters, process memory and one row per cached agent (least recently used first)."""
+    with _lock:
+        entries = [
+            {
+                "endpoint": key[0],
+                "parallel": key[1],
+                "uses": e["uses"],
+                "build_seconds": e["build_seconds"],
+                "rss_delta_mb": e["rss_delta_mb"],
+                "built_at": time.strftime("%H:%M:%S", time.localtime(e["built_at"])),
+                "last_used": time.strftime("%H:%M:%S", time.localtime(e["last_used"])),
+            }
+            for key, e in _agents.items()
+        ]
+        return {**_counters, "size": len(entries), "max_size": _max_entries(),
+                "rss_mb": round(_rss_mb(), 1), "entries": entries}
+
+
+def clear():
+    with _lock:
+        _agents.clear()
+        _warmups.clear()
+
+
+def _warm_up(creds: Credentials, endpoints: List[str]):
+    with use_credentials(creds):
+        try:
+            from general_tools.training_examples import training_examples
+            import general_tools.mapping_engine  # noqa: F401  (pipeline / retrieve-rank modules)
+            training_examples()
+            for endpoint in endpoints:
+                get_agent(endpoint)
+            logger.info("Warm-up done: %s", ", ".join(endpoints))
+        except Exception:
+            # the page builds the agent again (and shows the error) on first use
+            logger.exception("Warm-up failed")
+
+
+def start_warmup(creds: Credentials, endpoints: Optional[List[str]] = None) -> bool:
+    """Build agents in a background thread; False if already built / started or no key."""
+    endpoints = [e for e in (endpoints or WARMUP_ENDPOINTS) if not is_ready(e)]
+    if not creds.openai_api_key or not endpoints:
+        return False
+    with _lock:
+        if tuple(endpoints) in _warmups:
+            return False
+        _warmups.add(tuple(endpoints))
+    threading.Thread(target=_warm_up, args=(creds, endpoints), name="agent-warmup", daemon=True).start()
+    return True
@@ -0,0 +1,39 @@
+# Where the app keeps its local state: the result / verdict cache, the batch
+# job database and the rendered training examples.
+#
+# The files used to be created in the working directory, i.e. inside the
+# checkout when the app is started from the repository root. They now go to a
+# per-user cache directory:
+#
+#   LLM4LDRECO_CACHE_DIR                   if set
+#   %LOCALAPPDATA%\llm4ldreco              on Windows
+#   $XDG_CACHE_HOME/llm4ldreco             else (default ~/.cache/llm4ldreco)
+#
+# Every file can still be moved on its own with its env var (MAPPING_CACHE_DB,
+# MAPPING_JOBS_DB, TRAINING_EXAMPLES_CACHE).
+
+import os
+from pathlib import Path
+
+APP_NAME = "llm4ldreco"
+
+
+def cache_dir() -> Path:
+    """The per-user cache directory (created if missing)."""
+    configured = os.environ.get("LLM4LDRECO_CACHE_DIR")
+    if configured:
+        path = Path(configured).expanduser()
+    elif os.name == "nt" and os.environ.get("LOCALAPPDATA"):
+        path = Path(os.environ["LOCALAPPDATA"]) / APP_NAME
+    else:
+        path = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / APP_NAME
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def cache_file(name: str, env_var: str) -> Path:
+    """`env_var` if set, else `name` in cache_dir()."""
+    configured = os.environ.get(env_var)
+    if configured:
+        return Path(configured).expanduser()
+    return cache_dir() / name
@@ -0,0 +1,284 @@
+# Concurrent batch mapping.
+#
+# The Mapping page used to map an uploaded sheet one term at a time. BatchRunner
+# maps several terms at once on a thread pool:
+#
+#   - max_workers limits the number of terms in flight overall
+#   - endpoint_limits limits terms per endpoint (e.g. {"Bioportal": 3}) so a
+#     large sheet does not run into the BioPortal rate limit
+#   - results come back in input order, errors stay per row (status "error")
+#   - identical terms (same canonical key, see canonical_key) are mapped once
+#     and the result is copied to every row that repeats them
+#
+# All callbacks (on_result, on_event, on_tick) are called from the thread that
+# called `run`, never from a worker thread. That keeps them safe for Streamlit,
+# which cannot draw from threads it did not start.
+#
+# Agents are passed in already built (`agents` = {endpoint: agent}) so callers
+# can keep their own agent caches; compiled LangGraph agents can be invoked
+# from several threads at the same time.
+
+import re
+import queue
+import hashlib
+import contextvars
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from general_tools.agent_budget import AgentBudget
+from general_tools.mapping_engine import map_term
+from general_tools.mapping_pipeline import normalize_term
+
+
+@dataclass
+class BatchItem:
+    """One term to map. `key` is the caller's row identifier (e.g. RowID)."""
+    term: str
+    definition: str
+    endpoint: str
+    engine: str = "Agent"
+    key: Any = None
+
+
+def build_agent(endpoint: str, parallel_multiagent: bool = False):
+    """
+    Compile the agent for the "Agent" engine (use general_tools.agent_cache
+    to share it). Keys and ontology lists are not part of the agent: they
+    are read per request / sent with every question.
+    Imported here, not at module level: the agent modules import
+    mapping_engine themselves.
+    """
+    if endpoint == "Wikidata":
+        from wikidata_agent_and_tools.deep_agent_wikidata import get_agent_wiki
+        return get_agent_wiki()
+    if endpoint == "Bioportal":
+        from bioportal_agent_and_tools.deep_agent_bioportal import get_agent_bioportal
+        return get_agent_bioportal()
+    if parallel_multiagent:
+        from bioportal_wikidata_system.parallel_multiagent import get_parallel_multiagent
+        return get_parallel_multiagent()
+    from bioportal_wikidata_system.multiagent_system import get_multiagent
+    return get_multiagent()
+
+
+def error_row(e: Exception) -> Dict[str, str]:
+    return {"IRI": "", "SKOS": "", "explanation": f"ERROR: {e}", "status": "error"}
+
+
+def _ontology_key(ontologies: Optional[List[str]]) -> Tuple[str, ...]:
+    return tuple(sorted({o.strip().upper() for o in (ontologies or []) if o.strip()}))
+
+
+def canonical_key(
+    item: BatchItem,
+    trusted_onts: Optional[List[str]] = None,
+    term_onts: Optional[List[str]] = None,
+) -> Tuple:
+    """
+    Rows with the same key get the same mapping:
+    ('dry matter', 'the dry matter of ...', 'Bioportal', 'Agent', ('MESH', 'NCIT'), ('NCIT',))
+
+    Term and definition are compared case-insensitively with collapsed
+    whitespace ('Dry_Matter ' == 'dry matter'); ontology lists ignore order.
+    """
+    definition = re.sub(r"\s+", " ", str(item.definition or "")).strip().casefold()
+    return (
+        normalize_term(str(item.term)).casefold(),
+        definition,
+        item.endpoint,
+        item.engine,
+        _ontology_key(trusted_onts),
+        _ontology_key(term_onts),
+    )
+
+
+def shard_of(item: BatchItem, shards: int) -> int:
+    """
+    Deterministic shard (0 .. shards-1) of a term. Based on the normalized
+    term and definition, so repeated terms land in the same shard and are
+    still mapped only once; stable across processes and machines (unlike
+    the built-in hash()).
+    """
+    term, definition = canonical_key(item)[:2]
+    digest = hashlib.sha1(f"{term}\x1f{definition}".encode("utf-8")).hexdigest()
+    return int(digest[:12], 16) % shards
+
+
+def dedupe_items(
+    items: List[BatchItem],
+    trusted_onts: Optional[List[str]] = None,
+    term_onts: Optional[List[str]] = None,
+) -> Tuple[List[BatchItem], List[int]]:
+    """
+    Returns (unique items, owner) where owner[i] is the position in the
+    unique list that answers items[i]. The first occurrence of a key is kept.
+    """
+    unique: List[BatchItem] = []
+    positions: Dict[Tuple, int] = {}
+    owner: List[int] = []
+    for item in items:
+        key = canonical_key(item, trusted_onts, term_onts)
+        if key not in positions:
+            positions[key] = len(unique)
+            unique.append(item)
+        owner.append(positions[key])
+    return unique, owner
+
+
+class BatchRunner:
+    def __init__(
+        self,
+        agents: Optional[Dict[str, Any]] = None,
+        term_onts: Optional[List[str]] = None,
+        trusted_onts: Optional[List[str]] = None,
+        budget: Optional[AgentBudget] = None,
+        max_workers: int = 4,
+        endpoint_limits: Optional[Dict[str, int]] = None,
+        poll_interval: float = 0.2,
+        dedupe: bool = True,
+        cache=None,
+        cache_mode: str = "use",
+        parallel_multiagent: bool = False,
+    ):
+        self.agents = agents or {}
+        self.term_onts = term_onts
+        self.trusted_onts = trusted_onts
+        self.budget = budget
+        self.max_workers = max(1, int(max_workers))
+        self.poll_interval = poll_interval
+        self.dedupe = dedupe
+        # ResultCache shared by all workers (see map_term)
+        self.cache = cache
+        self.cache_mode = cache_mode
+        # which Multiagent agent `agents` holds, part of the cache key
+        self.parallel_multiagent = parallel_multiagent
+        # endpoint -> max terms of that endpoint in flight; enforced when
+        # items are submitted, so a worker never blocks waiting for a slot
+        self._limits = {
+            endpoint: max(1, int(n))
+            for endpoint, n in (endpoint_limits or {}).items()
+            if n
+        }
+
+    def _map_one(self, index: int, item: BatchItem, events: "queue.Queue") -> Dict[str, Any]:
+        try:
+            return map_term(
+                item.endpoint,
+                item.term,
+                item.definition,
+                engine=item.engine,
+                agent=self.agents.get(item.endpoint) if item.engine == "Agent" else None,
+                term_onts=self.term_onts,
+                trusted_onts=self.trusted_onts,
+                budget=self.budget,
+                on_event=lambda e: events.put((index, e)),
+                cache=self.cache,
+                cache_mode=self.cache_mode,
+                parallel_multiagent=self.parallel_multiagent,
+            )
+        except Exception as e:
+            return error_row(e)
+
+    def _next_ready(self, waiting: List[int], unique: List[BatchItem], in_flight: Dict[str, int]) -> Optional[int]:
+        """First waiting term whose endpoint is below its limit (input order otherwise)."""
+        for pos, u in enumerate(waiting):
+            endpoint = unique[u].endpoint
+            limit = self._limits.get(endpoint)
+            if limit is None or in_flight.get(endpoint, 0) < limit:
+                return waiting.pop(pos)
+        return None
+
+    def run(
+        self,
+        items: List[BatchItem],
+        on_result: Optional[Callable[[int, BatchItem, Dict[str, Any]], None]] = None,
+        on_event: Optional[Callable[[int, Dict[str, Any]], None]] = None,
+        on_tick: Optional[Callable[[int, int], None]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Map all items; returns the rows in the order of `items`.
+
+        on_result(index, item, row) - a term finished (called for every
+                                      repeated row of a de-duplicated term)
+        on_event(index, event)      - progress event of a running term
+                                      (index of its first row)
+        on_tick(done, total)        - called every poll_interval while running
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+        events: "queue.Queue" = queue.Queue()
+
+        if self.dedupe:
+            unique, owner = dedupe_items(items, self.trusted_onts, self.term_onts)
+        else:
+            unique, owner = list(items), list(range(len(items)))
+        # unique position -> all source rows it answers
+        rows_of: List[List[int]] = [[] for _ in unique]
+        for i, u in enumerate(owner):
+            rows_of[u].append(i)
+
+        def _drain():
+            while True:
+                try:
+                    u, event = events.get_nowait()
+                except queue.Empty:
+                    return
+                if on_event is not None:
+                    on_event(rows_of[u][0], event)
+
+        waiting = list(range(len(unique)))
+        in_flight: Dict[str, int] = {}
+        pending: Dict[Any, int] = {}
+
+        def _submit_ready(pool):
+            # At most max_workers terms in flight, and per endpoint at most its
+            # limit; a term held back by its endpoint limit does not block the
+            # terms of other endpoints behind it
+            while len(pending) < self.max_workers:
+                u = self._next_ready(waiting, unique, in_flight)
+                if u is None:
+                    return
+                endpoint = unique[u].endpoint
+                in_flight[endpoint] = in_flight.get(endpoint, 0) + 1
+                # Each worker runs in a copy of the caller's context, so context
+                # variables set by the caller are visible inside the mapping
+                fut = pool.submit(contextvars.copy_context().run, self._map_one, u, unique[u], events)
+                pending[fut] = u
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="batch-map") as pool:
+            _submit_ready(pool)
+            done_count = 0
+            try:
+                while pending:
+                    done, _ = wait(pending, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                    _drain()
+                    for fut in done:
+                        u = pending.pop(fut)
+                        in_flight[unique[u].endpoint] -= 1
+                        try:
+                            row = fut.result()
+                        except Exception as e:
+                            row = error_row(e)
+                        row.setdefault("status", "ok")
+                        for i in rows_of[u]:
+                            results[i] = dict(row)
+                            done_count += 1
+                            if on_result is not None:
+                                on_result(i, items[i], results[i])
+                    _submit_ready(pool)
+                    if on_tick is not None:
+                        on_tick(done_count, len(items))
+            finally:
+                # Stopped early (e.g. a Streamlit rerun) -> drop queued terms
+                waiting.clear()
+                for fut in pending:
+                    fut.cancel()
+            _drain()
+
+        return results
+
+
+def run_batch(items: List[BatchItem], **kwargs) -> List[Dict[str, Any]]:
+    """BatchRunner(**options).run(items, callbacks) in one call."""
+    callbacks = {k: kwargs.pop(k) for k in ("on_result", "on_event", "on_tick") if k in kwargs}
+    return BatchRunner(**kwargs).run(items, **callbacks)
@@ -0,0 +1,100 @@
+# Batch result frame of the Mapping page.
+#
+# One row per uploaded term, indexed by RowID (the job store row id), so
+# selecting and updating rows are hash lookups instead of scans over the whole
+# frame - re-evaluating a few hundred rows of a large batch stays linear.
+#
+#   df = ensure_batch_schema(store.rows_frame(job_id))
+#   df = apply_reeval(df, items, outs, run_id)   # items keyed by RowID
+#   view = filter_batch(df, ["exact"], [], False, "")
+#   export_xlsx(df)                              # download workbook
+
+import uuid
+from io import BytesIO
+from typing import Any, Dict, List
+
+import pandas as pd
+
+from general_tools.batch_engine import BatchItem
+from general_tools.mapping_engine import status_label
+
+BATCH_SCHEMA_COLUMNS = ["RowID", "OriginalTerm", "last_updated_run", "Engine", "Status"]
+
+# Columns of the downloaded workbook
+EXPORT_COLUMNS = ["Term", "IRI", "SKOS", "explanation", "Status"]
+
+
+def ensure_batch_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Ensure RowID + OriginalTerm + last_updated_run + Engine + Status columns
+    exist and RowID is the index. A frame that already has the schema is
+    returned as is (no copy), so this is cheap on every rerun.
+    """
+    if df.attrs.get("batch_schema") and all(c in df.columns for c in BATCH_SCHEMA_COLUMNS):
+        return df
+
+    out = df.copy()
+
+    if "RowID" not in out.columns:
+        out.insert(0, "RowID", [str(uuid.uuid4()) for _ in range(len(out))])
+
+    if "OriginalTerm" not in out.columns:
+        out["OriginalTerm"] = out["Term"]
+
+    if "last_updated_run" not in out.columns:
+        out["last_updated_run"] = ""
+
+    if "Engine" not in out.columns:
+        out["Engine"] = "Agent"
+
+    if "Status" not in out.columns:
+        out["Status"] = "ok"
+
+    out.index = pd.Index(out["RowID"].astype(str).to_numpy())
+    out.attrs["batch_schema"] = True
+
+    return out
+
+
+def apply_reeval(df: pd.DataFrame, items: List[BatchItem], outs: List[Dict[str, Any]], run_id: str) -> pd.DataFrame:
+    """Write re-evaluation results into the RowID-indexed batch frame in one vectorized update."""
+    rowids = [item.key for item in items]
+    # Keep the term of the first mapping when a new term is tried
+    original = df.loc[rowids, "OriginalTerm"].astype(str)
+    df.loc[rowids, "OriginalTerm"] = original.where(original != "", df.loc[rowids, "Term"])
+
+    df.loc[rowids, ["Term", "IRI", "SKOS", "explanation", "Status", "last_updated_run"]] = [
+        [item.term, out["IRI"], out["SKOS"], out["explanation"], status_label(out), run_id]
+        for item, out in zip(items, outs)
+    ]
+    return df
+
+
+def filter_batch(
+    df: pd.DataFrame,
+    skos: List[str],
+    endpoints: List[str],
+    no_match_only: bool,
+    term_contains: str,
+) -> pd.DataFrame:
+    """Rows matching the result filters; boolean masks only, the frame is not copied."""
+    mask = pd.Series(True, index=df.index)
+    if skos:
+        skos_col = df["SKOS"].astype(str).str.strip().str.lower().replace("", "none")
+        mask &= skos_col.isin(skos)
+    if endpoints:
+        mask &= df["Endpoint"].astype(str).isin(endpoints)
+    if no_match_only:
+        iri = df["IRI"].astype(str)
+        mask &= (iri == "") | iri.str.startswith("No ")
+    if term_contains.strip():
+        mask &= df["Term"].astype(str).str.contains(term_contains.strip(), case=False, regex=False)
+    return df if mask.all() else df[mask]
+
+
+def export_xlsx(df: pd.DataFrame) -> bytes:
+    """The batch results as an .xlsx workbook (sheet "mapping")."""
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine="openpyxl") as writer:
+        df[EXPORT_COLUMNS].to_excel(writer, index=False, sheet_name="mapping")
+    return output.getvalue()
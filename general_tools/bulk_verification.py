@@ -0,0 +1,190 @@
+# Bulk SKOS verification of an existing mapping table
+# (pages/Verification_service.py, "Bulk upload" mode).
+#
+# Input: xlsx or csv with the columns
+#   Term, Term Definition, Label, Label Definition, Provided SKOS
+# (header case, "_" / "-" and a "skos:" prefix / "Match" suffix of the SKOS
+# values do not matter: "skos:exactMatch" == "exact").
+#
+#   df = read_verification_table(uploaded_file)
+#   out = verify_table(df, max_concurrency=8, cache=get_verdict_cache(), on_progress=...)
+#   export_xlsx(out)   # "verification" + "disagreements" sheets
+#
+# Identical pairs (same normalized term, label and definitions) are classified
+# once. Verdicts are stored in the VerdictCache (result_cache.py), so a pair
+# checked before - in this table, an earlier upload or another session - is
+# not sent to the LLM again; failed pairs are not stored.
+
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+from general_tools.result_cache import VerdictCache, verdict_key
+from general_tools.skos_tools import classify_skos_matches
+
+VERIFY_COLUMNS = ["Term", "Term Definition", "Label", "Label Definition", "Provided SKOS"]
+SKOS_CLASSES = ["exact", "close", "related", "none"]
+RESULT_COLUMNS = ["Predicted SKOS", "Agreement", "Explanation", "Cached"]
+
+# accepted header spellings (after lower-casing and "_" / "-" -> " ")
+_HEADER_ALIASES = {
+    "term": "Term",
+    "term definition": "Term Definition",
+    "definition": "Term Definition",
+    "label": "Label",
+    "label definition": "Label Definition",
+    "provided skos": "Provided SKOS",
+    "skos": "Provided SKOS",
+}
+
+
+def _header_key(name: Any) -> str:
+    return " ".join(str(name).replace("_", " ").replace("-", " ").split()).lower()
+
+
+def normalize_skos(value: Any) -> str:
+    """'skos:exactMatch' / 'Exact match' / 'exact' -> 'exact'; empty stays empty."""
+    text = "" if value is None or (isinstance(value, float) and pd.isna(value)) else str(value)
+    text = text.strip().lower()
+    if text.startswith("skos:"):
+        text = text[len("skos:"):]
+    text = text.replace("_", " ").replace(" ", "")
+    if text.endswith("match"):
+        text = text[: -len("match")]
+    return text
+
+
+def read_verification_table(file, name: Optional[str] = None) -> pd.DataFrame:
+    """
+    Read an uploaded xlsx / csv (file object or path). Raises ValueError if a
+    required column is missing; rows without Term or Label are dropped.
+    """
+    suffix = Path(name or getattr(file, "name", "") or str(file)).suffix.lower()
+    if suffix == ".csv":
+        df = pd.read_csv(file, dtype=str)
+    elif suffix in {".xlsx", ".xls"}:
+        df = pd.read_excel(file, dtype=str)
+    else:
+        raise ValueError(f"Unsupported file type {suffix!r} (use .xlsx or .csv).")
+
+    rename = {}
+    for col in df.columns:
+        target = _HEADER_ALIASES.get(_header_key(col))
+        if target and target not in rename.values():
+            rename[col] = target
+    df = df.rename(columns=rename)
+
+    missing = [c for c in VERIFY_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"Missing required column(s): {', '.join(missing)}.")
+
+    df = df.copy()
+    for col in VERIFY_COLUMNS:
+        df[col] = df[col].fillna("").astype(str).str.strip()
+    keep = (df["Term"] != "") & (df["Label"] != "") & (df["Term"].str.lower() != "nan")
+    return df[keep].reset_index(drop=True)
+
+
+def _is_error(verdict: Dict[str, Any]) -> bool:
+    return str(verdict.get("explanation", "")).startswith("ERROR:")
+
+
+def verify_table(
+    df: pd.DataFrame,
+    max_concurrency: int = 8,
+    cache: Optional[VerdictCache] = None,
+    cache_mode: str = "use",
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> pd.DataFrame:
+    """
+    Classify every Term / Label pair of `df` (see read_verification_table) and
+    compare with Provided SKOS. Returns a copy of `df` with the RESULT_COLUMNS
+    added, in the original row order.
+
+    cache_mode: "use" (serve + store), "refresh" (re-classify, store),
+    "bypass" (no cache). on_progress(done, total) counts unique pairs and is
+    called in the calling thread.
+    """
+    if cache_mode == "bypass":
+        cache = None
+    make_key = cache.key_for if cache is not None else verdict_key
+
+    keys = [
+        make_key(row["Term"], row["Term Definition"], row["Label"], row["Label Definition"])
+        for _, row in df.iterrows()
+    ]
+    # first row of every unique pair
+    first_row: Dict[str, int] = {}
+    for i, key in enumerate(keys):
+        first_row.setdefault(key, i)
+
+    verdicts: Dict[str, Dict[str, Any]] = {}
+    if cache is not None and cache_mode == "use":
+        verdicts.update(cache.get_many(list(first_row)))
+
+    todo: List[str] = [k for k in first_row if k not in verdicts]
+    total = len(first_row)
+    done = total - len(todo)
+    if on_progress is not None:
+        on_progress(done, total)
+
+    def _store(index: int, verdict: Dict[str, str]):
+        nonlocal done
+        key = todo[index]
+        verdicts[key] = {**verdict, "cached": False}
+        if cache is not None and not _is_error(verdict):
+            row = df.iloc[first_row[key]]
+            cache.put(key, row["Term"], row["Label"], verdict)
+        done += 1
+        if on_progress is not None:
+            on_progress(done, total)
+
+    if todo:
+        pairs = []
+        for key in todo:
+            row = df.iloc[first_row[key]]
+            pairs.append({"term_a": row["Term"], "gen_def": row["Term Definition"],
+                          "term_b": row["Label"], "onto_def": row["Label Definition"]})
+        classify_skos_matches(pairs, max_concurrency=max_concurrency, on_result=_store)
+
+    out = df.copy()
+    predicted, agreement, explanation, cached = [], [], [], []
+    for provided, key in zip(out["Provided SKOS"], keys):
+        verdict = verdicts.get(key) or {"mapping_type": "none", "explanation": "ERROR: no result"}
+        mapping_type = normalize_skos(verdict.get("mapping_type"))
+        predicted.append(mapping_type)
+        explanation.append(str(verdict.get("explanation", "")))
+        cached.append(bool(verdict.get("cached")))
+        if _is_error(verdict):
+            agreement.append("error")
+        else:
+            agreement.append("agree" if normalize_skos(provided) == mapping_type else "disagree")
+    out["Predicted SKOS"] = predicted
+    out["Agreement"] = agreement
+    out["Explanation"] = explanation
+    out["Cached"] = cached
+    return out
+
+
+def summarize(result_df: pd.DataFrame) -> Dict[str, Any]:
+    counts = result_df["Agreement"].value_counts()
+    checked = int(counts.get("agree", 0) + counts.get("disagree", 0))
+    return {
+        "rows": len(result_df),
+        "agree": int(counts.get("agree", 0)),
+        "disagree": int(counts.get("disagree", 0)),
+        "error": int(counts.get("error", 0)),
+        "cached": int(result_df["Cached"].sum()),
+        "agreement_rate": round(float(counts.get("agree", 0)) / checked, 3) if checked else None,
+    }
+
+
+def export_xlsx(result_df: pd.DataFrame) -> bytes:
+    """All rows plus a sheet with the disagreements / errors only."""
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine="openpyxl") as writer:
+        result_df.to_excel(writer, index=False, sheet_name="verification")
+        result_df[result_df["Agreement"] != "agree"].to_excel(writer, index=False, sheet_name="disagreements")
+    return output.getvalue()
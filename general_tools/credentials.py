@@ -0,0 +1,157 @@
+# Request-scoped credentials and BioPortal configuration.
+#
+# The Streamlit pages used to copy the API keys of a session into os.environ,
+# which is shared by every session and thread of the server process: two users
+# mapping at the same time could run with each other's keys. Instead the keys
+# live in a context variable:
+#
+#   set_credentials(credentials_from_session(st.session_state))   # once per page run
+#   with use_credentials(Credentials(openai_api_key=...)):         # scoped
+#       ...
+#
+# Threads started with contextvars.copy_context() (BatchRunner) and LangChain
+# tool executors inherit the value. Code that runs outside of any scope (the
+# CLI, batch_worker.py, the MCP server) falls back to the environment
+# variables, so nothing changes there.
+
+import os
+from dataclasses import dataclass, replace
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+
+def _csv_tuple(text: str) -> Tuple[str, ...]:
+    return tuple(x.strip() for x in (text or "").split(",") if x.strip())
+
+
+@dataclass(frozen=True)
+class Credentials:
+    openai_api_key: str = ""
+    bioportal_api_key: str = ""
+    langsmith_api_key: str = ""
+    trusted_ontologies: Tuple[str, ...] = ()
+    term_ontologies: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_env(cls) -> "Credentials":
+        return cls(
+            openai_api_key=os.environ.get("OPENAI_API_KEY", "").strip(),
+            bioportal_api_key=os.environ.get("BIOPORTAL_API_KEY", "").strip(),
+            langsmith_api_key=os.environ.get("LANGSMITH_API_KEY", "").strip(),
+            trusted_ontologies=_csv_tuple(os.environ.get("BIOPORTAL_TRUSTED_ONTOLOGIES", "")),
+            term_ontologies=_csv_tuple(os.environ.get("BIOPORTAL_TERM_ONTOLOGIES", "")),
+        )
+
+
+_CURRENT: ContextVar[Optional[Credentials]] = ContextVar("mapping_credentials", default=None)
+
+
+def credentials_from_session(state: Mapping[str, Any]) -> Credentials:
+    """Credentials of one Streamlit session (keys entered on Home / the Mapping page)."""
+    return Credentials(
+        openai_api_key=str(state.get("OPENAI_API_KEY") or "").strip(),
+        bioportal_api_key=str(state.get("bioportal_api_key_input") or "").strip(),
+        langsmith_api_key=str(state.get("LANGSMITH_API_KEY") or "").strip(),
+        trusted_ontologies=_csv_tuple(state.get("trusted_ontologies_input", "")),
+        term_ontologies=_csv_tuple(state.get("term_ontologies_input", "")),
+    )
+
+
+def current_credentials() -> Credentials:
+    """Credentials of the current context; environment variables if none were set."""
+    creds = _CURRENT.get()
+    return creds if creds is not None else Credentials.from_env()
+
+
+def set_credentials(creds: Credentials):
+    """Set the credentials for the rest of the current context (e.g. one Streamlit script run)."""
+    return _CURRENT.set(creds)
+
+
+@contextmanager
+def use_credentials(creds: Optional[Credentials] = None, **overrides):
+    """Scope with `creds` (default: the current ones) updated by `overrides`."""
+    token = _CURRENT.set(replace(creds or current_credentials(), **overrides))
+    try:
+        yield _CURRENT.get()
+    finally:
+        _CURRENT.reset(token)
+
+
+def openai_api_key() -> str:
+    return current_credentials().openai_api_key
+
+
+def bioportal_api_key() -> str:
+    return current_credentials().bioportal_api_key
+
+
+def require_openai_api_key() -> str:
+    key = openai_api_key()
+    if not key:
+        raise RuntimeError("OPENAI_API_KEY is not set (expected session key or env var).")
+    return key
+
+
+def require_bioportal_api_key() -> str:
+    key = bioportal_api_key()
+    if not key:
+        raise RuntimeError("BIOPORTAL_API_KEY is not set (expected session key or env var).")
+    return key
+
+
+def _context_auth():
+    """
+    httpx auth that sets the Authorization header of every request from the
+    credentials of the calling thread / task. httpx runs the auth flow in the
+    thread (or task) that sends the request, so concurrent sessions sharing
+    one client each send their own key.
+    """
+    import httpx
+
+    class _ContextBearer(httpx.Auth):
+        def auth_flow(self, request):
+            request.headers["Authorization"] = f"Bearer {require_openai_api_key()}"
+            yield request
+
+    return _ContextBearer()
+
+
+# Sent by the openai client itself; always replaced by _context_auth
+_PLACEHOLDER_KEY = "set-per-request"
+
+
+def session_chat_model(model: str = "gpt-5.1", **kwargs):
+    """
+    ChatOpenAI that sends the OpenAI key of the current context with every
+    request, so a model (and an agent compiled around it) can be shared by all
+    sessions. The openai client keeps one key per client object, so the key
+    is not given to it; the HTTP clients passed to ChatOpenAI authenticate
+    each request with the key of the caller's context instead
+    (openai.DefaultHttpxClient keeps the openai defaults for timeouts and
+    connection limits).
+    """
+    import openai
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(
+        model=model,
+        api_key=_PLACEHOLDER_KEY,
+        http_client=openai.DefaultHttpxClient(auth=_context_auth()),
+        http_async_client=openai.DefaultAsyncHttpxClient(auth=_context_auth()),
+        **kwargs,
+    )
+
+
+def child_env(creds: Optional[Credentials] = None) -> Dict[str, str]:
+    """Environment for a subprocess (e.g. the MCP server) carrying the current keys."""
+    creds = creds or current_credentials()
+    env = dict(os.environ)
+    for name, value in [
+        ("OPENAI_API_KEY", creds.openai_api_key),
+        ("BIOPORTAL_API_KEY", creds.bioportal_api_key),
+    ]:
+        if value:
+            env[name] = value
+    return env
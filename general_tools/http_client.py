@@ -0,0 +1,149 @@
+# Shared HTTP layer of the Wikidata / BioPortal tools.
+#
+#   resp = http_get(url, params=..., headers=..., timeout=15)   # like requests.get
+#
+# - one requests.Session with a connection pool, so repeated calls to
+#   wikidata.org / data.bioontology.org reuse their TCP/TLS connections
+# - a process-wide response cache: successful (200) responses are kept for
+#   HTTP_CACHE_TTL seconds (default 3600, 0 disables the cache), at most
+#   HTTP_CACHE_SIZE entries (default 2048, least recently used dropped first).
+#   The BioPortal `apikey` parameter is not part of the cache key, so callers
+#   with different keys share the (public) ontology results.
+#
+# Everything in the process shares it: the agents of all Streamlit sessions,
+# and all clients of mcp_lookup_server.py.
+#
+# use_http_session(session) swaps the session for the whole process, e.g. the
+# recorded fixtures of benchmarks/offline_benchmark.py.
+
+import os
+import time
+import json
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# query parameters that do not change the response
+_IGNORED_PARAMS = {"apikey"}
+
+_session_lock = threading.Lock()
+_session: Optional[requests.Session] = None
+# replaces _session while set (use_http_session)
+_override = None
+
+
+def http_session() -> requests.Session:
+    global _session
+    with _session_lock:
+        if _override is not None:
+            return _override
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=8, pool_maxsize=32)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+@contextmanager
+def use_http_session(session):
+    """Route every http_get of the process through `session` (anything with a requests-like .get)."""
+    global _override
+    with _session_lock:
+        previous, _override = _override, session
+    try:
+        yield session
+    finally:
+        with _session_lock:
+            _override = previous
+
+
+class ResponseCache:
+    """Thread-safe TTL + LRU cache of (status, body, headers) per request."""
+
+    def __init__(self, ttl_seconds: float = 3600.0, max_entries: int = 2048):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, int, bytes, Dict[str, str], str]]" = OrderedDict()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def key(url: str, params: Optional[Dict[str, Any]] = None) -> str:
+        kept = sorted((k, str(v)) for k, v in (params or {}).items() if k not in _IGNORED_PARAMS)
+        return json.dumps([url, kept], ensure_ascii=False)
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    def get(self, key: str) -> Optional[requests.Response]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+                if entry is not None:
+                    del self._entries[key]
+                self._counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+        _, status, body, headers, url = entry
+        return _response(status, body, headers, url)
+
+    def put(self, key: str, resp: requests.Response):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), resp.status_code, resp.content, dict(resp.headers), resp.url)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._counters, "size": len(self._entries), "max_size": self.max_entries,
+                    "ttl_seconds": self.ttl_seconds}
+
+
+def _response(status: int, body: bytes, headers: Dict[str, str], url: str) -> requests.Response:
+    # a fresh Response per hit, so callers can consume / mutate it freely
+    resp = requests.Response()
+    resp.status_code = status
+    resp._content = body
+    resp.headers.update(headers)
+    resp.url = url
+    resp.encoding = requests.utils.get_encoding_from_headers(resp.headers) or "utf-8"
+    return resp
+
+
+response_cache = ResponseCache(
+    ttl_seconds=float(os.environ.get("HTTP_CACHE_TTL") or 3600),
+    max_entries=int(os.environ.get("HTTP_CACHE_SIZE") or 2048),
+)
+
+
+def http_get(
+    url: str,
+    params: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: float = 15,
+) -> requests.Response:
+    """requests.get through the shared session and response cache."""
+    key = response_cache.key(url, params) if response_cache.enabled else None
+    if key is not None:
+        cached = response_cache.get(key)
+        if cached is not None:
+            return cached
+
+    resp = http_session().get(url, params=params, headers=headers, timeout=timeout)
+    if key is not None and resp.status_code == 200:
+        response_cache.put(key, resp)
+    return resp
@@ -0,0 +1,360 @@
+# Durable store for batch mapping jobs (SQLite).
+#
+# A batch job is one uploaded sheet. Every row is stored with its own state
+#   pending -> done | error
+# and the mapping result is written as soon as the row finishes, so a browser
+# refresh, a Streamlit rerun or a crash only loses the rows that were still
+# running. `pending_items` returns what is left to do (pending and error rows),
+# which is how a job is resumed.
+#
+# Jobs run either inline (mode "inline", mapped by the Streamlit script that
+# created them) or by background workers (mode "worker", see batch_worker.py).
+# Workers claim small chunks of rows (state "running" plus a lease), so any
+# number of worker processes can share one job; rows of a worker that died
+# are claimable again once their lease expires.
+#
+# The database file is mapping_jobs.sqlite3 in the user cache directory (see
+# app_paths.py) and can be moved with the MAPPING_JOBS_DB env var. Every call opens its own short-lived
+# connection, so the store can be used from several threads and processes.
+
+import json
+import time
+import uuid
+import sqlite3
+from datetime import datetime
+from contextlib import closing
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from general_tools.agent_budget import AgentBudget
+from general_tools.app_paths import cache_file
+from general_tools.batch_engine import BatchItem
+from general_tools.mapping_engine import status_label
+
+DB_NAME = "mapping_jobs.sqlite3"
+
+# Columns of the batch result frame used by the Mapping page
+BATCH_COLUMNS = [
+    "RowID", "Term", "Definition", "Endpoint", "Engine",
+    "IRI", "SKOS", "explanation", "Status", "OriginalTerm", "last_updated_run",
+]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id     TEXT PRIMARY KEY,
+    name       TEXT NOT NULL,
+    endpoint   TEXT NOT NULL,
+    engine     TEXT NOT NULL,
+    config     TEXT NOT NULL,
+    status     TEXT NOT NULL,
+    mode       TEXT NOT NULL DEFAULT 'inline',
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_rows (
+    job_id           TEXT NOT NULL,
+    row_id           TEXT NOT NULL,
+    position         INTEGER NOT NULL,
+    term             TEXT NOT NULL,
+    definition       TEXT NOT NULL,
+    endpoint         TEXT NOT NULL,
+    engine           TEXT NOT NULL,
+    original_term    TEXT NOT NULL,
+    state            TEXT NOT NULL DEFAULT 'pending',
+    iri              TEXT NOT NULL DEFAULT '',
+    skos             TEXT NOT NULL DEFAULT '',
+    explanation      TEXT NOT NULL DEFAULT '',
+    run_status       TEXT NOT NULL DEFAULT '',
+    last_updated_run TEXT NOT NULL DEFAULT '',
+    worker           TEXT NOT NULL DEFAULT '',
+    claimed_at       REAL NOT NULL DEFAULT 0,
+    updated_at       TEXT NOT NULL,
+    PRIMARY KEY (job_id, row_id)
+);
+CREATE INDEX IF NOT EXISTS job_rows_state ON job_rows (job_id, state);
+"""
+
+# Columns added after the first version of the schema: {table: {column: definition}}
+_MIGRATIONS = {
+    "jobs": {"mode": "TEXT NOT NULL DEFAULT 'inline'"},
+    "job_rows": {"worker": "TEXT NOT NULL DEFAULT ''", "claimed_at": "REAL NOT NULL DEFAULT 0"},
+}
+
+
+def runner_options(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    BatchRunner keyword arguments (ontologies, budget, concurrency, cache
+    and Multiagent mode) from the config stored with a job, so a resumed job runs with the
+    settings it was created with, inline or in a worker. Agents and the cache
+    object are the caller's.
+    """
+    bioportal_limit = int(config.get("bioportal_limit") or 0)
+    return {
+        "term_onts": list(config.get("term_onts") or []),
+        "trusted_onts": list(config.get("trusted_onts") or []),
+        "budget": AgentBudget(**config["budget"]) if config.get("budget") else None,
+        "max_workers": int(config.get("max_workers") or 1),
+        # Multiagent queries BioPortal too
+        "endpoint_limits": {"Bioportal": bioportal_limit, "Multiagent": bioportal_limit},
+        "cache_mode": config.get("cache_mode", "use"),
+        "parallel_multiagent": bool(config.get("parallel_multiagent")),
+    }
+
+
+def reeval_config(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Config for re-evaluating rows: stored results are refreshed instead of
+    used, so an unedited term is mapped again and its new result replaces
+    the cached one. A bypassed cache stays bypassed.
+    """
+    return {**config, "cache_mode": "bypass" if config.get("cache_mode") == "bypass" else "refresh"}
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+class JobStore:
+    def __init__(self, path: Optional[str] = None):
+        self.path = str(path or cache_file(DB_NAME, "MAPPING_JOBS_DB"))
+        with closing(self._connect()) as con, con:
+            con.executescript(_SCHEMA)
+            for table, columns in _MIGRATIONS.items():
+                existing = {r["name"] for r in con.execute(f"PRAGMA table_info({table})")}
+                for column, definition in columns.items():
+                    if column not in existing:
+                        con.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    def _connect(self) -> sqlite3.Connection:
+        con = sqlite3.connect(self.path, timeout=30)
+        con.row_factory = sqlite3.Row
+        # WAL lets readers (the page) poll while a writer saves rows
+        con.execute("PRAGMA journal_mode=WAL")
+        return con
+
+    # ------------------------------------------------------------
+    # Jobs
+    # ------------------------------------------------------------
+
+    def create_job(
+        self,
+        items: List[BatchItem],
+        endpoint: str,
+        engine: str,
+        config: Optional[Dict[str, Any]] = None,
+        name: str = "",
+        status: str = "pending",
+        mode: str = "inline",
+    ) -> str:
+        """
+        Store a new job with one pending row per item; returns the job id.
+        `config` keeps everything needed to resume the job later
+        (ontologies, budget, concurrency). mode="worker" with status="queued"
+        hands the job to the background workers.
+        """
+        job_id = uuid.uuid4().hex[:12]
+        now = _now()
+        with closing(self._connect()) as con, con:
+            con.execute(
+                "INSERT INTO jobs (job_id, name, endpoint, engine, config, status, mode, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, name or f"{endpoint} batch", endpoint, engine,
+                 json.dumps(config or {}, ensure_ascii=False), status, mode, now, now),
+            )
+            con.executemany(
+                "INSERT INTO job_rows (job_id, row_id, position, term, definition, endpoint, engine,"
+                " original_term, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (job_id, str(item.key or uuid.uuid4()), n, str(item.term), str(item.definition),
+                     item.endpoint, item.engine, str(item.term), now)
+                    for n, item in enumerate(items)
+                ],
+            )
+        return job_id
+
+    def set_job_status(self, job_id: str, status: str):
+        with closing(self._connect()) as con, con:
+            con.execute("UPDATE jobs SET status = ?, updated_at = ? WHERE job_id = ?", (status, _now(), job_id))
+
+    def finish_job(self, job_id: str) -> str:
+        """
+        Mark the job done if no row is left, otherwise incomplete. A worker
+        job with rows still pending or claimed by other workers keeps its
+        status.
+        """
+        job = self.get_job(job_id)
+        counts = self.row_counts(job_id)
+        open_rows = counts.get("pending", 0) + counts.get("running", 0)
+        if job["mode"] == "worker" and (open_rows or job["status"] == "cancelled"):
+            return job["status"]
+        status = "done" if open_rows + counts.get("error", 0) == 0 else "incomplete"
+        self.set_job_status(job_id, status)
+        return status
+
+    def requeue_job(self, job_id: str):
+        """Hand a job (its pending and failed rows) to the background workers."""
+        with closing(self._connect()) as con, con:
+            con.execute(
+                "UPDATE job_rows SET state = 'pending', worker = '', claimed_at = 0"
+                " WHERE job_id = ? AND state = 'error'",
+                (job_id,),
+            )
+            con.execute(
+                "UPDATE jobs SET mode = 'worker', status = 'queued', updated_at = ? WHERE job_id = ?",
+                (_now(), job_id),
+            )
+
+    def claim_rows(self, worker: str, limit: int = 8, lease_seconds: float = 1800.0):
+        """
+        Claim up to `limit` rows of the oldest queued/running worker job.
+        Returns (job, items) or (None, []) if there is nothing to do.
+
+        Rows claimed by a worker that did not report back within
+        `lease_seconds` are handed out again.
+        """
+        now = time.time()
+        con = self._connect()
+        try:
+            # IMMEDIATE takes the write lock up front, so two workers cannot
+            # claim the same rows
+            con.execute("BEGIN IMMEDIATE")
+            rows = con.execute(
+                """
+                SELECT r.job_id, r.row_id, r.term, r.definition, r.endpoint, r.engine
+                FROM job_rows r JOIN jobs j ON j.job_id = r.job_id
+                WHERE j.mode = 'worker' AND j.status IN ('queued', 'running')
+                  AND (r.state = 'pending' OR (r.state = 'running' AND r.claimed_at < ?))
+                  AND r.job_id = (
+                      SELECT j2.job_id FROM jobs j2 JOIN job_rows r2 ON r2.job_id = j2.job_id
+                      WHERE j2.mode = 'worker' AND j2.status IN ('queued', 'running')
+                        AND (r2.state = 'pending' OR (r2.state = 'running' AND r2.claimed_at < ?))
+                      ORDER BY j2.created_at LIMIT 1)
+                ORDER BY r.position
+                LIMIT ?
+                """,
+                (now - lease_seconds, now - lease_seconds, limit),
+            ).fetchall()
+            if not rows:
+                con.rollback()
+                return None, []
+
+            job_id = rows[0]["job_id"]
+            con.executemany(
+                "UPDATE job_rows SET state = 'running', worker = ?, claimed_at = ?, updated_at = ?"
+                " WHERE job_id = ? AND row_id = ?",
+                [(worker, now, _now(), job_id, r["row_id"]) for r in rows],
+            )
+            con.execute(
+                "UPDATE jobs SET status = 'running', updated_at = ? WHERE job_id = ? AND status = 'queued'",
+                (_now(), job_id),
+            )
+            con.commit()
+        finally:
+            con.close()
+
+        items = [
+            BatchItem(term=r["term"], definition=r["definition"], endpoint=r["endpoint"], engine=r["engine"], key=r["row_id"])
+            for r in rows
+        ]
+        return self.get_job(job_id), items
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with closing(self._connect()) as con:
+            row = con.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["config"] = json.loads(job["config"] or "{}")
+        return job
+
+    def row_counts(self, job_id: str) -> Dict[str, int]:
+        with closing(self._connect()) as con:
+            rows = con.execute(
+                "SELECT state, COUNT(*) AS n FROM job_rows WHERE job_id = ? GROUP BY state", (job_id,)
+            ).fetchall()
+        return {r["state"]: r["n"] for r in rows}
+
+    def list_jobs(self, limit: int = 50) -> pd.DataFrame:
+        """Newest jobs first, with per-state row counts."""
+        with closing(self._connect()) as con:
+            df = pd.read_sql_query(
+                """
+                SELECT j.job_id, j.name, j.endpoint, j.engine, j.status, j.mode, j.created_at, j.updated_at,
+                       COUNT(r.row_id) AS rows,
+                       SUM(r.state = 'done') AS done,
+                       SUM(r.state = 'error') AS errors,
+                       SUM(r.state = 'running') AS running,
+                       SUM(r.state = 'pending') AS pending
+                FROM jobs j LEFT JOIN job_rows r ON r.job_id = j.job_id
+                GROUP BY j.job_id
+                ORDER BY j.created_at DESC
+                LIMIT ?
+                """,
+                con,
+                params=(limit,),
+            )
+        for col in ["done", "errors", "running", "pending"]:
+            df[col] = df[col].fillna(0).astype(int)
+        return df
+
+    def delete_job(self, job_id: str):
+        with closing(self._connect()) as con, con:
+            con.execute("DELETE FROM job_rows WHERE job_id = ?", (job_id,))
+            con.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+
+    # ------------------------------------------------------------
+    # Rows
+    # ------------------------------------------------------------
+
+    def pending_items(self, job_id: str) -> List[BatchItem]:
+        """Rows still to map (pending or failed), in sheet order; key = RowID."""
+        with closing(self._connect()) as con:
+            rows = con.execute(
+                "SELECT row_id, term, definition, endpoint, engine FROM job_rows"
+                " WHERE job_id = ? AND state IN ('pending', 'error') ORDER BY position",
+                (job_id,),
+            ).fetchall()
+        return [
+            BatchItem(term=r["term"], definition=r["definition"], endpoint=r["endpoint"], engine=r["engine"], key=r["row_id"])
+            for r in rows
+        ]
+
+    def save_result(self, job_id: str, row_id: str, out: Dict[str, Any], term: Optional[str] = None, run_id: str = ""):
+        """
+        Store the mapping of one row. `term` replaces the row's term (a
+        re-evaluation with a new term); the original term is kept.
+        """
+        status = out.get("status", "ok")
+        state = "error" if status == "error" else "done"
+        with closing(self._connect()) as con, con:
+            con.execute(
+                """
+                UPDATE job_rows
+                SET state = ?, iri = ?, skos = ?, explanation = ?, run_status = ?,
+                    term = COALESCE(?, term), last_updated_run = ?, worker = '', claimed_at = 0, updated_at = ?
+                WHERE job_id = ? AND row_id = ?
+                """,
+                (state, str(out.get("IRI", "")), str(out.get("SKOS", "")), str(out.get("explanation", "")),
+                 status_label(out), term, run_id, _now(), job_id, row_id),
+            )
+
+    def rows_frame(self, job_id: str) -> pd.DataFrame:
+        """The job as the Mapping page's batch frame (BATCH_COLUMNS), in sheet order."""
+        with closing(self._connect()) as con:
+            df = pd.read_sql_query(
+                """
+                SELECT row_id AS RowID, term AS Term, definition AS Definition, endpoint AS Endpoint,
+                       engine AS Engine, iri AS IRI, skos AS SKOS, explanation,
+                       CASE WHEN state IN ('pending', 'running') THEN state ELSE run_status END AS Status,
+                       original_term AS OriginalTerm, last_updated_run
+                FROM job_rows WHERE job_id = ? ORDER BY position
+                """,
+                con,
+                params=(job_id,),
+            )
+        return df[BATCH_COLUMNS]
+
+
+def get_job_store(path: Optional[str] = None) -> JobStore:
+    return JobStore(path)
@@ -0,0 +1,329 @@
+# Shared mapping entry points used by the Mapping page and the batch runner.
+#
+# Engines:
+#   "Agent"    - deep agents (get_agent_wiki / get_agent_bioportal / get_multiagent)
+#   "Pipeline" - deterministic pipeline (general_tools/mapping_pipeline.py)
+#   "Retrieve-rank" - concurrent retrieval + one LLM ranking call
+#                     (general_tools/retrieve_rank.py)
+#
+# Every engine returns the same row format:
+#   {"IRI": ..., "SKOS": ..., "explanation": ..., "status": ...}
+#
+# status is "ok", "early_exit" (an exact SKOS verdict ended the agent run),
+# "budget_exhausted:<limit>" (see general_tools/agent_budget.py) or "error"
+# (a lookup or classification behind the row failed).
+# Rows served from the result cache (general_tools/result_cache.py) also
+# carry "cached": True.
+
+import json
+from typing import List, Dict, Any, Optional
+
+from general_tools.mapping_pipeline import get_pipeline, NO_MATCH, with_errors
+from general_tools.retrieve_rank import get_retrieve_rank
+from general_tools.agent_budget import AgentBudget, run_agent_with_budget
+from general_tools.result_cache import is_cacheable
+
+ENDPOINTS = ["Wikidata", "Bioportal", "Multiagent"]
+ENGINES = ["Agent", "Pipeline", "Retrieve-rank"]
+
+
+# ============================================================
+# Questions sent to the agents
+# ============================================================
+
+def question_wikidata(term: str, definition: str) -> str:
+    return f"""What is the best fitting Q-identifier the term {term} which definition {definition} matches with the label from the wikidata .
+As a reply only provide
+(i) identificator number,
+(ii) SKOS matching between original term definition and the definition/description of the identified label from wikidata
+(iii) Explanation for SKOS matching.
+
+SKOS matching and corresponding explanation should be identified with the corresponding tool -
+
+If no proper match is found, you may adjust the search query and try with other identifiers.
+
+If no proper identifier is found after 10 iterations, return "No wiki match". In that case SKOS matching is not needed
+"""
+
+
+def _ontology_lines(term_onts: List[str], trusted_onts: List[str]) -> str:
+    # The agents are compiled once for all ontology selections; the lists of
+    # this mapping travel with the question
+    return f"""Term ontologies: {", ".join(term_onts) or "(none)"}
+Trusted ontologies: {", ".join(trusted_onts) or "(none)"}
+"""
+
+
+def question_bioportal(term: str, definition: str, term_onts: List[str], trusted_onts: List[str]) -> str:
+    return f"""Find the best BioPortal identifier/IRI for the term {term} with definition {definition}.
+
+{_ontology_lines(term_onts, trusted_onts)}
+"""
+
+
+def question_multiagent(term: str, definition: str, term_onts: List[str], trusted_onts: List[str]) -> str:
+    return f"""Map the term "{term}" with definition "{definition}" to a valid identifier from BioPortal or Wikidata.
+Return only the final JSON output.
+
+{_ontology_lines(term_onts, trusted_onts)}"""
+
+
+def build_question(
+    endpoint: str,
+    term: str,
+    definition: str,
+    term_onts: Optional[List[str]] = None,
+    trusted_onts: Optional[List[str]] = None,
+) -> str:
+    if endpoint == "Wikidata":
+        return question_wikidata(term, definition)
+    if endpoint == "Bioportal":
+        return question_bioportal(term, definition, term_onts or [], trusted_onts or [])
+    return question_multiagent(term, definition, term_onts or [], trusted_onts or [])
+
+
+# ============================================================
+# Parsing agent output
+# ============================================================
+
+def parse_agent_json(raw: str) -> Dict[str, Any]:
+    """Parse dict from JSON; fallback extracts first {...} block."""
+    try:
+        data = json.loads(raw)
+        return data if isinstance(data, dict) else {}
+    except Exception:
+        s, e = raw.find("{"), raw.rfind("}")
+        if s != -1 and e != -1 and e > s:
+            try:
+                data = json.loads(raw[s:e+1])
+                return data if isinstance(data, dict) else {}
+            except Exception:
+                return {}
+        return {}
+
+
+def wikidata_url(qid: str) -> str:
+    return f"https://www.wikidata.org/wiki/{qid}"
+
+
+def qid_to_url_if_needed(identifier: str) -> str:
+    """If identifier is a bare Wikidata QID (Q123), convert to Wikidata URL."""
+    ident = (identifier or "").strip()
+    if ident.startswith("Q") and ident[1:].isdigit():
+        return wikidata_url(ident)
+    return ident
+
+
+def extract_multiagent_fields(parsed: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Multiagent final formatting tool returns:
+      {"ID": "...", "SKOS": "...", "SKOS_explanation": "..."}
+    But we also accept fallback keys to be robust.
+    """
+    ident = (
+        parsed.get("ID")
+        or parsed.get("id")
+        or parsed.get("qid")
+        or parsed.get("IRI")
+        or parsed.get("iri")
+        or ""
+    )
+    skos = (
+        parsed.get("SKOS")
+        or parsed.get("skos")
+        or ""
+    )
+    expl = (
+        parsed.get("SKOS_explanation")
+        or parsed.get("skos_explanation")
+        or parsed.get("explanation")
+        or ""
+    )
+    ident = qid_to_url_if_needed(str(ident))
+    return {
+        "iri": str(ident).strip(),
+        "skos": str(skos).strip(),
+        "explanation": str(expl).strip(),
+    }
+
+
+def result_from_raw(endpoint: str, raw: str) -> Dict[str, str]:
+    """
+    Turn the final agent message into the row format
+    {"IRI": ..., "SKOS": ..., "explanation": ...}.
+    """
+    parsed = parse_agent_json(raw)
+
+    if endpoint == "Wikidata":
+        # accept both formats (qid/skos/explanation OR ID/SKOS/SKOS_explanation)
+        qid = (parsed.get("qid") or parsed.get("ID") or parsed.get("id") or "").strip()
+        skos = (parsed.get("skos") or parsed.get("SKOS") or "").strip()
+        expl = (parsed.get("explanation") or parsed.get("SKOS_explanation") or parsed.get("skos_explanation") or "").strip()
+
+        if qid and qid != "No wiki match":
+            iri = qid_to_url_if_needed(qid)
+        else:
+            iri, skos, expl = "No wiki match", "", ""
+
+    elif endpoint == "Bioportal":
+        iri = (parsed.get("qid") or "").strip()
+        skos = (parsed.get("skos") or "").strip()
+        expl = (parsed.get("explanation") or "").strip()
+
+        if not iri or iri == "No bioportal match":
+            iri, skos, expl = "No bioportal match", "", ""
+
+    else:  # Multiagent
+        # Multiagent output produced by agentmapping_format → keys: ID, SKOS, SKOS_explanation
+        fields = extract_multiagent_fields(parsed)
+        iri = fields["iri"]
+        skos = fields["skos"]
+        expl = fields["explanation"]
+
+        if not iri or iri.startswith("No "):
+            skos, expl = "", ""
+
+    return {"IRI": iri, "SKOS": skos, "explanation": expl}
+
+
+def final_message_text(result: Any) -> str:
+    return result["messages"][-1].content if isinstance(result, dict) and "messages" in result else str(result)
+
+
+# ============================================================
+# Running a mapping
+# ============================================================
+
+def row_from_budget_run(endpoint: str, run: Dict[str, Any]) -> Dict[str, str]:
+    """Row for an agent run that was stopped before its final answer."""
+    cand = run.get("candidate")
+    if cand:
+        return {
+            "IRI": qid_to_url_if_needed(cand["id"]),
+            "SKOS": cand["skos"],
+            "explanation": cand["explanation"],
+        }
+    limit = run["status"].split(":", 1)[-1]
+    return {
+        "IRI": NO_MATCH.get(endpoint, "No match"),
+        "SKOS": "",
+        "explanation": f"Budget exhausted ({limit}) before a verified match was found.",
+    }
+
+
+def row_from_run(endpoint: str, run: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Row for a finished run_agent_with_budget result. A run in which a tool
+    call failed gets status "error" (the agent's answer is kept), so it is
+    shown as such and not stored in the result cache.
+    """
+    if run["status"] == "ok":
+        row = result_from_raw(endpoint, final_message_text(run["final_state"]))
+    else:
+        row = row_from_budget_run(endpoint, run)
+    row["status"] = run["status"]
+    return with_errors(row, run.get("errors") or [])
+
+
+def run_agent_mapping(
+    agent,
+    endpoint: str,
+    term: str,
+    definition: str,
+    term_onts: Optional[List[str]] = None,
+    trusted_onts: Optional[List[str]] = None,
+    budget: Optional[AgentBudget] = None,
+    on_event=None,
+) -> Dict[str, str]:
+    # Composite mappers (e.g. ParallelMultiagent) take the term directly
+    # and already return the row format
+    if callable(getattr(agent, "amap", None)):
+        return agent.map(term, definition, budget=budget, on_event=on_event,
+                         trusted_ontologies=trusted_onts, term_ontologies=term_onts)
+
+    question = build_question(endpoint, term, definition, term_onts, trusted_onts)
+    run = run_agent_with_budget(
+        agent,
+        {"messages": [{"role": "user", "content": question}]},
+        budget=budget,
+        on_event=on_event,
+    )
+    row = row_from_run(endpoint, run)
+    row["stats"] = run["stats"]
+    return row
+
+
+def run_pipeline_mapping(
+    endpoint: str,
+    term: str,
+    definition: str,
+    term_onts: Optional[List[str]] = None,
+    trusted_onts: Optional[List[str]] = None,
+    on_event=None,
+) -> Dict[str, str]:
+    pipeline = get_pipeline(endpoint, trusted_ontologies=trusted_onts, term_ontologies=term_onts)
+    row = pipeline.map(term, definition, on_event=on_event)
+    row.setdefault("status", "ok")
+    return row
+
+
+def status_label(row: Dict[str, Any]) -> str:
+    """Status shown in result tables: 'ok', 'ok (cached)', 'early_exit', ..."""
+    status = str(row.get("status", "ok"))
+    return f"{status} (cached)" if row.get("cached") else status
+
+
+def map_term(
+    endpoint: str,
+    term: str,
+    definition: str,
+    engine: str = "Agent",
+    agent=None,
+    term_onts: Optional[List[str]] = None,
+    trusted_onts: Optional[List[str]] = None,
+    budget: Optional[AgentBudget] = None,
+    on_event=None,
+    cache=None,
+    cache_mode: str = "use",
+    parallel_multiagent: bool = False,
+) -> Dict[str, str]:
+    """
+    Map one term with the selected engine. `agent` is only needed (and only
+    used) for the "Agent" engine, so callers can keep their own agent cache.
+    `budget` limits one agent run (None: no limits).
+    `on_event` receives progress dicts (tool calls, candidates, SKOS verdicts)
+    while the mapping runs, for every engine.
+    `cache` is a ResultCache; cache_mode "use" serves stored results,
+    "refresh" re-maps and overwrites them, "bypass" ignores the cache.
+    `parallel_multiagent` tells the cache which Multiagent agent `agent` is.
+    """
+    if cache is None or cache_mode == "bypass":
+        return _map_term_uncached(endpoint, term, definition, engine, agent, term_onts, trusted_onts, budget, on_event)
+
+    key = cache.key_for(endpoint, engine, term, definition, trusted_onts, term_onts, parallel_multiagent)
+    if cache_mode == "use":
+        hit = cache.get(key)
+        if hit is not None:
+            if on_event is not None:
+                on_event({"type": "cache_hit", "id": hit["IRI"], "cached_at": hit.get("cached_at", "")})
+            return hit
+
+    row = _map_term_uncached(endpoint, term, definition, engine, agent, term_onts, trusted_onts, budget, on_event)
+    if is_cacheable(row):
+        cache.put(key, endpoint, engine, term, definition, row)
+    return row
+
+
+def _map_term_uncached(endpoint, term, definition, engine, agent, term_onts, trusted_onts, budget, on_event):
+    if engine == "Pipeline":
+        return run_pipeline_mapping(endpoint, term, definition, term_onts, trusted_onts, on_event)
+    if engine == "Retrieve-rank":
+        mapper = get_retrieve_rank(endpoint, trusted_ontologies=trusted_onts, term_ontologies=term_onts)
+        row = mapper.map(term, definition, on_event=on_event)
+        row.setdefault("status", "ok")
+        return row
+    if agent is None:
+        raise ValueError("An agent is required for the 'Agent' engine.")
+    row = run_agent_mapping(agent, endpoint, term, definition, term_onts, trusted_onts, budget, on_event)
+    row.setdefault("status", "ok")
+    return row
@@ -0,0 +1,281 @@
+# Deterministic (non-agent) mapping pipeline.
+#
+# normalize -> fan-out candidate retrieval -> fetch definitions
+#           -> one SKOS verdict per top candidate -> select
+#
+# The LLM is only used for the SKOS classification. Candidates from trusted
+# BioPortal ontologies are accepted without a definition check, the same rule
+# the BioPortal agent prompt applies.
+#
+# A failed lookup or SKOS classification (auth, network, rate limit, ...) does
+# not abort the term, but it is never hidden either: the row still carries the
+# best result found, with status "error" and the messages in the explanation,
+# so it is shown as an error and not stored in the result cache.
+
+import re
+import asyncio
+from typing import List, Dict, Any, Optional
+
+from wikidata_agent_and_tools.wikidata_tools import search_wikidata_candidates, wikidata_entities_details
+from bioportal_agent_and_tools.bioportal_tools import find_best_definition, find_term_in_ontology, find_pref_label
+from general_tools.skos_tools import SKOS_RANK, aclassify_skos_matches
+
+NO_MATCH = {
+    "Wikidata": "No wiki match",
+    "Bioportal": "No bioportal match",
+    "Multiagent": "No match",
+}
+
+
+def normalize_term(term: str) -> str:
+    """
+    'dry_matter_to_the_mince ' -> 'dry matter to the mince'
+    """
+    text = (term or "").replace("_", " ")
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def term_variants(term: str) -> List[str]:
+    """
+    Search strings for one term: the original spelling first, then the
+    normalized one if it differs (stable de-dupe).
+    """
+    out: List[str] = []
+    for v in [(term or "").strip(), normalize_term(term)]:
+        if v and v not in out:
+            out.append(v)
+    return out
+
+
+def candidate_iri(cand: Dict[str, Any]) -> str:
+    """Q-ids become Wikidata URLs, BioPortal IRIs are kept as they are."""
+    if cand["source"] == "Wikidata":
+        return f"https://www.wikidata.org/wiki/{cand['id']}"
+    return cand["id"]
+
+
+class MappingPipeline:
+    """
+    Fixed-sequence mapper for one endpoint ("Wikidata", "Bioportal" or
+    "Multiagent" = both sources).
+
+    Use `map(term, definition)` from sync code or `amap(...)` from async code.
+    Both return {"IRI": ..., "SKOS": ..., "explanation": ...}.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        trusted_ontologies: Optional[List[str]] = None,
+        term_ontologies: Optional[List[str]] = None,
+        wiki_candidates: int = 5,
+        top_k: int = 3,
+        max_concurrency: int = 8,
+    ):
+        if endpoint not in NO_MATCH:
+            raise ValueError(f"Unknown endpoint: {endpoint}")
+        self.endpoint = endpoint
+        self.trusted_ontologies = list(trusted_ontologies or [])
+        self.term_ontologies = list(term_ontologies or [])
+        self.wiki_candidates = wiki_candidates
+        self.top_k = top_k
+        self.max_concurrency = max_concurrency
+
+    # ---------------- retrieval ----------------
+
+    def _uses_wikidata(self) -> bool:
+        return self.endpoint in {"Wikidata", "Multiagent"}
+
+    def _uses_bioportal(self) -> bool:
+        return self.endpoint in {"Bioportal", "Multiagent"}
+
+    async def _bioportal_candidate(self, variant: str, ontology: str, errors: List[str]) -> Optional[Dict[str, Any]]:
+        trusted = ontology in self.trusted_ontologies
+        try:
+            if trusted:
+                mapped_id, match_type = await asyncio.to_thread(find_term_in_ontology, variant, ontology)
+                if not mapped_id:
+                    return None
+                cand = {
+                    "source": "Bioportal", "id": mapped_id, "ontology": ontology,
+                    "match_type": match_type, "definition": "", "trusted": True,
+                }
+            else:
+                best = await asyncio.to_thread(find_best_definition, variant, ontology)
+                if not best or not best.get("mapped_id"):
+                    return None
+                cand = {
+                    "source": "Bioportal", "id": best["mapped_id"], "ontology": ontology,
+                    "match_type": best.get("mapped_type", ""),
+                    "definition": best.get("definition", ""), "trusted": False,
+                }
+            cand["label"] = await asyncio.to_thread(find_pref_label, variant, ontology, cand["id"])
+        except Exception as e:
+            errors.append(f"BioPortal {ontology} lookup failed: {e}")
+            return None
+        return cand
+
+    async def _wikidata_candidates(self, variant: str, errors: List[str]) -> List[Dict[str, Any]]:
+        try:
+            qids = await asyncio.to_thread(search_wikidata_candidates, variant, self.wiki_candidates)
+        except Exception as e:
+            errors.append(f"Wikidata search failed: {e}")
+            return []
+        return [
+            {"source": "Wikidata", "id": q, "label": "", "ontology": "",
+             "match_type": "search", "definition": "", "trusted": False}
+            for q in qids
+        ]
+
+    async def _wikidata_details(self, cands: List[Dict[str, Any]], errors: List[str]) -> List[Dict[str, Any]]:
+        """Definitions for all Wikidata candidates in one bulk lookup."""
+        if not cands:
+            return []
+        try:
+            details = await asyncio.to_thread(wikidata_entities_details, [c["id"] for c in cands])
+        except Exception as e:
+            errors.append(f"Wikidata details lookup failed: {e}")
+            details = {}
+        out = []
+        for cand in cands:
+            item = details.get(cand["id"])
+            if item:
+                cand = dict(cand, label=item.get("label") or "", definition=item.get("definition") or "")
+            out.append(cand)
+        return out
+
+    async def gather_candidates(self, term: str, errors: List[str]) -> List[Dict[str, Any]]:
+        """
+        Query all configured sources for all term variants at once and return
+        the de-duplicated candidates with definitions, in source priority order
+        (BioPortal ontologies in the configured order, then Wikidata ranking).
+        A lookup that fails adds its message to `errors` and is skipped.
+        """
+        semaphore = asyncio.Semaphore(max(1, int(self.max_concurrency)))
+
+        async def _bounded(coro):
+            async with semaphore:
+                return await coro
+
+        variants = term_variants(term)
+        bio_jobs = []
+        if self._uses_bioportal():
+            bio_jobs = [
+                _bounded(self._bioportal_candidate(v, onto, errors))
+                for onto in self.term_ontologies
+                for v in variants
+            ]
+        wiki_jobs = []
+        if self._uses_wikidata():
+            wiki_jobs = [_bounded(self._wikidata_candidates(v, errors)) for v in variants]
+
+        bio_results, wiki_results = await asyncio.gather(
+            asyncio.gather(*bio_jobs), asyncio.gather(*wiki_jobs)
+        )
+
+        seen = set()
+        candidates: List[Dict[str, Any]] = []
+        for cand in bio_results:
+            if cand and cand["id"] not in seen:
+                seen.add(cand["id"])
+                candidates.append(cand)
+
+        wiki_cands: List[Dict[str, Any]] = []
+        for found in wiki_results:
+            for cand in found:
+                if cand["id"] not in seen:
+                    seen.add(cand["id"])
+                    wiki_cands.append(cand)
+        wiki_cands = wiki_cands[: self.wiki_candidates]
+        candidates.extend(await self._wikidata_details(wiki_cands, errors))
+
+        return candidates
+
+    # ---------------- selection ----------------
+
+    def _to_row(self, cand: Optional[Dict[str, Any]], skos: str, explanation: str, errors: List[str]) -> Dict[str, str]:
+        if not cand:
+            row = {"IRI": NO_MATCH[self.endpoint], "SKOS": "", "explanation": explanation}
+        else:
+            row = {"IRI": candidate_iri(cand), "SKOS": skos, "explanation": explanation}
+        return with_errors(row, errors)
+
+    async def amap(self, term: str, definition: str, on_event=None) -> Dict[str, str]:
+        """
+        `on_event` (optional) receives the same progress dicts as an agent run
+        ({"type": "candidate" | "verdict", ...}).
+        """
+        emit = on_event or (lambda event: None)
+        errors: List[str] = []
+        candidates = await self.gather_candidates(term, errors)
+        for cand in candidates:
+            emit({"type": "candidate", "tool": cand["source"], "id": cand["id"]})
+
+        # Trusted ontologies: no definition check needed (first hit wins)
+        for cand in candidates:
+            if cand["trusted"]:
+                skos = "exact" if cand["match_type"] == "exact" else "close"
+                return self._to_row(
+                    cand, skos,
+                    f"{cand['match_type']} label match in trusted ontology {cand['ontology']}; "
+                    "no definition check needed.",
+                    errors,
+                )
+
+        to_check = [c for c in candidates if c["definition"]][: self.top_k]
+        if not to_check:
+            return self._to_row(None, "", "No candidate with a definition was found.", errors)
+
+        verdicts = await aclassify_skos_matches(
+            [
+                {"term_a": term, "gen_def": definition, "term_b": c["label"] or term, "onto_def": c["definition"]}
+                for c in to_check
+            ],
+            max_concurrency=self.max_concurrency,
+        )
+
+        best, best_rank, best_expl = None, 0, ""
+        for cand, verdict in zip(to_check, verdicts):
+            if str(verdict.get("explanation", "")).startswith("ERROR:"):
+                errors.append(f"SKOS classification of {cand['id']} failed: {verdict['explanation'][len('ERROR:'):].strip()}")
+                continue
+            emit({"type": "verdict", "id": cand["id"], "skos": verdict.get("mapping_type", ""),
+                  "explanation": verdict.get("explanation", "")})
+            rank = SKOS_RANK.get(verdict.get("mapping_type", ""), 0)
+            if rank > best_rank:
+                best, best_rank, best_expl = cand, rank, verdict.get("explanation", "")
+            if rank == SKOS_RANK["exact"]:
+                break
+
+        if best is None:
+            return self._to_row(None, "", "None of the top candidates has an exact, close or related match.", errors)
+        return self._to_row(best, verdict_name(best_rank), best_expl, errors)
+
+    def map(self, term: str, definition: str, on_event=None) -> Dict[str, str]:
+        return asyncio.run(self.amap(term, definition, on_event=on_event))
+
+
+def with_errors(row: Dict[str, Any], errors: List[str]) -> Dict[str, Any]:
+    """Mark `row` as failed if any lookup / classification behind it failed."""
+    if errors:
+        row["status"] = "error"
+        row["explanation"] = f"ERROR: {'; '.join(errors)}" + (f" | {row['explanation']}" if row.get("explanation") else "")
+    return row
+
+
+def verdict_name(rank: int) -> str:
+    for name, r in SKOS_RANK.items():
+        if r == rank:
+            return name
+    return ""
+
+
+def get_pipeline(endpoint: str, trusted_ontologies: Optional[List[str]] = None, term_ontologies: Optional[List[str]] = None):
+    """
+    Pipeline counterpart of get_agent_wiki / get_agent_bioportal / get_multiagent.
+    """
+    return MappingPipeline(
+        endpoint,
+        trusted_ontologies=trusted_ontologies,
+        term_ontologies=term_ontologies,
+    )
@@ -0,0 +1,372 @@
+# Long-lived MCP client connections to mcp_skos_server.py.
+#
+# The Verification page used to spawn a new server subprocess for every
+# click (Python start-up, imports, MCP handshake) and throw it away again.
+# Here the connections are kept open for the life of the Streamlit process:
+#
+#   pool = get_mcp_pool()
+#   out = pool.call_tool("classify_skos_match_tool", {...})   # from any thread
+#
+# All connections run on one background event loop. The server reads the
+# OpenAI key from its environment, so there is one server per key (the key of
+# the calling session, see credentials.child_env); at most `max_connections`
+# are kept and the least recently used one is closed first.
+#
+# Health checks: a connection idle for more than `ping_after` seconds is
+# pinged before it is used; a failed ping or a broken connection (server
+# crashed, pipe closed) is replaced by a new one and the call is retried once.
+#
+# With MCP_SKOS_URL set (e.g. http://127.0.0.1:8765/mcp, see
+# mcp_skos_server.py --transport streamable-http) no subprocess is started:
+# the connections go to that shared server and carry the key of the session
+# in the X-OpenAI-API-Key header.
+#
+# Batches: stream_skos_matches(pairs) yields every pair result as soon as the
+# server has it (progress notifications of classify_skos_matches_tool).
+
+import os
+import sys
+import json
+import queue
+import atexit
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from general_tools.credentials import Credentials, child_env, current_credentials
+
+logger = logging.getLogger(__name__)
+
+SERVER_SCRIPT = "mcp_skos_server.py"
+OPENAI_KEY_HEADER = "X-OpenAI-API-Key"
+
+
+def extract_tool_payload(tool_result):
+    """
+    MCP tool calls often return an object whose `content` is a LIST of items.
+    Those items may be TextContent objects (with `.text`) or dict-like objects.
+
+    We try to recover a dict like: {"mapping_type": "...", "explanation": "..."}.
+    """
+    # Case 1: already a dict
+    if isinstance(tool_result, dict):
+        return tool_result
+
+    # Structured output (tools returning a dict)
+    structured = getattr(tool_result, "structuredContent", None)
+    if isinstance(structured, dict):
+        # FastMCP wraps non-object results as {"result": ...}
+        inner = structured.get("result") if set(structured) == {"result"} else structured
+        if isinstance(inner, dict):
+            return inner
+
+    # Case 2: has `.content`
+    content = getattr(tool_result, "content", None)
+    if content is None:
+        # fallback: string
+        return {"mapping_type": "none", "explanation": str(tool_result)}
+
+    # Many SDKs: content is a list
+    if isinstance(content, list) and len(content) > 0:
+        first = content[0]
+
+        # If it's a dict already
+        if isinstance(first, dict):
+            return first
+
+        # If it has `.text` (TextContent)
+        text = getattr(first, "text", None)
+        if isinstance(text, str):
+            # sometimes the tool returns JSON as text
+            try:
+                parsed = json.loads(text)
+                if isinstance(parsed, dict):
+                    return parsed
+            except Exception:
+                return {"mapping_type": "none", "explanation": text}
+
+        # Fallback: stringify first block
+        return {"mapping_type": "none", "explanation": str(first)}
+
+    # Case 3: content isn’t a list
+    if isinstance(content, dict):
+        return content
+
+    return {"mapping_type": "none", "explanation": str(tool_result)}
+
+
+def _connection_lost(exc: BaseException) -> bool:
+    """True for errors of the transport (server gone), not of the tool call."""
+    import anyio
+    from mcp.shared.exceptions import McpError
+    from mcp.types import CONNECTION_CLOSED
+
+    if isinstance(exc, (anyio.ClosedResourceError, anyio.BrokenResourceError, BrokenPipeError, EOFError)):
+        return True
+    return isinstance(exc, McpError) and exc.error.code == CONNECTION_CLOSED
+
+
+class _Connection:
+    """One MCP session (own server subprocess, or HTTP to a shared server), owned by a task on the pool loop."""
+
+    def __init__(self, env: Dict[str, str], args: List[str], url: Optional[str] = None):
+        self.env = env
+        self.args = args
+        self.url = url
+        self.session = None
+        self.last_used = 0.0
+        self.calls = 0
+        self.broken = False
+        self._ready = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._error: Optional[BaseException] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, timeout: float):
+        self._task = asyncio.create_task(self._run())
+        await asyncio.wait_for(self._ready.wait(), timeout)
+        if self._error is not None:
+            raise self._error
+
+    async def _run(self):
+        # the transport / session context managers must be entered and left by the same task
+        from mcp import ClientSession
+
+        try:
+            async with self._transport() as streams:
+                read, write = streams[0], streams[1]
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+                    self.session = session
+                    self._ready.set()
+                    await self._stop.wait()
+        except BaseException as e:
+            self._error = e
+            if not isinstance(e, asyncio.CancelledError):
+                logger.warning("MCP connection closed: %s", e)
+        finally:
+            self.session = None
+            self._ready.set()
+
+    def _transport(self):
+        if self.url:
+            from mcp.client.streamable_http import streamablehttp_client
+
+            key = self.env.get("OPENAI_API_KEY")
+            return streamablehttp_client(self.url, headers={OPENAI_KEY_HEADER: key} if key else None)
+
+        from mcp.client.stdio import stdio_client, StdioServerParameters
+
+        params = StdioServerParameters(command=sys.executable, args=self.args, env=self.env)
+        return stdio_client(params)
+
+    @property
+    def alive(self) -> bool:
+        return (
+            not self.broken
+            and self.session is not None
+            and self._task is not None
+            and not self._task.done()
+        )
+
+    async def close(self):
+        self._stop.set()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, 5)
+            except (asyncio.TimeoutError, Exception):
+                self._task.cancel()
+
+
+class McpClientPool:
+    def __init__(
+        self,
+        server_args: Optional[List[str]] = None,
+        url: Optional[str] = None,
+        max_connections: int = 4,
+        ping_after: float = 30.0,
+        connect_timeout: float = 60.0,
+    ):
+        self.server_args = list(server_args or [SERVER_SCRIPT])
+        self.url = url
+        self.max_connections = max_connections
+        self.ping_after = ping_after
+        self.connect_timeout = connect_timeout
+        self._conns: "OrderedDict[str, _Connection]" = OrderedDict()
+        self._stats = {"calls": 0, "connects": 0, "reconnects": 0, "pings": 0, "closed": 0}
+        self._loop = asyncio.new_event_loop()
+        self._lock: Optional[asyncio.Lock] = None
+        threading.Thread(target=self._loop.run_forever, name="mcp-client-pool", daemon=True).start()
+
+    # ---------- on the pool loop ----------
+    async def _connection(self, key: str, env: Dict[str, str], fresh: bool = False) -> _Connection:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            conn = self._conns.get(key)
+            if conn is not None and (fresh or not conn.alive):
+                self._conns.pop(key)
+                await conn.close()
+                self._stats["reconnects"] += 1
+                conn = None
+
+            if conn is not None and self._loop.time() - conn.last_used > self.ping_after:
+                try:
+                    self._stats["pings"] += 1
+                    await asyncio.wait_for(conn.session.send_ping(), 10)
+                except Exception as e:
+                    logger.info("MCP ping failed, reconnecting: %s", e)
+                    self._conns.pop(key)
+                    await conn.close()
+                    self._stats["reconnects"] += 1
+                    conn = None
+
+            if conn is None:
+                conn = _Connection(env, self.server_args, self.url)
+                await conn.start(self.connect_timeout)
+                self._stats["connects"] += 1
+                self._conns[key] = conn
+                while len(self._conns) > self.max_connections:
+                    _, old = self._conns.popitem(last=False)
+                    await old.close()
+                    self._stats["closed"] += 1
+
+            self._conns.move_to_end(key)
+            conn.last_used = self._loop.time()
+            return conn
+
+    async def _acall(self, key: str, env: Dict[str, str], name: str, arguments: Dict[str, Any], timeout: float,
+                     progress_callback=None):
+        for attempt in range(2):
+            conn = await self._connection(key, env, fresh=attempt > 0)
+            try:
+                result = await conn.session.call_tool(
+                    name, arguments, read_timeout_seconds=timedelta(seconds=timeout),
+                    progress_callback=progress_callback,
+                )
+            except Exception as e:
+                if not _connection_lost(e):
+                    raise
+                # crashed server / closed pipe -> one retry on a new connection
+                conn.broken = True
+                if attempt == 0:
+                    logger.info("MCP connection lost, reconnecting: %s", e)
+                    continue
+                raise
+            conn.calls += 1
+            conn.last_used = self._loop.time()
+            self._stats["calls"] += 1
+            return result
+
+    async def _close_all(self):
+        for conn in list(self._conns.values()):
+            await conn.close()
+        self._conns.clear()
+
+    # ---------- from any thread ----------
+    def _submit(self, coro, timeout: Optional[float]):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
+
+    def _call(self, name, arguments, creds, timeout, progress_callback=None):
+        creds = creds or current_credentials()
+        key = hashlib.sha256(creds.openai_api_key.encode("utf-8")).hexdigest()
+        coro = self._acall(key, child_env(creds), name, arguments, timeout, progress_callback)
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def call_tool(
+        self,
+        name: str,
+        arguments: Dict[str, Any],
+        creds: Optional[Credentials] = None,
+        timeout: float = 300.0,
+    ):
+        """Raw CallToolResult of `name`; runs on the connection for the caller's key."""
+        return self._call(name, arguments, creds, timeout).result(timeout + self.connect_timeout)
+
+    def classify_skos_match(self, term_a: str, gen_def: str, term_b: str, onto_def: str,
+                            creds: Optional[Credentials] = None) -> Dict[str, Any]:
+        result = self.call_tool(
+            "classify_skos_match_tool",
+            {"term_a": term_a, "gen_def": gen_def, "term_b": term_b, "onto_def": onto_def},
+            creds=creds,
+        )
+        return extract_tool_payload(result)
+
+    def stream_skos_matches(self, pairs: List[Dict[str, str]], creds: Optional[Credentials] = None,
+                            timeout: float = 3600.0) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Classify many pairs (dicts with term_a, gen_def, term_b, onto_def) in one
+        call of classify_skos_matches_tool. Yields (index in pairs, result) in the
+        order the results arrive, in the calling thread.
+        """
+        pairs = list(pairs)
+        if not pairs:
+            return
+        arrived: "queue.Queue" = queue.Queue()
+
+        async def _progress(progress, total, message):
+            try:
+                item = json.loads(message or "")
+                arrived.put((int(item.pop("index")), item))
+            except (ValueError, KeyError, TypeError):
+                pass
+
+        future = self._call("classify_skos_matches_tool", {"pairs": pairs}, creds, timeout, _progress)
+        seen = set()
+        while not (future.done() and arrived.empty()):
+            try:
+                index, result = arrived.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            if index in seen:
+                # batch re-sent after a reconnect
+                continue
+            seen.add(index)
+            yield index, result
+
+        # progress notifications are not guaranteed: the final result has them all
+        final = future.result()
+        structured = getattr(final, "structuredContent", None) or {}
+        if getattr(final, "isError", False):
+            raise RuntimeError(extract_tool_payload(final).get("explanation", "MCP batch call failed"))
+        for index, result in enumerate(structured.get("result") or []):
+            if index not in seen:
+                yield index, result
+
+    def classify_skos_matches(self, pairs: List[Dict[str, str]], creds: Optional[Credentials] = None,
+                              ) -> List[Dict[str, Any]]:
+        """Results of stream_skos_matches in input order."""
+        pairs = list(pairs)
+        results: List[Optional[Dict[str, Any]]] = [None] * len(pairs)
+        for index, result in self.stream_skos_matches(pairs, creds=creds):
+            results[index] = result
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "open": sum(1 for c in self._conns.values() if c.alive)}
+
+    def close(self):
+        if self._loop.is_running():
+            try:
+                self._submit(self._close_all(), 15)
+            except Exception:
+                pass
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+_pool: Optional[McpClientPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_mcp_pool() -> McpClientPool:
+    """Process-wide pool (one per Streamlit server process); HTTP if MCP_SKOS_URL is set."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = McpClientPool(url=os.environ.get("MCP_SKOS_URL") or None)
+            atexit.register(_pool.close)
+        return _pool
@@ -0,0 +1,306 @@
+# Mapping results shared across sessions, users and tools (SQLite).
+#
+# The same vocabulary gets mapped again and again by different people; every
+# time the agents pay the full LLM cost. A result is stored under
+#
+#   (normalized term, definition hash, endpoint, engine, ontology lists,
+#    model, prompt fingerprint, Multiagent mode)
+#
+# The prompt fingerprint is a hash of the source files that define the
+# prompts and tools of an engine/endpoint (plus the training examples file),
+# so editing a prompt or a tool automatically stops old results from being
+# served.
+#
+# Used through map_term(..., cache=get_result_cache(), cache_mode=...):
+#   "use"     - serve hits, store misses
+#   "refresh" - always map, overwrite the stored result
+#   "bypass"  - neither read nor write the cache
+#
+# The database file is mapping_cache.sqlite3 in the user cache directory (see
+# app_paths.py) and can be moved with the MAPPING_CACHE_DB env var.
+#
+# The same file holds the SKOS verdicts of the Verification service
+# (VerdictCache, table `verdicts`), keyed by the normalized term / label pair,
+# the model and a fingerprint of the classifier prompt.
+
+import json
+import hashlib
+import sqlite3
+from datetime import datetime, timedelta
+from pathlib import Path
+from contextlib import closing
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from general_tools.app_paths import cache_file
+from general_tools.mapping_pipeline import normalize_term
+from general_tools.training_examples import TRAINING_FILE
+
+DB_NAME = "mapping_cache.sqlite3"
+# Chat model of the agents / SKOS classifier (see the agent modules)
+DEFAULT_MODEL = "gpt-5.1"
+CACHE_MODES = ["use", "refresh", "bypass"]
+
+_ROOT = Path(__file__).resolve().parent.parent
+
+_WIKI_FILES = ["wikidata_agent_and_tools/deep_agent_wikidata.py", "wikidata_agent_and_tools/wikidata_tools.py"]
+_BIO_FILES = ["bioportal_agent_and_tools/deep_agent_bioportal.py", "bioportal_agent_and_tools/bioportal_tools.py"]
+_COMMON_FILES = ["general_tools/skos_tools.py", "general_tools/mapping_engine.py", "general_tools/training_examples.py"]
+
+# Files whose content shapes a SKOS verdict (classify_skos_match)
+_VERDICT_FILES = ["general_tools/skos_tools.py", "general_tools/training_examples.py"]
+
+# Files whose content shapes the result of an (engine, endpoint)
+_PROMPT_FILES = {
+    ("Agent", "Wikidata"): _WIKI_FILES,
+    ("Agent", "Bioportal"): _BIO_FILES,
+    ("Agent", "Multiagent"): _WIKI_FILES + _BIO_FILES + [
+        "bioportal_wikidata_system/multiagent_system.py",
+        "bioportal_wikidata_system/parallel_multiagent.py",
+    ],
+    "Pipeline": _WIKI_FILES[1:] + _BIO_FILES[1:] + ["general_tools/mapping_pipeline.py"],
+    "Retrieve-rank": _WIKI_FILES[1:] + _BIO_FILES[1:] + [
+        "general_tools/mapping_pipeline.py",
+        "general_tools/retrieve_rank.py",
+    ],
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key         TEXT PRIMARY KEY,
+    term        TEXT NOT NULL,
+    definition  TEXT NOT NULL,
+    endpoint    TEXT NOT NULL,
+    engine      TEXT NOT NULL,
+    iri         TEXT NOT NULL,
+    skos        TEXT NOT NULL,
+    explanation TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    model       TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    created_at  TEXT NOT NULL,
+    hits        INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+_VERDICT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS verdicts (
+    key          TEXT PRIMARY KEY,
+    term         TEXT NOT NULL,
+    label        TEXT NOT NULL,
+    mapping_type TEXT NOT NULL,
+    explanation  TEXT NOT NULL,
+    model        TEXT NOT NULL,
+    fingerprint  TEXT NOT NULL,
+    created_at   TEXT NOT NULL,
+    hits         INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+@lru_cache(maxsize=64)
+def _file_digest(path: str, mtime: float, size: int) -> str:
+    with open(path, "rb") as fh:
+        return hashlib.sha1(fh.read()).hexdigest()
+
+
+def _files_digest(paths: List[Path]) -> str:
+    h = hashlib.sha1()
+    for path in paths:
+        if path.exists():
+            st = path.stat()
+            h.update(_file_digest(str(path), st.st_mtime, st.st_size).encode())
+    return h.hexdigest()
+
+
+def prompt_fingerprint(endpoint: str, engine: str) -> str:
+    """Hash of the prompt / tool sources and training examples used by engine + endpoint."""
+    files = _PROMPT_FILES.get((engine, endpoint)) or _PROMPT_FILES.get(engine) or []
+    return _files_digest([_ROOT / f for f in files + _COMMON_FILES] + [TRAINING_FILE])[:16]
+
+
+def verdict_fingerprint() -> str:
+    """Hash of the SKOS classifier sources and training examples."""
+    return _files_digest([_ROOT / f for f in _VERDICT_FILES] + [TRAINING_FILE])[:16]
+
+
+def _norm_text(text: Any) -> str:
+    return " ".join(str(text or "").replace("_", " ").split()).casefold()
+
+
+def verdict_key(term_a: str, gen_def: str, term_b: str, onto_def: str, model: str = DEFAULT_MODEL) -> str:
+    parts = [_norm_text(term_a), _norm_text(gen_def), _norm_text(term_b), _norm_text(onto_def),
+             model, verdict_fingerprint()]
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def cache_key(
+    endpoint: str,
+    engine: str,
+    term: str,
+    definition: str,
+    trusted_onts: Optional[List[str]] = None,
+    term_onts: Optional[List[str]] = None,
+    model: str = DEFAULT_MODEL,
+    parallel_multiagent: bool = False,
+) -> str:
+    definition_norm = " ".join(str(definition or "").split()).casefold()
+    # Wikidata does not look at the ontology lists
+    if endpoint == "Wikidata":
+        trusted_onts, term_onts = [], []
+    parts = [
+        normalize_term(str(term)).casefold(),
+        hashlib.sha1(definition_norm.encode("utf-8")).hexdigest(),
+        endpoint,
+        engine,
+        sorted({o.strip().upper() for o in trusted_onts or [] if o.strip()}),
+        sorted({o.strip().upper() for o in term_onts or [] if o.strip()}),
+        model,
+        prompt_fingerprint(endpoint, engine),
+    ]
+    # the parallel and the orchestrated Multiagent agent answer differently
+    if endpoint == "Multiagent" and engine == "Agent":
+        parts.append("parallel" if parallel_multiagent else "orchestrated")
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def is_cacheable(row: Dict[str, Any]) -> bool:
+    """
+    Only rows for which every lookup and classification succeeded are
+    stored. Errors and budget-limited runs (including early_exit, which
+    depends on stop_on_exact) depend on the run, not the term; an "ERROR:"
+    explanation marks a failure that was reported inside the row (same rule
+    as bulk_verification for verdicts).
+    """
+    if str(row.get("status", "ok")) != "ok" or not row.get("IRI"):
+        return False
+    return not str(row.get("explanation", "")).startswith("ERROR")
+
+
+class ResultCache:
+    def __init__(self, path: Optional[str] = None, model: str = DEFAULT_MODEL, max_age_days: Optional[float] = None):
+        self.path = str(path or cache_file(DB_NAME, "MAPPING_CACHE_DB"))
+        self.model = model
+        self.max_age_days = max_age_days
+        with closing(self._connect()) as con, con:
+            con.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        con = sqlite3.connect(self.path, timeout=30)
+        con.row_factory = sqlite3.Row
+        con.execute("PRAGMA journal_mode=WAL")
+        return con
+
+    def key_for(self, endpoint, engine, term, definition, trusted_onts=None, term_onts=None,
+                parallel_multiagent=False) -> str:
+        return cache_key(endpoint, engine, term, definition, trusted_onts, term_onts, model=self.model,
+                         parallel_multiagent=parallel_multiagent)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Stored row (IRI / SKOS / explanation / status) or None."""
+        with closing(self._connect()) as con, con:
+            row = con.execute("SELECT * FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if self.max_age_days is not None:
+                created = datetime.fromisoformat(row["created_at"])
+                if datetime.now() - created > timedelta(days=self.max_age_days):
+                    return None
+            con.execute("UPDATE results SET hits = hits + 1 WHERE key = ?", (key,))
+        return {
+            "IRI": row["iri"],
+            "SKOS": row["skos"],
+            "explanation": row["explanation"],
+            "status": row["status"],
+            "cached": True,
+            "cached_at": row["created_at"],
+        }
+
+    def put(self, key: str, endpoint: str, engine: str, term: str, definition: str, row: Dict[str, Any]):
+        with closing(self._connect()) as con, con:
+            con.execute(
+                "INSERT OR REPLACE INTO results (key, term, definition, endpoint, engine, iri, skos, explanation,"
+                " status, model, fingerprint, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, str(term), str(definition), endpoint, engine, str(row.get("IRI", "")), str(row.get("SKOS", "")),
+                 str(row.get("explanation", "")), str(row.get("status", "ok")), self.model,
+                 prompt_fingerprint(endpoint, engine), datetime.now().isoformat(timespec="seconds")),
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        with closing(self._connect()) as con:
+            row = con.execute("SELECT COUNT(*) AS entries, COALESCE(SUM(hits), 0) AS hits FROM results").fetchone()
+        return {"entries": row["entries"], "hits": row["hits"]}
+
+    def clear(self):
+        with closing(self._connect()) as con, con:
+            con.execute("DELETE FROM results")
+
+
+def get_result_cache(path: Optional[str] = None) -> ResultCache:
+    return ResultCache(path)
+
+
+class VerdictCache:
+    """SKOS verdicts ({"mapping_type", "explanation"}) of classify_skos_match, per concept pair."""
+
+    def __init__(self, path: Optional[str] = None, model: str = DEFAULT_MODEL, max_age_days: Optional[float] = None):
+        self.path = str(path or cache_file(DB_NAME, "MAPPING_CACHE_DB"))
+        self.model = model
+        self.max_age_days = max_age_days
+        with closing(self._connect()) as con, con:
+            con.executescript(_VERDICT_SCHEMA)
+
+    _connect = ResultCache._connect
+
+    def key_for(self, term_a, gen_def, term_b, onto_def) -> str:
+        return verdict_key(term_a, gen_def, term_b, onto_def, model=self.model)
+
+    def get_many(self, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Stored verdicts of `keys` (missing / expired keys are left out)."""
+        found: Dict[str, Dict[str, Any]] = {}
+        unique = list(dict.fromkeys(keys))
+        with closing(self._connect()) as con, con:
+            # chunks stay below SQLite's host parameter limit
+            for i in range(0, len(unique), 500):
+                chunk = unique[i : i + 500]
+                marks = ",".join("?" * len(chunk))
+                for row in con.execute(f"SELECT * FROM verdicts WHERE key IN ({marks})", chunk):
+                    if self.max_age_days is not None:
+                        created = datetime.fromisoformat(row["created_at"])
+                        if datetime.now() - created > timedelta(days=self.max_age_days):
+                            continue
+                    found[row["key"]] = {
+                        "mapping_type": row["mapping_type"],
+                        "explanation": row["explanation"],
+                        "cached": True,
+                        "cached_at": row["created_at"],
+                    }
+                if found:
+                    con.executemany("UPDATE verdicts SET hits = hits + 1 WHERE key = ?",
+                                    [(k,) for k in chunk if k in found])
+        return found
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.get_many([key]).get(key)
+
+    def put(self, key: str, term: str, label: str, verdict: Dict[str, Any]):
+        with closing(self._connect()) as con, con:
+            con.execute(
+                "INSERT OR REPLACE INTO verdicts (key, term, label, mapping_type, explanation, model, fingerprint,"
+                " created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, str(term), str(label), str(verdict.get("mapping_type", "")), str(verdict.get("explanation", "")),
+                 self.model, verdict_fingerprint(), datetime.now().isoformat(timespec="seconds")),
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        with closing(self._connect()) as con:
+            row = con.execute("SELECT COUNT(*) AS entries, COALESCE(SUM(hits), 0) AS hits FROM verdicts").fetchone()
+        return {"entries": row["entries"], "hits": row["hits"]}
+
+    def clear(self):
+        with closing(self._connect()) as con, con:
+            con.execute("DELETE FROM verdicts")
+
+
+def get_verdict_cache(path: Optional[str] = None) -> VerdictCache:
+    return VerdictCache(path)
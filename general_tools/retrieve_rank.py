@@ -0,0 +1,167 @@
+# Retrieve-then-rank mapping mode.
+#
+# 1. gather candidates from Wikidata search and all configured BioPortal
+#    ontologies concurrently (same retrieval as the mapping pipeline)
+# 2. enrich them with definitions in bulk
+# 3. ONE structured LLM call ranks all candidates and assigns SKOS classes
+#
+# Compared to the agent mode the number of LLM calls per term is fixed (one),
+# compared to the pipeline mode the candidates are judged side by side.
+
+import asyncio
+from functools import lru_cache
+from typing import List, Dict, Any, Optional
+
+from pydantic import BaseModel, Field
+
+from general_tools.mapping_pipeline import MappingPipeline, NO_MATCH, candidate_iri, with_errors
+from general_tools.skos_tools import SKOS_RANK
+from general_tools.training_examples import training_examples
+from general_tools.credentials import require_openai_api_key, session_chat_model
+
+
+class RankedCandidate(BaseModel):
+    """One candidate judged against the searched term."""
+    id: str = Field(description="Identifier exactly as given in the candidate list (Q-id or IRI)")
+    skos: str = Field(description="SKOS class between the searched term and the candidate: exact, close, related or none")
+    explanation: str = Field(description="Short rationale for the SKOS class, based on comparing terms and definitions")
+
+
+class CandidateRanking(BaseModel):
+    """All candidates ordered from best to worst fit."""
+    ranking: List[RankedCandidate] = Field(description="Candidates ordered from best to worst fit")
+
+
+@lru_cache(maxsize=1)
+def _ranking_llm():
+    # one client for all sessions: the key is sent per request (credentials.py)
+    llm_rank = session_chat_model("gpt-5.1", temperature=0)
+    # include_raw to read the token usage of the single call
+    return llm_rank.with_structured_output(CandidateRanking, include_raw=True)
+
+
+def _get_ranking_llm():
+    require_openai_api_key()
+    return _ranking_llm()
+
+
+def _ranking_prompt(term: str, definition: str, candidates: List[Dict[str, Any]]) -> str:
+    lines = []
+    for n, c in enumerate(candidates, start=1):
+        source = c["source"] if not c["ontology"] else f"{c['source']} / {c['ontology']}"
+        if c["trusted"]:
+            desc = f"{c['match_type']} label match in trusted ontology {c['ontology']} (no definition check needed)"
+        else:
+            desc = c["definition"] or "(no definition available)"
+        lines.append(
+            f"{n}) ID: {c['id']}\n"
+            f"   Source: {source}\n"
+            f"   Label: {c['label'] or '-'}\n"
+            f"   Definition: {desc}"
+        )
+    candidate_block = "\n".join(lines)
+    exact_text, close_text, related_text = training_examples()
+
+    return f"""
+        You are mapping a term to identifiers from Wikidata and BioPortal.
+        Compare the searched term with every candidate below and order the
+        candidates from best to worst fit. For each candidate assign one SKOS class:
+
+        Exact matching: The two concepts can be used interchangeably across schemes. They denote the same real-world concept, even if the wording differs.
+        {exact_text}
+
+        Close matching: The two concepts are very similar and usually substitutable in most contexts, but not strictly equivalent.
+        {close_text}
+
+        Related matching: The two concepts are associated but not synonymous. Represents a non-hierarchical 'see also' relation.
+        {related_text}
+
+        none: none of the above.
+
+        Searched term:
+          Term: {term}
+          Definition: {definition}
+
+        Candidates:
+        {candidate_block}
+
+        Use the candidate IDs exactly as given.
+      """
+
+
+class RetrieveRankMapper:
+    """
+    Same `map` / `amap` interface and row format as MappingPipeline.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        trusted_ontologies: Optional[List[str]] = None,
+        term_ontologies: Optional[List[str]] = None,
+        max_candidates: int = 12,
+        max_concurrency: int = 8,
+    ):
+        self.endpoint = endpoint
+        self.max_candidates = max_candidates
+        self.retriever = MappingPipeline(
+            endpoint,
+            trusted_ontologies=trusted_ontologies,
+            term_ontologies=term_ontologies,
+            max_concurrency=max_concurrency,
+        )
+
+    def _to_row(self, cand: Optional[Dict[str, Any]], skos: str, explanation: str, tokens: int,
+                errors: List[str]) -> Dict[str, Any]:
+        stats = {"llm_calls": 1 if tokens else 0, "tokens": tokens}
+        if not cand:
+            row = {"IRI": NO_MATCH[self.endpoint], "SKOS": "", "explanation": explanation, "stats": stats}
+        else:
+            row = {"IRI": candidate_iri(cand), "SKOS": skos, "explanation": explanation, "stats": stats}
+        return with_errors(row, errors)
+
+    async def amap(self, term: str, definition: str, on_event=None) -> Dict[str, Any]:
+        emit = on_event or (lambda event: None)
+        errors: List[str] = []
+        candidates = (await self.retriever.gather_candidates(term, errors))[: self.max_candidates]
+        for cand in candidates:
+            emit({"type": "candidate", "tool": cand["source"], "id": cand["id"]})
+        if not candidates:
+            return self._to_row(None, "", "No candidates were found.", 0, errors)
+
+        emit({"type": "tool_call", "tool": "rank_candidates", "args": {"candidates": len(candidates)}})
+        from langchain_core.messages import HumanMessage
+        out = await _get_ranking_llm().ainvoke([HumanMessage(content=_ranking_prompt(term, definition, candidates))])
+        raw, ranking = out.get("raw"), out.get("parsed")
+        usage = getattr(raw, "usage_metadata", None) or {}
+        tokens = int(usage.get("total_tokens", 0) or 0)
+
+        if ranking is None:
+            errors.append(f"Ranking output could not be parsed: {out.get('parsing_error')}")
+            return self._to_row(None, "", "", tokens, errors)
+
+        # Best SKOS class wins; among equal classes the LLM ranking order decides
+        by_id = {c["id"]: c for c in candidates}
+        judged = [
+            (by_id[r.id.strip()], (r.skos or "").strip().lower(), r.explanation)
+            for r in ranking.ranking
+            if r.id.strip() in by_id and SKOS_RANK.get((r.skos or "").strip().lower(), 0) > 0
+        ]
+        if not judged:
+            return self._to_row(None, "", "None of the candidates has an exact, close or related match.", tokens, errors)
+
+        for c, skos, expl in judged:
+            emit({"type": "verdict", "id": c["id"], "skos": skos, "explanation": expl})
+        cand, skos, expl = max(judged, key=lambda j: SKOS_RANK[j[1]])
+        return self._to_row(cand, skos, expl, tokens, errors)
+
+    def map(self, term: str, definition: str, on_event=None) -> Dict[str, Any]:
+        return asyncio.run(self.amap(term, definition, on_event=on_event))
+
+
+def get_retrieve_rank(endpoint: str, trusted_ontologies: Optional[List[str]] = None, term_ontologies: Optional[List[str]] = None):
+    return RetrieveRankMapper(
+        endpoint,
+        trusted_ontologies=trusted_ontologies,
+        term_ontologies=term_ontologies,
+    )
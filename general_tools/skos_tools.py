@@ -4,119 +4,90 @@ Created on Mon Dec 22 17:49:02 2025
 
 @author: yurt3
 """
-import pandas as pd
-from io import StringIO
 from pydantic import BaseModel, Field
-from typing import Optional
-from langchain_core.messages import HumanMessage
-from langchain_openai import ChatOpenAI
-import os
+from typing import Optional, Dict, List, Iterable, Callable
+import asyncio
+import random
+from functools import lru_cache
 
-from pathlib import Path
+from general_tools.credentials import require_openai_api_key, session_chat_model
+# build_match_pairs lived here before training_examples.py; still importable from here
+from general_tools.training_examples import TrainingExamples, training_examples, build_match_pairs
 
-file_path = Path.cwd() / "auxiliary_files" / "autoreconcilitation_training_terms_20251203_formatted.xlsx"
-df = pd.read_excel(file_path) 
+# Priority of the SKOS classes when candidates are compared (0 = no match)
+SKOS_RANK = {"exact": 3, "close": 2, "related": 1}
 
-#df=pd.read_excel("/content/autoreconcilitation_training_terms_20251203_formatted.xlsx")
 
-def build_match_pairs(
-    df: pd.DataFrame,
-    match_name: str,
-    label_col: str,
-    desc_col: str,
-    term_col: str = "term",
-    def_col: str = "definition",
-):
-    """
-    Build plain-text pairs for a given SKOS match type.
-    Returns a full text block as a string instead of printing.
-    """
-    buffer = StringIO()
-    buffer.write(f"========== {match_name} pairs ==========\n\n")
-
-    subset = df.dropna(subset=[label_col])
-
-    for n, row in enumerate(subset.itertuples(index=False), start=1):
-        term_a = getattr(row, term_col)
-        def_a  = getattr(row, def_col)
-        term_b = getattr(row, label_col)
-        def_b  = getattr(row, desc_col)
-
-        buffer.write(f"{n}) Term A: {term_a}\n")
-        buffer.write(f"   Definition A: {def_a}\n")
-        buffer.write(f"   Term B: {term_b}\n")
-        buffer.write(f"   Definition B: {def_b}\n\n")
-
-    return buffer.getvalue()
-
-exact_text = build_match_pairs(
-    df,
-    match_name="exactMatch",
-    label_col="exactMatch_label",
-    desc_col="exactMatch_description"
-)
-
-close_text = build_match_pairs(
-    df,
-    match_name="closeMatch",
-    label_col="closeMatch_label",
-    desc_col="closeMatch_description"
-)
-
-related_text = build_match_pairs(
-    df,
-    match_name="relatedMatch",
-    label_col="relatedMatch_label",
-    desc_col="relatedMatch_description"
-)
-
-class SKOSMatch(BaseModel):
-    """SKOS-style semantic relationship between two concepts."""
-
-    exact_match: bool = Field(
-        default=None,
-        description=(
-            f"""True if the two concepts can be used interchangeably across schemes.
+@lru_cache(maxsize=2)
+def _skos_match_model(examples: TrainingExamples):
+    # Built on first use: the field descriptions carry the training examples,
+    # which are only loaded then (see training_examples.py)
+    exact_text, close_text, related_text = examples
+
+    class SKOSMatch(BaseModel):
+        """SKOS-style semantic relationship between two concepts."""
+
+        exact_match: bool = Field(
+            default=None,
+            description=(
+                f"""True if the two concepts can be used interchangeably across schemes.
 They denote the same real-world concept, even if the wording differs.
 This is symmetric and transitive.
 
 EXACT MATCH EXAMPLES:
 {exact_text}
 """
-        ),
-    )
+            ),
+        )
 
-    close_match: bool = Field(
-        default=None,
-        description=(
-            f"""True if the two concepts are very similar and usually substitutable in most contexts,
+        close_match: bool = Field(
+            default=None,
+            description=(
+                f"""True if the two concepts are very similar and usually substitutable in most contexts,
 but not strictly equivalent. Not transitive.
 
 CLOSE MATCH EXAMPLES:
 {close_text}
 """
-        ),
-    )
+            ),
+        )
 
-    related_match: bool = Field(
-        default=None,
-        description=(
-            f"""True if the two concepts are associated but not synonymous.
+        related_match: bool = Field(
+            default=None,
+            description=(
+                f"""True if the two concepts are associated but not synonymous.
 Represents a non-hierarchical 'see also' relation.
 
 RELATED MATCH EXAMPLES:
 {related_text}
 """
-        ),
-    )
+            ),
+        )
 
-    explanation: Optional[str] = Field(
-        default=None,
-        description=(
-            """Short explanation of why the chosen semantic relationship holds,
+        explanation: Optional[str] = Field(
+            default=None,
+            description=(
+                """Short explanation of why the chosen semantic relationship holds,
 based on comparing terms and definitions."""
-        ),
-    )
+            ),
+        )
+
+    return SKOSMatch
+
+
+def skos_match_model():
+    """SKOSMatch schema (exact / close / related flags + explanation) with the current examples."""
+    return _skos_match_model(training_examples())
+
+
+def __getattr__(name):
+    # The former module-level names, built on first access instead of at import
+    # (the training spreadsheet is only read then)
+    if name == "SKOSMatch":
+        return skos_match_model()
+    if name in {"exact_text", "close_text", "related_text"}:
+        return getattr(training_examples(), name[: -len("_text")])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # agent = create_agent(
@@ -124,21 +95,24 @@ based on comparing terms and definitions."""
 #     response_format=SKOSMatch,
 # )
 
-def _get_structured_llm():
-    # IMPORTANT: read key from env; if missing, fail with clear message
-    if not os.environ.get("OPENAI_API_KEY"):
-        raise RuntimeError("OPENAI_API_KEY is not set (expected env var).")
+@lru_cache(maxsize=2)
+def _structured_llm_for(schema):
+    # one client for all sessions: the key is sent per request (credentials.py)
+    llm_skos = session_chat_model("gpt-5.1", temperature=0)
+    return llm_skos.with_structured_output(schema)
 
-    llm_skos = ChatOpenAI(model="gpt-5.1", temperature=0)
-    return llm_skos.with_structured_output(SKOSMatch)
 
+def _get_structured_llm():
+    # key of the current session / request (env var outside of the app);
+    # if missing, fail with clear message
+    require_openai_api_key()
+    return _structured_llm_for(skos_match_model())
 
 
-def classify_skos_match(term_a: str, gen_def: str, term_b: str, onto_def: str):
+
+def _skos_messages(term_a: str, gen_def: str, term_b: str, onto_def: str):
     """
-    Function to classify semantic relationships between two concepts into the
-    SKOS concept: exact, close and related. The output is the matching type and
-    the explanation
+    Build the prompt messages shared by the sync and async SKOS classifiers.
     """
     prompt=f"""
         You are comparing semantic similarities between two concepts. Each concept
@@ -154,14 +128,16 @@ def classify_skos_match(term_a: str, gen_def: str, term_b: str, onto_def: str):
 
       """
 
-    messages = [
+    from langchain_core.messages import HumanMessage
+    return [
         HumanMessage(content=prompt),
     ]
-    structured_llm_skos = _get_structured_llm()
-
-    data: SKOSMatch = structured_llm_skos.invoke(messages)
 
 
+def _skos_result(data) -> Dict[str, str]:
+    """
+    Turn the structured SKOSMatch answer into {"mapping_type", "explanation"}.
+    """
      # Decide mapping_type with priority: exact > close > related
     if data.exact_match:
         mapping_type = "exact"
@@ -177,6 +153,156 @@ def classify_skos_match(term_a: str, gen_def: str, term_b: str, onto_def: str):
         "explanation": data.explanation or ""
     }
 
+
+def classify_skos_match(term_a: str, gen_def: str, term_b: str, onto_def: str):
+    """
+    Function to classify semantic relationships between two concepts into the
+    SKOS concept: exact, close and related. The output is the matching type and
+    the explanation
+    """
+    messages = _skos_messages(term_a, gen_def, term_b, onto_def)
+    structured_llm_skos = _get_structured_llm()
+
+    data = structured_llm_skos.invoke(messages)
+
+    return _skos_result(data)
+
+
+# ------------------------------------------------------------
+# Async classification with bounded concurrency
+# ------------------------------------------------------------
+
+def _is_rate_limit_error(exc: BaseException) -> bool:
+    """
+    True for OpenAI/httpx rate-limit errors (HTTP 429), without importing
+    the openai exception classes directly.
+    """
+    if type(exc).__name__ == "RateLimitError":
+        return True
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status == 429
+
+
+class AdaptiveBackoff:
+    """
+    Shared backoff state for a batch of LLM calls.
+
+    Every rate-limit error doubles the delay (up to max_delay), every success
+    halves it again, so the whole batch slows down together when the API
+    pushes back and speeds up once it recovers.
+    """
+
+    def __init__(self, base_delay: float = 1.0, max_delay: float = 60.0):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.delay = 0.0
+
+    def on_rate_limit(self) -> float:
+        self.delay = min(self.max_delay, max(self.base_delay, self.delay * 2))
+        return self.delay
+
+    def on_success(self):
+        self.delay = self.delay / 2 if self.delay > self.base_delay else 0.0
+
+    async def wait(self):
+        """Sleep the current delay (plus up to 25 % jitter) before a call."""
+        if self.delay:
+            await asyncio.sleep(self.delay * (1 + random.random() * 0.25))
+
+
+async def aclassify_skos_match(
+    term_a: str,
+    gen_def: str,
+    term_b: str,
+    onto_def: str,
+    backoff: Optional[AdaptiveBackoff] = None,
+    max_retries: int = 5,
+):
+    """
+    Async version of classify_skos_match. Uses `ainvoke`, so it does not block
+    the event loop. Rate-limit errors are retried with adaptive backoff (the
+    delay is slept once, by backoff.wait() before the next attempt), other
+    errors are raised.
+    """
+    messages = _skos_messages(term_a, gen_def, term_b, onto_def)
+    structured_llm_skos = _get_structured_llm()
+    backoff = backoff or AdaptiveBackoff()
+
+    for attempt in range(max_retries + 1):
+        await backoff.wait()
+        try:
+            data = await structured_llm_skos.ainvoke(messages)
+        except Exception as e:
+            if not _is_rate_limit_error(e) or attempt == max_retries:
+                raise
+            backoff.on_rate_limit()
+            continue
+        backoff.on_success()
+        return _skos_result(data)
+
+
+async def aclassify_skos_matches(
+    pairs: Iterable[Dict[str, str]],
+    max_concurrency: int = 8,
+    max_retries: int = 5,
+    on_result: Optional[Callable[[int, Dict[str, str]], None]] = None,
+) -> List[Dict[str, str]]:
+    """
+    Classify many concept pairs concurrently.
+
+    Each pair is a dict with the classify_skos_match keys
+    (term_a, gen_def, term_b, onto_def). At most `max_concurrency` LLM calls
+    run at the same time and all calls share one AdaptiveBackoff.
+
+    Results keep the input order. A pair that fails gets
+    {"mapping_type": "none", "explanation": "ERROR: ..."} instead of
+    failing the whole batch. `on_result(index, result)` is called as soon as
+    a pair is done (in the thread running the event loop).
+    """
+    semaphore = asyncio.Semaphore(max(1, int(max_concurrency)))
+    backoff = AdaptiveBackoff()
+
+    async def _one(index: int, pair: Dict[str, str]) -> Dict[str, str]:
+        result = await _classify(pair)
+        if on_result is not None:
+            on_result(index, result)
+        return result
+
+    async def _classify(pair: Dict[str, str]) -> Dict[str, str]:
+        async with semaphore:
+            try:
+                return await aclassify_skos_match(
+                    term_a=pair.get("term_a", ""),
+                    gen_def=pair.get("gen_def", ""),
+                    term_b=pair.get("term_b", ""),
+                    onto_def=pair.get("onto_def", ""),
+                    backoff=backoff,
+                    max_retries=max_retries,
+                )
+            except Exception as e:
+                return {"mapping_type": "none", "explanation": f"ERROR: {e}"}
+
+    return await asyncio.gather(*[_one(i, p) for i, p in enumerate(pairs)])
+
+
+def classify_skos_matches(
+    pairs: Iterable[Dict[str, str]],
+    max_concurrency: int = 8,
+    max_retries: int = 5,
+    on_result: Optional[Callable[[int, Dict[str, str]], None]] = None,
+) -> List[Dict[str, str]]:
+    """
+    Sync wrapper around aclassify_skos_matches for scripts and Streamlit
+    callbacks (which do not run an event loop of their own). `on_result`
+    runs in the calling thread, so it may update Streamlit elements.
+    """
+    return asyncio.run(
+        aclassify_skos_matches(pairs, max_concurrency=max_concurrency, max_retries=max_retries,
+                               on_result=on_result)
+    )
+
 #### Tool for the formatting, fits better for the orchestrating agent compared 
 # to structured output
 
@@ -186,11 +312,10 @@ class Agentmapping(BaseModel):
     skos: str = Field(description="SKOS_matching class: exact, related or close ")
     explanation: str = Field(description="SKOS_matching logic: rationale of the SKOS_matchcing class" )
 
-llm_format = ChatOpenAI(
-    model="gpt-5.1",
-    temperature=0,
-)
-structured_llm_format = llm_format.with_structured_output(Agentmapping)
+@lru_cache(maxsize=1)
+def _format_llm():
+    llm_format = session_chat_model("gpt-5.1", temperature=0)
+    return llm_format.with_structured_output(Agentmapping)
 
 def agentmapping_format(output: str):
     """
@@ -208,11 +333,14 @@ def agentmapping_format(output: str):
         Explanation: The explanation for SKOS matching logic retrieved from explanation field of SKOS matching tool
       """
 
+    from langchain_core.messages import HumanMessage
     messages = [
         HumanMessage(content=prompt),
     ]
 
-    data: SKOSMatch = structured_llm_format.invoke(messages)
+    require_openai_api_key()
+    structured_llm_format = _format_llm()
+    data = structured_llm_format.invoke(messages)
 
 
     return {
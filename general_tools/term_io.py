@@ -0,0 +1,280 @@
+# Streaming input / output of term lists for the headless tools
+# (map_terms_cli.py).
+#
+# Input:  xlsx, csv, parquet or jsonl with the columns Term and Definition,
+#         read in chunks so the whole file never has to be in memory.
+# Output: jsonl or csv, one line per mapped row, flushed right away.
+#
+# Every input row keeps its position in the file ("row", 0-based, counted
+# before empty terms are skipped), so results written out of order can be
+# matched back to the input and already finished rows can be skipped.
+# Failed rows (Status "error") are not finished: compact_results drops them
+# from a result file before a resumed run maps them again.
+#
+# Sharded runs write one file per shard (shard-<i>-of-<n>.jsonl, in input
+# order) plus a .done marker when the shard is complete; merge_shards
+# combines them into one ordered file.
+
+import os
+import re
+import csv
+import json
+import heapq
+from itertools import groupby, islice
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+import pandas as pd
+
+INPUT_FORMATS = [".xlsx", ".csv", ".parquet", ".jsonl"]
+OUTPUT_FORMATS = [".jsonl", ".csv"]
+
+RESULT_FIELDS = ["row", "Term", "Definition", "Endpoint", "Engine", "IRI", "SKOS", "explanation", "Status"]
+
+
+def _clean(value: Any) -> str:
+    if value is None:
+        return ""
+    try:
+        if pd.isna(value):
+            return ""
+    except (TypeError, ValueError):
+        pass
+    return str(value).strip()
+
+
+def _records(path: Path, chunk_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Raw records of the file, chunk by chunk."""
+    suffix = path.suffix.lower()
+    if suffix == ".csv":
+        for chunk in pd.read_csv(path, chunksize=chunk_size, dtype=str):
+            yield chunk.to_dict("records")
+
+    elif suffix == ".parquet":
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pylist()
+
+    elif suffix == ".jsonl":
+        chunk = []
+        with open(path, encoding="utf-8") as fh:
+            for line in fh:
+                if line.strip():
+                    chunk.append(json.loads(line))
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+        if chunk:
+            yield chunk
+
+    elif suffix == ".xlsx":
+        from openpyxl import load_workbook
+        # read_only streams the sheet row by row
+        wb = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = wb.active.iter_rows(values_only=True)
+            header = [_clean(h) for h in next(rows, [])]
+            chunk = []
+            for values in rows:
+                chunk.append(dict(zip(header, values)))
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+        finally:
+            wb.close()
+
+    else:
+        raise ValueError(f"Unsupported input format {suffix!r} (use one of {', '.join(INPUT_FORMATS)}).")
+
+
+def iter_term_chunks(path, chunk_size: int = 200) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Yields lists of {"row": n, "Term": ..., "Definition": ...}; rows with an
+    empty term are skipped. Raises ValueError if Term / Definition are missing.
+    """
+    path = Path(path)
+    position = 0
+    checked = False
+    for records in _records(path, chunk_size):
+        if records and not checked:
+            missing = {"Term", "Definition"} - set(records[0])
+            if missing:
+                raise ValueError(f"Missing required column(s): {', '.join(sorted(missing))}.")
+            checked = True
+
+        chunk = []
+        for rec in records:
+            term = _clean(rec.get("Term"))
+            if term and term.lower() != "nan":
+                chunk.append({"row": position, "Term": term, "Definition": _clean(rec.get("Definition"))})
+            position += 1
+        if chunk:
+            yield chunk
+
+
+def _iter_results(path: Path) -> Iterator[Dict[str, Any]]:
+    if path.suffix.lower() == ".csv":
+        with open(path, encoding="utf-8", newline="") as fh:
+            for rec in csv.DictReader(fh):
+                if (rec.get("row") or "").isdigit():
+                    rec["row"] = int(rec["row"])
+                    yield rec
+    else:
+        with open(path, encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    rec = json.loads(line)
+                    rec["row"] = int(rec["row"])
+                except (ValueError, KeyError, TypeError):
+                    # a line cut off by a crash
+                    continue
+                yield rec
+
+
+def _is_error(rec: Dict[str, Any]) -> bool:
+    return str(rec.get("Status") or "").startswith("error")
+
+
+def read_done_rows(path) -> Set[int]:
+    """
+    Row positions already mapped in an output file (for --resume). Failed
+    rows (Status "error") are not done, a resumed run maps them again.
+    """
+    path = Path(path)
+    if not path.exists() or path.stat().st_size == 0:
+        return set()
+    return {rec["row"] for rec in _iter_results(path) if not _is_error(rec)}
+
+
+def compact_results(path, drop_errors: bool = True) -> Dict[str, int]:
+    """
+    Rewrite a result file in input order with one record per row; the latest
+    mapped record of a row wins over failed ones. With drop_errors, rows that
+    only failed are removed so a resumed run maps them again. Every resume
+    appends a sorted run of rows, the runs are merged as a stream.
+    Returns {"rows": rows kept, "errors": failed rows (dropped or kept)}.
+    """
+    path = Path(path)
+    if not path.exists() or path.stat().st_size == 0:
+        return {"rows": 0, "errors": 0}
+
+    bounds, last, count = [0], None, 0
+    for rec in _iter_results(path):
+        if last is not None and rec["row"] < last:
+            bounds.append(count)
+        last = rec["row"]
+        count += 1
+    bounds.append(count)
+    runs = [islice(_iter_results(path), start, stop) for start, stop in zip(bounds, bounds[1:])]
+
+    kept = errors = 0
+    tmp = path.with_name(path.stem + ".tmp" + path.suffix)
+    with ResultWriter(tmp) as writer:
+        # heapq.merge is stable, so every group is in file order
+        for _, group in groupby(heapq.merge(*runs, key=_row), key=_row):
+            group = list(group)
+            mapped = [rec for rec in group if not _is_error(rec)]
+            if not mapped:
+                errors += 1
+                if drop_errors:
+                    continue
+            writer.write((mapped or group)[-1])
+            kept += 1
+    os.replace(tmp, path)
+    return {"rows": kept, "errors": errors}
+
+
+def _row(rec: Dict[str, Any]) -> int:
+    return rec["row"]
+
+
+class ResultWriter:
+    """
+    Appends result rows to a jsonl or csv file and flushes after every row,
+    so a crash loses nothing that was already reported.
+    """
+
+    def __init__(self, path, append: bool = False):
+        self.path = Path(path)
+        self.format = self.path.suffix.lower()
+        if self.format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unsupported output format {self.format!r} (use one of {', '.join(OUTPUT_FORMATS)}).")
+        write_header = not (append and self.path.exists() and self.path.stat().st_size > 0)
+        self._fh = open(self.path, "a" if append else "w", encoding="utf-8", newline="")
+        self._csv = None
+        if self.format == ".csv":
+            self._csv = csv.DictWriter(self._fh, fieldnames=RESULT_FIELDS, extrasaction="ignore")
+            if write_header:
+                self._csv.writeheader()
+
+    def write(self, record: Dict[str, Any]):
+        if self._csv is not None:
+            self._csv.writerow(record)
+        else:
+            self._fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._fh.flush()
+
+    def close(self):
+        self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ============================================================
+# Shards
+# ============================================================
+
+def shard_file(shard_dir, index: int, shards: int, fmt: str = ".jsonl") -> Path:
+    return Path(shard_dir) / f"shard-{index}-of-{shards}{fmt}"
+
+
+def done_marker(path) -> Path:
+    """Written next to a shard file once the shard is complete (contains its stats)."""
+    path = Path(path)
+    return path.with_name(path.name + ".done")
+
+
+def merge_shards(shard_dir, output, shards: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Merge shard-<i>-of-<n> files of `shard_dir` into one result file ordered
+    by input row. Shard files are written in input order, so this is a
+    streaming k-way merge. Rows present twice (a resumed shard) are written
+    once. Returns {"rows", "shards", "missing": [shard indices without a file],
+    "incomplete": [shard files without .done]}.
+    """
+    pattern = re.compile(r"shard-(\d+)-of-(\d+)\.(jsonl|csv)$")
+    files = []
+    for path in sorted(Path(shard_dir).iterdir()):
+        m = pattern.match(path.name)
+        if m and (shards is None or int(m.group(2)) == shards):
+            files.append(path)
+    if not files:
+        raise ValueError(f"No shard files found in {shard_dir}.")
+    counts = {int(pattern.match(f.name).group(2)) for f in files}
+    if len(counts) > 1:
+        raise ValueError(f"Shard files of different runs in {shard_dir} (shard counts {sorted(counts)}); pass the count explicitly.")
+    present = {int(pattern.match(f.name).group(1)) for f in files}
+    missing = [i for i in range(counts.pop()) if i not in present]
+
+    rows = 0
+    last = None
+    with ResultWriter(output) as writer:
+        for rec in heapq.merge(*(_iter_results(f) for f in files), key=_row):
+            if rec["row"] == last:
+                continue
+            writer.write(rec)
+            last = rec["row"]
+            rows += 1
+
+    return {
+        "rows": rows,
+        "shards": len(files),
+        "missing": missing,
+        "incomplete": [f.name for f in files if not done_marker(f).exists()],
+    }
@@ -0,0 +1,91 @@
+# Run-scoped memoization for agent tools.
+#
+# The prompts ask the model to "keep track on what identifiers you tried", but
+# nothing stops it from calling e.g. WikidataEntityDetails("Q42") twice in one
+# run. memoize_tool wraps a tool function so that, inside a `tool_memo_scope()`,
+# an identical second call returns the cached result plus a short note instead
+# of hitting the API (and the LLM budget) again.
+#
+# Outside of a scope the wrapped tools behave exactly like the originals.
+
+import json
+import logging
+import functools
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+ALREADY_CHECKED_NOTE = "Already checked in this run with the same arguments; try a different identifier or query."
+
+# One dict per agent invocation: {"cache": {...}, "duplicates": {tool_name: count}}
+_RUN_MEMO: contextvars.ContextVar = contextvars.ContextVar("tool_memo_run", default=None)
+
+
+def _call_key(name: str, args: tuple, kwargs: dict) -> str:
+    return json.dumps([name, list(args), sorted(kwargs.items())], default=str, ensure_ascii=False)
+
+
+def _with_note(result: Any) -> Any:
+    if isinstance(result, str):
+        return f"{result}\n\nNOTE: {ALREADY_CHECKED_NOTE}"
+    if isinstance(result, dict):
+        return {**result, "note": ALREADY_CHECKED_NOTE}
+    return {"result": result, "note": ALREADY_CHECKED_NOTE}
+
+
+def memoize_tool(func: Callable) -> Callable:
+    """
+    Wrap a tool function with run-scoped de-duplication. functools.wraps keeps
+    the name, docstring and signature, so the tool schema the LLM sees is
+    unchanged.
+    """
+    if getattr(func, "__tool_memo__", False):
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        run = _RUN_MEMO.get()
+        if run is None:
+            return func(*args, **kwargs)
+
+        key = _call_key(func.__name__, args, kwargs)
+        if key in run["cache"]:
+            run["duplicates"][func.__name__] = run["duplicates"].get(func.__name__, 0) + 1
+            return _with_note(run["cache"][key])
+
+        result = func(*args, **kwargs)
+        run["cache"][key] = result
+        return result
+
+    wrapper.__tool_memo__ = True
+    return wrapper
+
+
+def memoize_tools(tools: List[Callable]) -> List[Callable]:
+    return [memoize_tool(t) for t in tools]
+
+
+@contextmanager
+def tool_memo_scope(label: str = ""):
+    """
+    Scope of one agent invocation. Yields the run dict; duplicate counts are
+    logged when the scope ends.
+
+    The run dict is shared by reference, so tool calls executed in worker
+    threads with a copied context (as LangChain does for sync tools) still
+    write into the same cache.
+    """
+    run: Dict[str, Any] = {"cache": {}, "duplicates": {}}
+    token = _RUN_MEMO.set(run)
+    try:
+        yield run
+    finally:
+        _RUN_MEMO.reset(token)
+        total = sum(run["duplicates"].values())
+        if total:
+            logger.info("tool memo %s: %d duplicate tool call(s) served from cache %s",
+                        label, total, run["duplicates"])
+        else:
+            logger.debug("tool memo %s: no duplicate tool calls", label)
@@ -0,0 +1,144 @@
+# SKOS training examples (exact / close / related pairs) for the prompts.
+#
+# The agents, the SKOS classifier and the retrieve-rank prompt all show the
+# same example pairs from
+# auxiliary_files/autoreconcilitation_training_terms_20251203_formatted.xlsx.
+# Before, every one of those modules read the spreadsheet with pandas at
+# import time and rendered the three blocks itself. Now:
+#
+#   ex = training_examples()
+#   ex.exact, ex.close, ex.related
+#
+# The file is parsed on first use only, once per process. The rendered blocks
+# are also stored in a small JSON file keyed by the hash of the spreadsheet,
+# so a new process (another Streamlit worker, the CLI, a batch worker) does
+# not need pandas / openpyxl for them at all. Editing the spreadsheet changes
+# the hash and the blocks are rendered again.
+#
+# The JSON file is training_examples_cache.json in the user cache directory
+# (see app_paths.py) and can be moved with the TRAINING_EXAMPLES_CACHE env var.
+
+import os
+import json
+import hashlib
+import threading
+from io import StringIO
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from general_tools.app_paths import cache_file
+
+TRAINING_FILE = Path.cwd() / "auxiliary_files" / "autoreconcilitation_training_terms_20251203_formatted.xlsx"
+CACHE_NAME = "training_examples_cache.json"
+
+# Bump when the rendering below changes (invalidates the JSON cache)
+_FORMAT_VERSION = 1
+
+# (field, match_name, label column, description column)
+MATCH_TYPES = [
+    ("exact", "exactMatch", "exactMatch_label", "exactMatch_description"),
+    ("close", "closeMatch", "closeMatch_label", "closeMatch_description"),
+    ("related", "relatedMatch", "relatedMatch_label", "relatedMatch_description"),
+]
+
+
+class TrainingExamples(NamedTuple):
+    exact: str
+    close: str
+    related: str
+
+
+def build_match_pairs(
+    df,
+    match_name: str,
+    label_col: str,
+    desc_col: str,
+    term_col: str = "term",
+    def_col: str = "definition",
+):
+    """
+    Build plain-text pairs for a given SKOS match type.
+    Returns a full text block as a string instead of printing.
+    """
+    buffer = StringIO()
+    buffer.write(f"========== {match_name} pairs ==========\n\n")
+
+    subset = df.dropna(subset=[label_col])
+
+    for n, row in enumerate(subset.itertuples(index=False), start=1):
+        term_a = getattr(row, term_col)
+        def_a  = getattr(row, def_col)
+        term_b = getattr(row, label_col)
+        def_b  = getattr(row, desc_col)
+
+        buffer.write(f"{n}) Term A: {term_a}\n")
+        buffer.write(f"   Definition A: {def_a}\n")
+        buffer.write(f"   Term B: {term_b}\n")
+        buffer.write(f"   Definition B: {def_b}\n\n")
+
+    return buffer.getvalue()
+
+
+def _render(path: Path) -> TrainingExamples:
+    import pandas as pd
+
+    df = pd.read_excel(path)
+    return TrainingExamples(*[
+        build_match_pairs(df, match_name=name, label_col=label_col, desc_col=desc_col)
+        for _, name, label_col, desc_col in MATCH_TYPES
+    ])
+
+
+def _file_hash(path: Path) -> str:
+    with open(path, "rb") as fh:
+        return hashlib.sha1(fh.read()).hexdigest()
+
+
+def _read_cache(cache_path: Path, digest: str) -> Optional[TrainingExamples]:
+    try:
+        with open(cache_path, encoding="utf-8") as fh:
+            data = json.load(fh)
+        if data.get("sha1") != digest or data.get("version") != _FORMAT_VERSION:
+            return None
+        return TrainingExamples(**data["blocks"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _write_cache(cache_path: Path, digest: str, examples: TrainingExamples):
+    tmp = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump({"sha1": digest, "version": _FORMAT_VERSION, "blocks": examples._asdict()}, fh, ensure_ascii=False)
+        # atomic, so parallel workers never read half a file
+        os.replace(tmp, cache_path)
+    except OSError:
+        # read-only checkout etc.: the in-memory copy is enough
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+
+
+_lock = threading.Lock()
+# (path, mtime, size) -> examples of this process
+_loaded = {}
+
+
+def training_examples(path=None, cache_path=None) -> TrainingExamples:
+    """Rendered example blocks of the training spreadsheet (parsed at most once per file version)."""
+    path = Path(path or TRAINING_FILE)
+    cache_path = Path(cache_path or cache_file(CACHE_NAME, "TRAINING_EXAMPLES_CACHE"))
+    st = path.stat()
+    stamp = (str(path), st.st_mtime, st.st_size)
+
+    with _lock:
+        if stamp not in _loaded:
+            digest = _file_hash(path)
+            examples = _read_cache(cache_path, digest)
+            if examples is None:
+                examples = _render(path)
+                _write_cache(cache_path, digest, examples)
+            _loaded.clear()
+            _loaded[stamp] = examples
+        return _loaded[stamp]
@@ -0,0 +1,322 @@
+# map_terms_cli.py
+#
+# Headless batch mapping, same engines as the Mapping page.
+#
+#   python map_terms_cli.py terms.xlsx results.jsonl --endpoint Wikidata
+#   python map_terms_cli.py terms.csv results.csv --endpoint Multiagent --engine Pipeline --workers 8
+#
+# The input (xlsx / csv / parquet / jsonl with Term, Definition) is read in
+# chunks and every result is written as soon as it is ready, so memory stays
+# bounded for arbitrarily long term lists. Results carry the input position
+# ("row"); with --ordered they are also written in input order.
+# --resume skips rows that are already mapped in the output file; rows that
+# failed are mapped again.
+#
+# Sharding (very large lists, several processes or machines):
+#
+#   python map_terms_cli.py terms.parquet shards/ --shards 4          # 4 local processes + merge
+#   python map_terms_cli.py terms.parquet /shared/shards --shard 2/8  # shard 2 of 8 on this machine
+#   python map_terms_cli.py /shared/shards results.jsonl --merge      # ordered merge of all shards
+#
+# A term always lands in the same shard (hash of the normalized term and
+# definition). Each shard writes shard-<i>-of-<n>.jsonl in input order; that
+# file is its checkpoint (a restarted shard resumes from it and retries its
+# failed rows) and a .done marker is written once no row of it failed.
+#
+# Exit codes: 0 all rows mapped, 1 some rows failed (status "error"),
+#             2 bad arguments / unreadable input.
+# A summary is printed to stderr (and written with --stats).
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from pathlib import Path
+from collections import Counter
+from typing import Any, Dict, List
+
+from general_tools.agent_budget import AgentBudget, RECOMMENDED_BUDGET
+from general_tools.batch_engine import BatchItem, BatchRunner, build_agent, shard_of
+from general_tools.mapping_engine import ENDPOINTS, ENGINES, status_label
+from general_tools.result_cache import CACHE_MODES, get_result_cache
+from general_tools.term_io import (
+    ResultWriter, compact_results, done_marker, iter_term_chunks, merge_shards, read_done_rows, shard_file,
+)
+
+EXIT_OK, EXIT_ROW_ERRORS, EXIT_USAGE = 0, 1, 2
+
+
+def _csv_list(text: str) -> List[str]:
+    return [x.strip() for x in (text or "").split(",") if x.strip()]
+
+
+def _limit(value):
+    """0 disables a budget limit (same convention as the Mapping page)."""
+    return value if value and value > 0 else None
+
+
+class _Summary:
+    def __init__(self):
+        self.start = time.monotonic()
+        self.status = Counter()
+        self.skos = Counter()
+        self.rows = 0
+        self.skipped = 0
+        self.retried = 0
+        self.no_match = 0
+        self.cached = 0
+
+    def add(self, out: Dict[str, Any]):
+        self.rows += 1
+        self.status[out.get("status", "ok")] += 1
+        self.cached += bool(out.get("cached"))
+        iri = out.get("IRI") or ""
+        if out.get("status") != "error" and (not iri or iri.startswith("No ")):
+            self.no_match += 1
+        if out.get("SKOS"):
+            self.skos[str(out["SKOS"]).strip().lower()] += 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        seconds = time.monotonic() - self.start
+        return {
+            "rows": self.rows,
+            "skipped_already_done": self.skipped,
+            "retried_errors": self.retried,
+            "errors": self.status.get("error", 0),
+            "cached": self.cached,
+            "no_match": self.no_match,
+            "status": dict(self.status),
+            "skos": dict(self.skos),
+            "seconds": round(seconds, 1),
+            "rows_per_minute": round(self.rows / seconds * 60, 1) if seconds > 0 else 0.0,
+        }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Map Term/Definition rows to Wikidata / BioPortal identifiers.")
+    parser.add_argument("input", help="xlsx, csv, parquet or jsonl with the columns Term and Definition")
+    parser.add_argument("output", help="Result file (.jsonl or .csv)")
+    parser.add_argument("--endpoint", choices=ENDPOINTS, default="Wikidata")
+    parser.add_argument("--engine", choices=ENGINES, default="Agent")
+    parser.add_argument("--parallel-multiagent", action="store_true",
+                        help="Multiagent: run the BioPortal and Wikidata agents in parallel")
+    parser.add_argument("--trusted-ontologies", default="MESH,NCIT,LOINC,FOODON")
+    parser.add_argument("--term-ontologies", default="NCIT,NIFSTD,SNOMEDCT")
+    parser.add_argument("--workers", type=int, default=4, help="Terms mapped in parallel")
+    parser.add_argument("--bioportal-limit", type=int, default=3,
+                        help="Max parallel BioPortal / Multiagent terms (0 = only --workers)")
+    parser.add_argument("--chunk-size", type=int, default=200, help="Input rows read per chunk")
+    parser.add_argument("--ordered", action="store_true", help="Write results in input order")
+    parser.add_argument("--cache-mode", choices=CACHE_MODES, default="use",
+                        help="Shared result cache: use stored results, refresh them, or bypass the cache")
+    parser.add_argument("--resume", action="store_true",
+                        help="Append to output, skip rows already mapped in it and retry failed ones")
+    # agent budget: 0 = no limit; nothing is limited by default (limits are
+    # checked between agent steps)
+    parser.add_argument("--max-llm-turns", type=int, default=0)
+    parser.add_argument("--max-tool-calls", type=int, default=0)
+    parser.add_argument("--max-tokens", type=int, default=0)
+    parser.add_argument("--max-seconds", type=float, default=0)
+    parser.add_argument("--stop-on-exact", action="store_true",
+                        help="Stop an agent run as soon as an exact SKOS match is confirmed")
+    parser.add_argument("--recommended-budget", action="store_true",
+                        help="20 LLM turns, 30 tool calls, 180 s and --stop-on-exact (explicit limits win)")
+    parser.add_argument("--shard", default=None, metavar="I/N",
+                        help="Only map shard I of N; output is then a directory of shard files")
+    parser.add_argument("--shards", type=int, default=None, metavar="N",
+                        help="Run N shards as local processes, then merge them into <output>/merged.<format>")
+    parser.add_argument("--format", choices=["jsonl", "csv"], default="jsonl", help="Format of shard files")
+    parser.add_argument("--merge", action="store_true",
+                        help="Merge the shard files of the directory <input> into the ordered file <output>")
+    parser.add_argument("--stats", default=None, help="Also write the summary as JSON to this file")
+    parser.add_argument("--quiet", action="store_true", help="No per-row progress on stderr")
+    return parser
+
+
+def run(args) -> int:
+    trusted = _csv_list(args.trusted_ontologies)
+    term_onts = _csv_list(args.term_ontologies)
+    preset = RECOMMENDED_BUDGET if args.recommended_budget else AgentBudget()
+    budget = AgentBudget(
+        max_llm_turns=_limit(args.max_llm_turns) or preset.max_llm_turns,
+        max_tool_calls=_limit(args.max_tool_calls) or preset.max_tool_calls,
+        max_tokens=_limit(args.max_tokens) or preset.max_tokens,
+        max_seconds=_limit(args.max_seconds) or preset.max_seconds,
+        stop_on_exact=args.stop_on_exact or preset.stop_on_exact,
+    )
+    agents = {}
+    if args.engine == "Agent":
+        agents[args.endpoint] = build_agent(args.endpoint, parallel_multiagent=args.parallel_multiagent)
+
+    runner = BatchRunner(
+        agents=agents,
+        term_onts=term_onts,
+        trusted_onts=trusted,
+        budget=budget,
+        max_workers=args.workers,
+        endpoint_limits={"Bioportal": args.bioportal_limit, "Multiagent": args.bioportal_limit},
+        cache=None if args.cache_mode == "bypass" else get_result_cache(),
+        cache_mode=args.cache_mode,
+        parallel_multiagent=args.parallel_multiagent,
+    )
+
+    shard = _parse_shard(args.shard) if args.shard else None
+    summary = _Summary()
+    done_rows = set()
+    if args.resume:
+        # failed rows leave the checkpoint and are mapped again
+        summary.retried = compact_results(args.output)["errors"]
+        done_rows = read_done_rows(args.output)
+
+    with ResultWriter(args.output, append=args.resume) as writer:
+        for chunk in iter_term_chunks(args.input, chunk_size=args.chunk_size):
+            items = [
+                BatchItem(term=rec["Term"], definition=rec["Definition"], endpoint=args.endpoint,
+                          engine=args.engine, key=rec["row"])
+                for rec in chunk
+            ]
+            if shard:
+                items = [item for item in items if shard_of(item, shard[1]) == shard[0]]
+            todo = [item for item in items if item.key not in done_rows]
+            summary.skipped += len(items) - len(todo)
+            if not todo:
+                continue
+            items = todo
+
+            # --ordered: finished rows wait until all earlier rows of the chunk are written
+            buffered: Dict[int, Dict[str, Any]] = {}
+            next_index = [0]
+
+            def _write(i: int, item: BatchItem, out: Dict[str, Any]):
+                record = {
+                    "row": item.key,
+                    "Term": item.term,
+                    "Definition": item.definition,
+                    "Endpoint": item.endpoint,
+                    "Engine": item.engine,
+                    "IRI": out.get("IRI", ""),
+                    "SKOS": out.get("SKOS", ""),
+                    "explanation": out.get("explanation", ""),
+                    "Status": status_label(out),
+                }
+                summary.add(out)
+                if not args.quiet:
+                    print(f"[{summary.rows}] row {item.key}: {item.term} -> {record['IRI']} ({record['SKOS']}) "
+                          f"{record['Status']}", file=sys.stderr)
+                if not args.ordered:
+                    writer.write(record)
+                    return
+                buffered[i] = record
+                while next_index[0] in buffered:
+                    writer.write(buffered.pop(next_index[0]))
+                    next_index[0] += 1
+
+            runner.run(items, on_result=_write)
+
+    failed = 0
+    if args.resume and args.ordered:
+        # rows mapped now were appended behind the rows kept from earlier runs
+        failed = compact_results(args.output, drop_errors=False)["errors"]
+
+    stats = summary.as_dict()
+    print(json.dumps(stats, indent=2), file=sys.stderr)
+    if args.stats:
+        with open(args.stats, "w", encoding="utf-8") as fh:
+            json.dump(stats, fh, indent=2)
+    if shard and not stats["errors"] and not failed:
+        done_marker(args.output).write_text(json.dumps(stats, indent=2), encoding="utf-8")
+    return EXIT_ROW_ERRORS if stats["errors"] else EXIT_OK
+
+
+def _parse_shard(text: str):
+    """'2/8' -> (2, 8)"""
+    try:
+        index, shards = (int(x) for x in text.split("/"))
+    except ValueError:
+        raise ValueError(f"--shard expects I/N, e.g. 0/4 (got {text!r}).")
+    if not (shards > 0 and 0 <= index < shards):
+        raise ValueError(f"--shard {text}: I must be between 0 and N-1.")
+    return index, shards
+
+
+def _merge(shard_dir, output, shards=None) -> int:
+    result = merge_shards(shard_dir, output, shards=shards)
+    print(json.dumps({"merged_rows": result["rows"], "shards": result["shards"],
+                      "missing": result["missing"], "incomplete": result["incomplete"]}, indent=2), file=sys.stderr)
+    return EXIT_ROW_ERRORS if result["missing"] or result["incomplete"] else EXIT_OK
+
+
+def _run_local_shards(args, argv: List[str]) -> int:
+    """Start one process per shard with the same arguments, wait, then merge."""
+    forwarded, skip = [], False
+    for a in argv:
+        if skip:
+            skip = False
+            continue
+        if a == "--shards":
+            skip = True
+            continue
+        if a.startswith("--shards="):
+            continue
+        forwarded.append(a)
+
+    procs = [
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), *forwarded, "--shard", f"{i}/{args.shards}"])
+        for i in range(args.shards)
+    ]
+    codes = [p.wait() for p in procs]
+    if any(c == EXIT_USAGE for c in codes):
+        return EXIT_USAGE
+    merge_code = _merge(args.output, Path(args.output) / f"merged.{args.format}", shards=args.shards)
+    return max(codes + [merge_code])
+
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else list(argv)
+    args = build_parser().parse_args(argv)
+
+    if args.merge:
+        try:
+            return _merge(args.input, args.output)
+        except (ValueError, OSError) as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            return EXIT_USAGE
+
+    if not os.environ.get("OPENAI_API_KEY"):
+        print("OPENAI_API_KEY is not set (expected env var).", file=sys.stderr)
+        return EXIT_USAGE
+    if args.endpoint in {"Bioportal", "Multiagent"} and not os.environ.get("BIOPORTAL_API_KEY"):
+        print(f"BIOPORTAL_API_KEY is required for {args.endpoint}.", file=sys.stderr)
+        return EXIT_USAGE
+    if not os.path.exists(args.input):
+        print(f"Input file not found: {args.input}", file=sys.stderr)
+        return EXIT_USAGE
+
+    if args.shards or args.shard:
+        # output is a directory of shard files
+        os.makedirs(args.output, exist_ok=True)
+    if args.shards:
+        return _run_local_shards(args, argv)
+    if args.shard:
+        try:
+            index, shards = _parse_shard(args.shard)
+        except ValueError as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            return EXIT_USAGE
+        # The shard file is the checkpoint: always resume, always in input order
+        args.output = str(shard_file(args.output, index, shards, f".{args.format}"))
+        args.resume, args.ordered = True, True
+        args.stats = str(Path(args.output).with_suffix(".stats.json"))
+
+    try:
+        return run(args)
+    except ValueError as e:
+        # unsupported format / missing columns
+        print(f"ERROR: {e}", file=sys.stderr)
+        return EXIT_USAGE
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+# mcp_lookup_server.py
+#
+# The Wikidata / BioPortal lookups of the deep agents as MCP tools, for other
+# agents that want the same lookup capability:
+#   WikidataEntitySearch, WikidataEntityDetails       (wikidata_tools.py)
+#   find_term_in_ontology, find_best_definition       (bioportal_tools.py)
+#   lookup_cache_stats                                (hits / misses of the cache)
+#
+# Transports (same as mcp_skos_server.py):
+#   python mcp_lookup_server.py                                    # stdio
+#   python mcp_lookup_server.py --transport streamable-http --port 8766
+#       -> http://127.0.0.1:8766/mcp, shared by several clients
+#
+# All upstream requests go through general_tools/http_client.py: one pooled
+# requests.Session and one response cache for the whole server, so a lookup
+# done for one client is a warm result for every other one.
+#
+# BioPortal key: over HTTP the X-BioPortal-API-Key header of the client; a
+# BioPortal lookup without it is rejected unless the server was started with
+# --allow-server-key (or MCP_LOOKUP_ALLOW_SERVER_KEY=1), then BIOPORTAL_API_KEY
+# of the server environment is used, as always over stdio. The lookups are blocking
+# (requests), so they run in worker threads, at most MCP_LOOKUP_MAX_CONCURRENCY
+# (default 16) at a time.
+import os
+import asyncio
+import argparse
+from contextlib import nullcontext
+from typing import Any, Dict, Optional, Tuple
+
+from mcp.server.fastmcp import FastMCP, Context
+
+from general_tools.credentials import use_credentials
+from general_tools.http_client import response_cache
+from wikidata_agent_and_tools import wikidata_tools
+from bioportal_agent_and_tools import bioportal_tools
+
+BIOPORTAL_KEY_HEADER = "x-bioportal-api-key"
+MAX_CONCURRENCY = int(os.environ.get("MCP_LOOKUP_MAX_CONCURRENCY") or 16)
+# HTTP BioPortal lookups without X-BioPortal-API-Key may use the server key (opt-in)
+ALLOW_SERVER_KEY = os.environ.get("MCP_LOOKUP_ALLOW_SERVER_KEY", "").lower() in {"1", "true", "yes"}
+
+mcp = FastMCP("linked-data-lookup")
+
+# created on first use, inside the server's event loop
+_slots: Optional[asyncio.Semaphore] = None
+
+
+def _request_credentials(ctx: Context, needs_key: bool = False):
+    """BioPortal key sent by an HTTP client for this request (stdio: the server env)."""
+    request = ctx.request_context.request
+    if request is None:
+        return nullcontext()
+    key = request.headers.get(BIOPORTAL_KEY_HEADER)
+    if key:
+        return use_credentials(bioportal_api_key=key)
+    if needs_key and not ALLOW_SERVER_KEY:
+        raise ValueError("Missing X-BioPortal-API-Key header: every HTTP client has to send its own BioPortal key "
+                         "(or start the server with --allow-server-key).")
+    return nullcontext()
+
+
+async def _run(ctx: Context, fn, *args, needs_key: bool = False):
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(max(1, MAX_CONCURRENCY))
+    with _request_credentials(ctx, needs_key):
+        async with _slots:
+            # to_thread copies the context, so the tool sees the request's key
+            return await asyncio.to_thread(fn, *args)
+
+
+@mcp.tool(name="WikidataEntitySearch", description=wikidata_tools.WikidataEntitySearch.__doc__)
+async def wikidata_entity_search(search: str, ctx: Context, entity_type: str = "item") -> Optional[str]:
+    return await _run(ctx, wikidata_tools.WikidataEntitySearch, search, entity_type)
+
+
+@mcp.tool(name="WikidataEntityDetails", description=wikidata_tools.WikidataEntityDetails.__doc__)
+async def wikidata_entity_details(q: str, ctx: Context) -> Optional[Dict[str, Any]]:
+    return await _run(ctx, wikidata_tools.WikidataEntityDetails, q)
+
+
+@mcp.tool(name="find_term_in_ontology", description=bioportal_tools.find_term_in_ontology.__doc__)
+async def find_term_in_ontology(
+    term: str,
+    ontology: str,
+    ctx: Context,
+    exact: bool = True,
+    case_sensitive: bool = False,
+) -> Tuple[str, str]:
+    return await _run(ctx, bioportal_tools.find_term_in_ontology, term, ontology, exact, case_sensitive,
+                      needs_key=True)
+
+
+@mcp.tool(name="find_best_definition", description=bioportal_tools.find_best_definition.__doc__)
+async def find_best_definition(
+    term: str,
+    ontology: str,
+    ctx: Context,
+    exact: bool = True,
+    case_sensitive: bool = False,
+) -> Optional[Dict[str, str]]:
+    return await _run(ctx, bioportal_tools.find_best_definition, term, ontology, exact, case_sensitive,
+                      needs_key=True)
+
+
+@mcp.tool()
+async def lookup_cache_stats() -> Dict[str, Any]:
+    """Hits, misses, size and TTL of the shared upstream response cache."""
+    return response_cache.stats()
+
+
+def main():
+    global ALLOW_SERVER_KEY
+    parser = argparse.ArgumentParser(description="Wikidata / BioPortal lookup MCP server.")
+    parser.add_argument("--transport", choices=["stdio", "streamable-http"], default="stdio")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--allow-server-key", action="store_true",
+                        help="HTTP: use the server BIOPORTAL_API_KEY for requests without X-BioPortal-API-Key")
+    args = parser.parse_args()
+
+    if args.transport == "stdio":
+        mcp.run()
+    else:
+        ALLOW_SERVER_KEY = ALLOW_SERVER_KEY or args.allow_server_key
+        mcp.settings.host = args.host
+        mcp.settings.port = args.port
+        mcp.run(transport="streamable-http")
+
+
+if __name__ == "__main__":
+    main()
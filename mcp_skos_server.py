@@ -6,33 +6,158 @@ Created on Tue Dec 23 12:24:07 2025
 """
 
 # mcp_skos_server.py
+#
+# Transports:
+#   python mcp_skos_server.py                                   # stdio (one client, spawned by it)
+#   python mcp_skos_server.py --transport streamable-http --port 8765
+#       -> http://127.0.0.1:8765/mcp, shared by several clients (set MCP_SKOS_URL
+#          for the Verification service, see general_tools/mcp_skos_client.py)
+#
+# Over HTTP every client must send its own OpenAI key in the X-OpenAI-API-Key
+# header; a request without it is rejected. To let such requests use the key of
+# the server environment instead, start the server with --allow-server-key (or
+# MCP_SKOS_ALLOW_SERVER_KEY=1), e.g. for a server only reachable by trusted
+# clients.
+#
+# All tool calls of the process share one limit of MCP_SKOS_MAX_CONCURRENCY
+# (default 8) LLM calls in flight and one rate-limit backoff, no matter how many
+# clients / batches are running.
 import os
-from typing import Dict
+import json
+import asyncio
+import argparse
+from contextlib import nullcontext
+from typing import Dict, List, Optional
 
 # MCP (FastMCP) server
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import FastMCP, Context
+from pydantic import BaseModel
 
 # Your existing function
-from general_tools.skos_tools import classify_skos_match  # adjust import to your project layout
+from general_tools.skos_tools import aclassify_skos_match, AdaptiveBackoff  # adjust import to your project layout
+from general_tools.credentials import use_credentials
+
+OPENAI_KEY_HEADER = "x-openai-api-key"
+MAX_CONCURRENCY = int(os.environ.get("MCP_SKOS_MAX_CONCURRENCY") or 8)
+# HTTP requests without X-OpenAI-API-Key may use the server key (opt-in)
+ALLOW_SERVER_KEY = os.environ.get("MCP_SKOS_ALLOW_SERVER_KEY", "").lower() in {"1", "true", "yes"}
 
 mcp = FastMCP("skos-verification")
 
+# created on first use, inside the server's event loop
+_slots: Optional[asyncio.Semaphore] = None
+_backoff: Optional[AdaptiveBackoff] = None
+
+
+class SKOSPair(BaseModel):
+    term_a: str
+    gen_def: str
+    term_b: str
+    onto_def: str
+
+
+def _limits():
+    global _slots, _backoff
+    if _slots is None:
+        _slots = asyncio.Semaphore(max(1, MAX_CONCURRENCY))
+        _backoff = AdaptiveBackoff()
+    return _slots, _backoff
+
+
+def _request_credentials(ctx: Context):
+    """Key sent by an HTTP client for this request (stdio: the server env)."""
+    request = ctx.request_context.request
+    if request is None:
+        return nullcontext()
+    key = request.headers.get(OPENAI_KEY_HEADER)
+    if key:
+        return use_credentials(openai_api_key=key)
+    if ALLOW_SERVER_KEY:
+        return nullcontext()
+    raise ValueError("Missing X-OpenAI-API-Key header: every HTTP client has to send its own OpenAI key "
+                     "(or start the server with --allow-server-key).")
+
+
+async def _classify(term_a: str, gen_def: str, term_b: str, onto_def: str) -> Dict[str, str]:
+    slots, backoff = _limits()
+    async with slots:
+        return await aclassify_skos_match(
+            term_a=term_a, gen_def=gen_def, term_b=term_b, onto_def=onto_def, backoff=backoff
+        )
+
+
 @mcp.tool()
-def classify_skos_match_tool(
+async def classify_skos_match_tool(
     term_a: str,
     gen_def: str,
     term_b: str,
     onto_def: str,
+    ctx: Context,
 ) -> Dict[str, str]:
     """
     Classify SKOS relationship between two concepts.
     Returns: {"mapping_type": "...", "explanation": "..."}
     """
-    # classify_skos_match already checks OPENAI_API_KEY (in your skos_tools.py)
-    return classify_skos_match(term_a=term_a, gen_def=gen_def, term_b=term_b, onto_def=onto_def)
+    # aclassify_skos_match already checks OPENAI_API_KEY (in your skos_tools.py)
+    # async so that concurrent tool calls do not block the server event loop
+    with _request_credentials(ctx):
+        return await _classify(term_a=term_a, gen_def=gen_def, term_b=term_b, onto_def=onto_def)
+
+
+@mcp.tool()
+async def classify_skos_matches_tool(
+    pairs: List[SKOSPair],
+    ctx: Context,
+) -> List[Dict[str, str]]:
+    """
+    Classify SKOS relationships for many concept pairs.
+
+    Every pair result is streamed as soon as it is ready, as a progress
+    notification whose message is the JSON
+    {"index": <position in pairs>, "mapping_type": "...", "explanation": "..."}.
+    The final result is the list of all results in input order. A failing pair
+    gets mapping_type "none" and an "ERROR: ..." explanation.
+    """
+    with _request_credentials(ctx):
+
+        async def _one(index: int, pair: SKOSPair):
+            try:
+                result = await _classify(**pair.model_dump())
+            except Exception as e:
+                result = {"mapping_type": "none", "explanation": f"ERROR: {e}"}
+            return index, result
+
+        results: List[Optional[Dict[str, str]]] = [None] * len(pairs)
+        done = 0
+        for next_result in asyncio.as_completed([_one(i, p) for i, p in enumerate(pairs)]):
+            index, result = await next_result
+            results[index] = result
+            done += 1
+            await ctx.report_progress(done, len(pairs), json.dumps({"index": index, **result}))
+        return results
+
+
+def main():
+    global ALLOW_SERVER_KEY
+    parser = argparse.ArgumentParser(description="SKOS verification MCP server.")
+    parser.add_argument("--transport", choices=["stdio", "streamable-http"], default="stdio")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--allow-server-key", action="store_true",
+                        help="HTTP: use the server OPENAI_API_KEY for requests without X-OpenAI-API-Key")
+    args = parser.parse_args()
+
+    if args.transport == "stdio":
+        # Ensure env var is set (your code raises if missing)
+        if not os.environ.get("OPENAI_API_KEY"):
+            raise RuntimeError("OPENAI_API_KEY is not set (expected env var).")
+        mcp.run()
+    else:
+        ALLOW_SERVER_KEY = ALLOW_SERVER_KEY or args.allow_server_key
+        mcp.settings.host = args.host
+        mcp.settings.port = args.port
+        mcp.run(transport="streamable-http")
+
 
 if __name__ == "__main__":
-    # Ensure env var is set (your code raises if missing)
-    if not os.environ.get("OPENAI_API_KEY"):
-        raise RuntimeError("OPENAI_API_KEY is not set (expected env var).")
-    mcp.run()
+    main()
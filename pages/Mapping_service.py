@@ -6,18 +6,22 @@ Created on Mon Dec 22 00:04:18 2025
 """
 # pages/Mapping_service.py
 
-import os
 import json
-from io import BytesIO
 from typing import List, Dict, Any
 import uuid
+from dataclasses import asdict
 
 import pandas as pd
 import streamlit as st
 
-from wikidata_agent_and_tools.deep_agent_wikidata import get_agent_wiki
-from bioportal_agent_and_tools.deep_agent_bioportal import get_agent_bioportal
-from bioportal_wikidata_system.multiagent_system import get_multiagent  # NEW
+from general_tools.mapping_engine import ENGINES, map_term, status_label
+from general_tools.agent_budget import AgentBudget, RECOMMENDED_BUDGET
+from general_tools.batch_engine import BatchItem, BatchRunner, dedupe_items
+from general_tools.batch_results import apply_reeval, ensure_batch_schema, export_xlsx, filter_batch
+from general_tools.job_store import get_job_store, reeval_config, runner_options
+from general_tools.result_cache import CACHE_MODES, get_result_cache
+from general_tools.credentials import credentials_from_session, current_credentials, set_credentials
+from general_tools.agent_cache import cache_stats, get_agent
 
 
 
@@ -27,7 +31,11 @@ from bioportal_wikidata_system.multiagent_system import get_multiagent  # NEW
 st.set_page_config(page_title="Mapping service", layout="centered")
 st.title("Mapping service")
 
-if not os.environ.get("OPENAI_API_KEY"):
+# Keys of this session only (never os.environ, which all sessions share);
+# the agents, tools and batch threads read them from the context.
+set_credentials(credentials_from_session(st.session_state))
+
+if not current_credentials().openai_api_key:
     st.error("OpenAI API key is not set. Please go back to Home and enter it.")
     if st.button("← Back to Home"):
         st.switch_page("Home.py")
@@ -46,6 +54,21 @@ defaults = {
     "mapping_definition_input": "",
     "mapping_multi_input": False,
     "mapping_endpoints_input": [],
+    "mapping_engine_input": "Agent",
+    "multiagent_parallel_input": False,
+    "mapping_cache_mode_input": "use",
+
+    # Per-term agent budget (0 = no limit; unlimited unless set, see agent_budget.py)
+    "budget_llm_turns_input": 0,
+    "budget_tool_calls_input": 0,
+    "budget_tokens_input": 0,
+    "budget_seconds_input": 0,
+    "budget_stop_on_exact_input": False,
+
+    # Batch concurrency
+    "batch_max_workers_input": 4,
+    "batch_bioportal_limit_input": 3,
+    "batch_background_input": False,
 
     # BioPortal session-only inputs
     "bioportal_api_key_input": "",
@@ -56,12 +79,25 @@ defaults = {
     "mapping_iri_out": "",
     "mapping_skos_out": "",
     "mapping_expl_out": "",
+    "mapping_status_out": "",
 
-    # Batch output
+    # Batch output (version changes whenever the results change, see _set_batch_df)
     "mapping_batch_df": None,
+    "mapping_batch_version": "",
+    "mapping_job_id": None,
 
     # Highlight only last re-evaluation
     "last_reeval_run_id": None,
+
+    # Batch results view (filters, paging, re-evaluation selection {RowID: new term})
+    "batch_filter_skos": [],
+    "batch_filter_endpoint": [],
+    "batch_filter_no_match": False,
+    "batch_filter_term": "",
+    "batch_page_size": 50,
+    "batch_page": 1,
+    "reeval_selection": {},
+    "reeval_editor_nonce": 0,
 }
 for k, v in defaults.items():
     st.session_state.setdefault(k, v)
@@ -83,171 +119,193 @@ def _parse_csv_list(text: str) -> List[str]:
     return out
 
 
-def _parse_agent_json(raw: str) -> Dict[str, Any]:
-    """Parse dict from JSON; fallback extracts first {...} block."""
-    try:
-        data = json.loads(raw)
-        return data if isinstance(data, dict) else {}
-    except Exception:
-        s, e = raw.find("{"), raw.rfind("}")
-        if s != -1 and e != -1 and e > s:
-            try:
-                data = json.loads(raw[s:e+1])
-                return data if isinstance(data, dict) else {}
-            except Exception:
-                return {}
-        return {}
-
-
-def _wikidata_url(qid: str) -> str:
-    return f"https://www.wikidata.org/wiki/{qid}"
-
-
-def _qid_to_url_if_needed(identifier: str) -> str:
-    """If identifier is a bare Wikidata QID (Q123), convert to Wikidata URL."""
-    ident = (identifier or "").strip()
-    if ident.startswith("Q") and ident[1:].isdigit():
-        return _wikidata_url(ident)
-    return ident
-
-
-def _extract_multiagent_fields(parsed: Dict[str, Any]) -> Dict[str, str]:
-    """
-    Multiagent final formatting tool returns:
-      {"ID": "...", "SKOS": "...", "SKOS_explanation": "..."}
-    But we also accept fallback keys to be robust.
-    """
-    ident = (
-        parsed.get("ID")
-        or parsed.get("id")
-        or parsed.get("qid")
-        or parsed.get("IRI")
-        or parsed.get("iri")
-        or ""
-    )
-    skos = (
-        parsed.get("SKOS")
-        or parsed.get("skos")
-        or ""
-    )
-    expl = (
-        parsed.get("SKOS_explanation")
-        or parsed.get("skos_explanation")
-        or parsed.get("explanation")
-        or ""
-    )
-    ident = _qid_to_url_if_needed(str(ident))
-    return {
-        "iri": str(ident).strip(),
-        "skos": str(skos).strip(),
-        "explanation": str(expl).strip(),
-    }
-
-
-def _question_wikidata(term: str, definition: str) -> str:
-    return f"""What is the best fitting Q-identifier the term {term} which definition {definition} matches with the label from the wikidata .
-As a reply only provide
-(i) identificator number,
-(ii) SKOS matching between original term definition and the definition/description of the identified label from wikidata
-(iii) Explanation for SKOS matching.
+def _set_batch_df(df: pd.DataFrame):
+    st.session_state["mapping_batch_df"] = df
+    st.session_state["mapping_batch_version"] = uuid.uuid4().hex
 
-SKOS matching and corresponding explanation should be identified with the corresponding tool -
 
-If no proper match is found, you may adjust the search query and try with other identifiers.
+@st.cache_data(max_entries=4, show_spinner=False)
+def _batch_export(version: str, _df: pd.DataFrame) -> bytes:
+    # Keyed by the results version only (the leading underscore keeps
+    # Streamlit from hashing the frame), so reruns reuse the workbook
+    return export_xlsx(_df)
 
-If no proper identifier is found after 10 iterations, return "No wiki match". In that case SKOS matching is not needed
-"""
-
-
-def _question_bioportal(term: str, definition: str, term_onts: List[str], trusted_onts: List[str]) -> str:
-    return f"""Find the best BioPortal identifier/IRI for the term {term} with definition {definition}.
 
-"""
+# ============================================================
+# Shared resources
+# - agents: general_tools/agent_cache.py (shared with the Home warm-up);
+#   compiled once per endpoint, keys and ontology lists are passed per run
+# ============================================================
+@st.cache_resource
+def _job_store():
+    return get_job_store()
 
 
-def _question_multiagent(term: str, definition: str) -> str:
-    return f"""Map the term "{term}" with definition "{definition}" to a valid identifier from BioPortal or Wikidata.
-Return only the final JSON output.
-"""
+@st.cache_resource
+def _result_cache():
+    return get_result_cache()
 
 
-def _ensure_batch_schema(df: pd.DataFrame) -> pd.DataFrame:
-    """Ensure RowID + OriginalTerm + last_updated_run columns exist."""
-    out = df.copy()
+def _cache_options() -> Dict[str, Any]:
+    mode = st.session_state.get("mapping_cache_mode_input", "use")
+    return {"cache": None if mode == "bypass" else _result_cache(), "cache_mode": mode}
 
-    if "RowID" not in out.columns:
-        out.insert(0, "RowID", [str(uuid.uuid4()) for _ in range(len(out))])
 
-    if "OriginalTerm" not in out.columns:
-        out["OriginalTerm"] = out["Term"]
+def _current_budget() -> AgentBudget:
+    """Per-term budget from the page inputs (0 disables a limit)."""
+    def _limit(key):
+        value = st.session_state.get(key) or 0
+        return value if value > 0 else None
 
-    if "last_updated_run" not in out.columns:
-        out["last_updated_run"] = ""
+    return AgentBudget(
+        max_llm_turns=_limit("budget_llm_turns_input"),
+        max_tool_calls=_limit("budget_tool_calls_input"),
+        max_tokens=_limit("budget_tokens_input"),
+        max_seconds=_limit("budget_seconds_input"),
+        stop_on_exact=bool(st.session_state.get("budget_stop_on_exact_input", False)),
+    )
 
-    return out
 
-# ============================================================
-# Agent caches
-# - multiagent cache includes ontology lists so it rebuilds on change
-# ============================================================
-@st.cache_resource
-def _cached_wiki_agent(openai_key: str, langsmith_key: str):
-    return get_agent_wiki()
+def _get_agent(endpoint: str):
+    # agent modules (deepagents, langchain) are imported on first use;
+    # the ontology lists are sent with every question (map_term)
+    return get_agent(endpoint, parallel_multiagent=bool(st.session_state.get("multiagent_parallel_input")))
+
+
+def _map_term(endpoint: str, engine: str, term: str, definition: str,
+              trusted_onts: List[str], term_onts: List[str], on_event=None) -> Dict[str, str]:
+    """Run one mapping with the selected engine; returns IRI / SKOS / explanation."""
+    agent = _get_agent(endpoint) if engine == "Agent" else None
+    return map_term(
+        endpoint,
+        term,
+        definition,
+        engine=engine,
+        agent=agent,
+        term_onts=term_onts,
+        trusted_onts=trusted_onts,
+        budget=_current_budget(),
+        on_event=on_event,
+        parallel_multiagent=bool(st.session_state.get("multiagent_parallel_input")),
+        **_cache_options(),
+    )
 
 
-@st.cache_resource
-def _cached_bio_agent(
-    openai_key: str,
-    langsmith_key: str,
-    bioportal_key: str,
-    trusted_ontologies: tuple,
-    term_ontologies: tuple,
-):
-    return get_agent_bioportal(
-        trusted_ontologies=list(trusted_ontologies),
-        term_ontologies=list(term_ontologies),
+def _event_line(event: Dict[str, Any]) -> str:
+    """One markdown line for a progress event of a running mapping."""
+    prefix = f"[{event['agent']}] " if event.get("agent") else ""
+    kind = event.get("type")
+    if kind == "tool_call":
+        args = ", ".join(f"{k}={v!r}" for k, v in (event.get("args") or {}).items())
+        if len(args) > 120:
+            args = args[:117] + "..."
+        return f"{prefix}🔧 `{event.get('tool')}`({args})"
+    if kind == "candidate":
+        return f"{prefix}🔎 candidate `{event.get('id')}` ({event.get('tool')})"
+    if kind == "verdict":
+        return f"{prefix}⚖️ SKOS **{event.get('skos') or 'none'}** for `{event.get('id') or '?'}`"
+    if kind == "cache_hit":
+        return f"{prefix}💾 served from the result cache (stored {event.get('cached_at') or '?'})"
+    if kind == "budget_exhausted":
+        return f"{prefix}⏱️ budget exhausted ({event.get('limit')})"
+    return f"{prefix}{event}"
+
+
+class _EventFeed:
+    """Shows the last `max_lines` progress events of the running term in a placeholder."""
+
+    def __init__(self, placeholder, max_lines: int = 8):
+        self.placeholder = placeholder
+        self.max_lines = max_lines
+        self.lines: List[str] = []
+
+    def reset(self, header: str):
+        self.lines = [header]
+        self.placeholder.markdown(header)
+
+    def __call__(self, event: Dict[str, Any]):
+        line = _event_line(event)
+        if event.get("term"):
+            line = f"**{event['term']}** · {line}"
+        self.lines.append(line)
+        shown = [self.lines[0]] + self.lines[1:][-self.max_lines:]
+        self.placeholder.markdown("\n\n".join(shown))
+
+
+def _run_batch(items: List[BatchItem], config: Dict[str, Any], on_result=None) -> List[Dict[str, Any]]:
+    """
+    Map `items` concurrently with the settings of a job config (see
+    _job_config) and show progress plus a live event feed. Returns the rows
+    in the order of `items`.
+    """
+    # Agents are resolved here, in the script thread, because the cached
+    # resources and session_state are not reachable from worker threads
+    agents = {
+        endpoint: get_agent(endpoint, parallel_multiagent=bool(config.get("parallel_multiagent")))
+        for endpoint in {item.endpoint for item in items if item.engine == "Agent"}
+    }
+    options = runner_options(config)
+    runner = BatchRunner(
+        agents=agents,
+        cache=None if options["cache_mode"] == "bypass" else _result_cache(),
+        **options,
     )
 
+    # Repeated (Term, Definition) rows are mapped once, announce it up front
+    unique, _ = dedupe_items(items, runner.trusted_onts, runner.term_onts)
+    collapsed = len(items) - len(unique)
+    if collapsed:
+        st.info(f"{collapsed} repeated row(s) collapsed: mapping {len(unique)} unique term(s) for {len(items)} rows.")
 
-@st.cache_resource
-def _cached_multi_agent(
-    openai_key: str,
-    langsmith_key: str,
-    bioportal_key: str,
-    trusted_ontologies: tuple,
-    term_ontologies: tuple,
-):
-    return get_multiagent(
-        trusted_ontologies=list(trusted_ontologies),
-        term_ontologies=list(term_ontologies),
+    progress = st.progress(0)
+    status = st.empty()
+    feed = _EventFeed(st.empty())
+    feed.reset(f"Mapping {len(unique)} term(s), up to {runner.max_workers} at a time")
+
+    def _tick(done: int, total: int):
+        progress.progress(done / total if total else 1.0)
+        status.write(f"Finished {done}/{total}")
+
+    return runner.run(
+        items,
+        on_result=on_result,
+        on_event=lambda i, e: feed({**e, "term": items[i].term}),
+        on_tick=_tick,
     )
 
 
-def _get_wiki_agent():
-    return _cached_wiki_agent(
-        os.environ.get("OPENAI_API_KEY", ""),
-        os.environ.get("LANGSMITH_API_KEY", ""),
-    )
+def _job_config(trusted_onts: List[str], term_onts: List[str]) -> Dict[str, Any]:
+    """Settings stored with a batch job so it can be resumed later."""
+    return {
+        "trusted_onts": list(trusted_onts),
+        "term_onts": list(term_onts),
+        "budget": asdict(_current_budget()),
+        "max_workers": int(st.session_state.get("batch_max_workers_input") or 1),
+        "bioportal_limit": int(st.session_state.get("batch_bioportal_limit_input") or 0),
+        "parallel_multiagent": bool(st.session_state.get("multiagent_parallel_input")),
+        "cache_mode": st.session_state.get("mapping_cache_mode_input", "use"),
+    }
 
 
-def _get_bio_agent(trusted_onts: List[str], term_onts: List[str]):
-    return _cached_bio_agent(
-        os.environ.get("OPENAI_API_KEY", ""),
-        os.environ.get("LANGSMITH_API_KEY", ""),
-        os.environ.get("BIOPORTAL_API_KEY", ""),
-        tuple(trusted_onts),
-        tuple(term_onts),
-    )
+def _run_job(job_id: str, items: List[BatchItem], config: Dict[str, Any]):
+    """
+    Map `items` of a stored job with its stored config; each finished row is
+    written to the job store right away.
+    """
+    store = _job_store()
+    live_table = st.empty()
+    finished: Dict[int, Dict[str, Any]] = {}
 
+    def _save(i: int, item: BatchItem, out: Dict[str, Any]):
+        store.save_result(job_id, item.key, out)
+        # Finished rows are shown right away (in sheet order), not only after the whole batch
+        finished[i] = {"Term": item.term, "IRI": out["IRI"], "SKOS": out["SKOS"], "Status": status_label(out)}
+        live_table.dataframe(pd.DataFrame([finished[k] for k in sorted(finished)]), use_container_width=True)
 
-def _get_multi_agent(trusted_onts: List[str], term_onts: List[str]):
-    return _cached_multi_agent(
-        os.environ.get("OPENAI_API_KEY", ""),
-        os.environ.get("LANGSMITH_API_KEY", ""),
-        os.environ.get("BIOPORTAL_API_KEY", ""),
-        tuple(trusted_onts),
-        tuple(term_onts),
-    )
+    try:
+        _run_batch(items, config, on_result=_save)
+    finally:
+        store.finish_job(job_id)
 
 
 # ============================================================
@@ -288,6 +346,93 @@ elif len(endpoints) > 1:
 else:
     endpoint_to_run = None
 
+if endpoint_to_run == "Multiagent":
+    st.checkbox(
+        "Run BioPortal and Wikidata in parallel",
+        key="multiagent_parallel_input",
+        help="Both searches run at the same time. A trusted exact BioPortal match is taken immediately "
+             "(the Wikidata search is cancelled); otherwise the better SKOS class wins, BioPortal on ties.",
+    )
+
+mapping_engine = st.radio(
+    "Engine",
+    ENGINES,
+    horizontal=True,
+    key="mapping_engine_input",
+    help="Agent: deep-agent planning loop. Pipeline: fixed retrieve → define → SKOS-verify sequence "
+         "(LLM is only used for the SKOS classification). Retrieve-rank: all candidates are gathered "
+         "concurrently and ranked in a single LLM call.",
+)
+
+CACHE_LABELS = {
+    "use": "Use cached results",
+    "refresh": "Refresh (re-map and update cache)",
+    "bypass": "Bypass cache",
+}
+st.radio(
+    "Result cache",
+    CACHE_MODES,
+    format_func=CACHE_LABELS.get,
+    horizontal=True,
+    key="mapping_cache_mode_input",
+    help="Results are shared across sessions, keyed by normalized term, definition, endpoint, engine, "
+         "ontology lists, model and prompt version. Cached rows are marked '(cached)'.",
+)
+
+if mapping_engine == "Agent":
+    with st.expander("Agent cache"):
+        stats = cache_stats()
+        st.caption(
+            f"{stats['size']} of {stats['max_size']} agents compiled (shared by all sessions) · "
+            f"{stats['hits']} hits · {stats['builds']} builds · {stats['evictions']} evicted · "
+            f"process memory {stats['rss_mb']:.0f} MB"
+        )
+        if stats["entries"]:
+            st.dataframe(pd.DataFrame(stats["entries"]), hide_index=True, use_container_width=True)
+
+    with st.expander("Per-term agent budget"):
+        st.caption(
+            "A run stops when any limit is reached (0 = no limit). Limits are checked between agent steps, "
+            "so a slow LLM call can overshoot them. The best verified candidate so far is kept."
+        )
+        if st.button("Use recommended limits", key="budget_recommended_button"):
+            st.session_state["budget_llm_turns_input"] = RECOMMENDED_BUDGET.max_llm_turns
+            st.session_state["budget_tool_calls_input"] = RECOMMENDED_BUDGET.max_tool_calls
+            st.session_state["budget_tokens_input"] = 0
+            st.session_state["budget_seconds_input"] = int(RECOMMENDED_BUDGET.max_seconds)
+            st.session_state["budget_stop_on_exact_input"] = RECOMMENDED_BUDGET.stop_on_exact
+            st.rerun()
+        b1, b2 = st.columns(2)
+        with b1:
+            st.number_input("Max LLM turns", min_value=0, step=1, key="budget_llm_turns_input")
+            st.number_input("Max tokens", min_value=0, step=1000, key="budget_tokens_input")
+        with b2:
+            st.number_input("Max tool calls", min_value=0, step=1, key="budget_tool_calls_input")
+            st.number_input("Max seconds", min_value=0, step=10, key="budget_seconds_input")
+        st.checkbox("Stop as soon as an exact SKOS match is confirmed", key="budget_stop_on_exact_input")
+
+if multiple_terms:
+    with st.expander("Batch concurrency"):
+        st.caption("Terms are mapped in parallel; results keep the order of the uploaded sheet.")
+        c1, c2 = st.columns(2)
+        with c1:
+            st.number_input("Terms in parallel", min_value=1, max_value=32, step=1, key="batch_max_workers_input")
+        with c2:
+            st.number_input(
+                "Max parallel BioPortal terms",
+                min_value=0,
+                max_value=32,
+                step=1,
+                key="batch_bioportal_limit_input",
+                help="Also applies to Multiagent. Keeps the BioPortal API below its rate limit (0 = no extra limit).",
+            )
+        st.checkbox(
+            "Run in background worker",
+            key="batch_background_input",
+            help="Only submits the job; it is mapped by `python batch_worker.py` processes and survives "
+                 "reruns and closed browser tabs. Progress is shown under Batch jobs.",
+        )
+
 trusted_ontologies: List[str] = []
 term_ontologies: List[str] = []
 
@@ -298,13 +443,12 @@ term_ontologies: List[str] = []
 if endpoint_to_run in {"Bioportal", "Multiagent"}:
     st.subheader("BioPortal configuration")
 
-    bio_key = st.text_input(
+    st.text_input(
         "BIOPORTAL_API_KEY",
         type="password",
         key="bioportal_api_key_input",
         help="Stored only for this session.",
     )
-    os.environ["BIOPORTAL_API_KEY"] = (bio_key or "").strip()
 
     trusted_text = st.text_area(
         "trusted_ontologies (comma-separated)",
@@ -317,8 +461,8 @@ if endpoint_to_run in {"Bioportal", "Multiagent"}:
     trusted_ontologies = _parse_csv_list(trusted_text)
     term_ontologies = _parse_csv_list(term_text)
 
-    os.environ["BIOPORTAL_TRUSTED_ONTOLOGIES"] = trusted_text or ""
-    os.environ["BIOPORTAL_TERM_ONTOLOGIES"] = term_text or ""
+    # Widget values of this run (the context was set before the widgets existed)
+    set_credentials(credentials_from_session(st.session_state))
 
 st.divider()
 # ============================================================
@@ -336,72 +480,32 @@ if st.button("Run mapping", disabled=not run_single_enabled, use_container_width
         st.error("Provide a definition.")
         st.stop()
 
-    if endpoint_to_run == "Wikidata":
-        agent = _get_wiki_agent()
-        question = _question_wikidata(searched_term.strip(), term_definition.strip())
-        with st.spinner("Running Wikidata agent..."):
-            result = agent.invoke({"messages": [{"role": "user", "content": question}]})
-        raw = result["messages"][-1].content if isinstance(result, dict) and "messages" in result else str(result)
-        parsed = _parse_agent_json(raw)
-
-        # ✅ FIX: accept both formats (qid/skos/explanation OR ID/SKOS/SKOS_explanation)
-        qid = (parsed.get("qid") or parsed.get("ID") or parsed.get("id") or "").strip()
-        skos = (parsed.get("skos") or parsed.get("SKOS") or "").strip()
-        expl = (parsed.get("explanation") or parsed.get("SKOS_explanation") or parsed.get("skos_explanation") or "").strip()
-
-        if qid and qid != "No wiki match":
-            iri = _wikidata_url(qid) if (qid.startswith("Q") and qid[1:].isdigit()) else qid
-        else:
-            iri = "No wiki match"
-            skos, expl = "", ""
-
-    elif endpoint_to_run == "Bioportal":
-        if not os.environ.get("BIOPORTAL_API_KEY"):
-            st.error("BIOPORTAL_API_KEY is required for BioPortal.")
-            st.stop()
-        if not term_ontologies:
-            st.error("Please provide term_ontologies for BioPortal search.")
-            st.stop()
-
-        agent = _get_bio_agent(trusted_ontologies, term_ontologies)
-        question = _question_bioportal(searched_term.strip(), term_definition.strip(), term_ontologies, trusted_ontologies)
-        with st.spinner("Running BioPortal agent..."):
-            result = agent.invoke({"messages": [{"role": "user", "content": question}]})
-        raw = result["messages"][-1].content if isinstance(result, dict) and "messages" in result else str(result)
-        parsed = _parse_agent_json(raw)
-
-        iri = (parsed.get("qid") or "").strip()
-        skos = (parsed.get("skos") or "").strip()
-        expl = (parsed.get("explanation") or "").strip()
-
-        if not iri or iri == "No bioportal match":
-            iri = "No bioportal match"
-            skos, expl = "", ""
-
-    else:  # Multiagent
-        if not os.environ.get("BIOPORTAL_API_KEY"):
-            st.error("BIOPORTAL_API_KEY is required for Multiagent.")
+    if endpoint_to_run in {"Bioportal", "Multiagent"}:
+        if not current_credentials().bioportal_api_key:
+            st.error(f"BIOPORTAL_API_KEY is required for {endpoint_to_run}.")
             st.stop()
         if not term_ontologies:
-            st.error("Please provide term_ontologies for Multiagent.")
+            st.error(f"Please provide term_ontologies for {endpoint_to_run}.")
             st.stop()
 
-        agent = _get_multi_agent(trusted_ontologies, term_ontologies)
-        question = _question_multiagent(searched_term.strip(), term_definition.strip())
-        with st.spinner("Running Multiagent system..."):
-            result = agent.invoke({"messages": [{"role": "user", "content": question}]})
-
-        raw = result["messages"][-1].content if isinstance(result, dict) and "messages" in result else str(result)
-        parsed = _parse_agent_json(raw)
-
-        fields = _extract_multiagent_fields(parsed)
-        iri = fields["iri"]
-        skos = fields["skos"]
-        expl = fields["explanation"]
-
-        if not iri or iri.startswith("No "):
-            skos, expl = "", ""
+    with st.status(f"Running {endpoint_to_run} ({mapping_engine.lower()})...", expanded=True) as run_status:
+        out = _map_term(
+            endpoint_to_run,
+            mapping_engine,
+            searched_term.strip(),
+            term_definition.strip(),
+            trusted_ontologies,
+            term_ontologies,
+            on_event=lambda e: run_status.write(_event_line(e)),
+        )
+        run_status.update(
+            label=f"{endpoint_to_run} ({mapping_engine.lower()}) finished: {out.get('status', 'ok')}",
+            state="complete",
+            expanded=False,
+        )
+    iri, skos, expl = out["IRI"], out["SKOS"], out["explanation"]
 
+    st.session_state["mapping_status_out"] = status_label(out)
     st.session_state["mapping_iri_out"] = iri
     st.session_state["mapping_skos_out"] = skos
     st.session_state["mapping_expl_out"] = expl
@@ -411,6 +515,8 @@ st.write("**IRI:**", st.session_state.get("mapping_iri_out", "") or "—")
 st.write("**SKOS:**", st.session_state.get("mapping_skos_out", "") or "—")
 st.write("**Explanation:**")
 st.code(st.session_state.get("mapping_expl_out", "") or "—", language="text")
+if st.session_state.get("mapping_status_out", "") not in {"", "ok"}:
+    st.caption(f"Run status: {st.session_state['mapping_status_out']}")
 
 single_payload = {
     "endpoint": endpoint_to_run or "",
@@ -419,6 +525,7 @@ single_payload = {
     "iri": st.session_state.get("mapping_iri_out", ""),
     "skos": st.session_state.get("mapping_skos_out", ""),
     "explanation": st.session_state.get("mapping_expl_out", ""),
+    "status": st.session_state.get("mapping_status_out", ""),
 }
 st.download_button(
     "Download single-term result (.json)",
@@ -466,99 +573,109 @@ if st.button("Run batch mapping", disabled=not run_batch_enabled, use_container_
         st.stop()
 
     if endpoint_to_run in {"Bioportal", "Multiagent"}:
-        if not os.environ.get("BIOPORTAL_API_KEY"):
+        if not current_credentials().bioportal_api_key:
             st.error("BIOPORTAL_API_KEY is required for BioPortal / Multiagent.")
             st.stop()
         if not term_ontologies:
             st.error("Please provide term_ontologies for BioPortal / Multiagent.")
             st.stop()
 
-    if endpoint_to_run == "Wikidata":
-        agent = _get_wiki_agent()
-    elif endpoint_to_run == "Bioportal":
-        agent = _get_bio_agent(trusted_ontologies, term_ontologies)
-    else:
-        agent = _get_multi_agent(trusted_ontologies, term_ontologies)
+    items = [
+        BatchItem(term=term, definition=definition, endpoint=endpoint_to_run, engine=mapping_engine, key=str(uuid.uuid4()))
+        for term, definition in zip(input_df["Term"], input_df["Definition"])
+    ]
+
+    # Every finished row is checkpointed in the job store, so the job can be
+    # resumed from "Batch jobs" if the run is interrupted
+    store = _job_store()
+    background = bool(st.session_state.get("batch_background_input"))
+    job_config = _job_config(trusted_ontologies, term_ontologies)
+    job_id = store.create_job(
+        items,
+        endpoint_to_run,
+        mapping_engine,
+        config=job_config,
+        name=f"{getattr(uploaded_file, 'name', 'upload')} · {endpoint_to_run}",
+        status="queued" if background else "running",
+        mode="worker" if background else "inline",
+    )
+    st.session_state["mapping_job_id"] = job_id
 
-    results_rows = []
-    progress = st.progress(0)
-    status = st.empty()
-    total = len(input_df)
-
-    with st.spinner(f"Running {endpoint_to_run} agent for uploaded terms..."):
-        for i, row in enumerate(input_df.itertuples(index=False), start=1):
-            term = getattr(row, "Term")
-            definition = getattr(row, "Definition")
-
-            status.write(f"Processing {i}/{total}: **{term}**")
-            progress.progress(int((i / total) * 100))
-
-            if endpoint_to_run == "Wikidata":
-                question = _question_wikidata(term, definition)
-            elif endpoint_to_run == "Bioportal":
-                question = _question_bioportal(term, definition, term_ontologies, trusted_ontologies)
-            else:
-                question = _question_multiagent(term, definition)
-
-            try:
-                result = agent.invoke({"messages": [{"role": "user", "content": question}]})
-                raw = result["messages"][-1].content if isinstance(result, dict) and "messages" in result else str(result)
-            except Exception as e:
-                results_rows.append({
-                    "Term": term,
-                    "Definition": definition,
-                    "Endpoint": endpoint_to_run,
-                    "IRI": "",
-                    "SKOS": "",
-                    "explanation": f"ERROR: {e}",
-                })
-                continue
-
-            parsed = _parse_agent_json(raw)
-
-            if endpoint_to_run == "Wikidata":
-                qid = (parsed.get("qid") or "").strip()
-                skos = (parsed.get("skos") or "").strip()
-                expl = (parsed.get("explanation") or "").strip()
-
-                if qid and qid != "No wiki match":
-                    iri = _wikidata_url(qid)
-                else:
-                    iri, skos, expl = "No wiki match", "", ""
-
-            elif endpoint_to_run == "Bioportal":
-                iri = (parsed.get("qid") or "").strip()
-                skos = (parsed.get("skos") or "").strip()
-                expl = (parsed.get("explanation") or "").strip()
-
-                if not iri or iri == "No bioportal match":
-                    iri, skos, expl = "No bioportal match", "", ""
-
-            else:  # Multiagent
-                # ✅ FIX: Multiagent output produced by agentmapping_format → keys: ID, SKOS, SKOS_explanation
-                fields = _extract_multiagent_fields(parsed)
-                iri = fields["iri"]
-                skos = fields["skos"]
-                expl = fields["explanation"]
-
-                if not iri or iri.startswith("No "):
-                    skos, expl = "", ""
-
-            results_rows.append({
-                "Term": term,
-                "Definition": definition,
-                "Endpoint": endpoint_to_run,
-                "IRI": iri,
-                "SKOS": skos,
-                "explanation": expl,
-            })
-
-    df_out = pd.DataFrame(results_rows, columns=["Term", "Definition", "Endpoint", "IRI", "SKOS", "explanation"])
-    df_out = _ensure_batch_schema(df_out)
+    if background:
+        st.success(f"Job {job_id} submitted ({len(items)} rows). Start a worker with `python batch_worker.py` "
+                   "if none is running; progress is shown under Batch jobs.")
+    else:
+        with st.spinner(f"Running {endpoint_to_run} ({mapping_engine.lower()}) for uploaded terms..."):
+            _run_job(job_id, items, job_config)
 
     # Clear highlight (no "last reevaluation" yet)
     st.session_state["last_reeval_run_id"] = None
-    st.session_state["mapping_batch_df"] = df_out
+    _set_batch_df(ensure_batch_schema(store.rows_frame(job_id)))
+
+
+# ============================================================
+# Batch jobs (checkpointed in the job store)
+# ============================================================
+with st.expander("Batch jobs"):
+    store = _job_store()
+    jobs_df = store.list_jobs()
+    if len(jobs_df) == 0:
+        st.caption("No batch jobs yet.")
+    else:
+        st.dataframe(
+            jobs_df[["name", "status", "mode", "engine", "rows", "done", "errors", "running", "pending", "updated_at"]],
+            use_container_width=True,
+            hide_index=True,
+        )
+        job_labels = {
+            r.job_id: f"{r.name} ({r.created_at}) · {r.done}/{r.rows} done"
+            for r in jobs_df.itertuples(index=False)
+        }
+        selected_job = st.selectbox("Job", list(job_labels), format_func=job_labels.get, key="mapping_job_select")
+        selected = jobs_df.loc[jobs_df["job_id"] == selected_job].iloc[0]
+        in_worker = selected["mode"] == "worker" and selected["status"] in {"queued", "running"}
+        if in_worker:
+            st.progress(int(selected["done"] + selected["errors"]) / max(int(selected["rows"]), 1))
+            w1, w2 = st.columns(2)
+            with w1:
+                if st.button("Refresh", use_container_width=True):
+                    st.rerun()
+            with w2:
+                if st.button("Cancel job", use_container_width=True):
+                    # Workers finish the rows they already claimed
+                    store.set_job_status(selected_job, "cancelled")
+                    st.rerun()
+
+        j1, j2, j3 = st.columns(3)
+        with j1:
+            if st.button("Load results", use_container_width=True):
+                st.session_state["mapping_job_id"] = selected_job
+                st.session_state["last_reeval_run_id"] = None
+                _set_batch_df(ensure_batch_schema(store.rows_frame(selected_job)))
+                st.rerun()
+        with j2:
+            resume_items = [] if in_worker else store.pending_items(selected_job)
+            if st.button(f"Resume ({len(resume_items)} left)", disabled=not resume_items, use_container_width=True):
+                job = store.get_job(selected_job)
+                if job["mode"] == "worker" or st.session_state.get("batch_background_input"):
+                    store.requeue_job(selected_job)
+                    st.rerun()
+                if job["endpoint"] in {"Bioportal", "Multiagent"} and not current_credentials().bioportal_api_key:
+                    st.error("BIOPORTAL_API_KEY is required to resume a BioPortal / Multiagent job.")
+                    st.stop()
+                store.set_job_status(selected_job, "running")
+                # same budget, concurrency, cache mode and agents as the original run
+                _run_job(selected_job, resume_items, job["config"])
+                st.session_state["mapping_job_id"] = selected_job
+                st.session_state["last_reeval_run_id"] = None
+                _set_batch_df(ensure_batch_schema(store.rows_frame(selected_job)))
+                st.rerun()
+        with j3:
+            if st.button("Delete job", use_container_width=True):
+                store.delete_job(selected_job)
+                if st.session_state.get("mapping_job_id") == selected_job:
+                    st.session_state["mapping_job_id"] = None
+                st.rerun()
 
 
 # ============================================================
@@ -566,54 +683,122 @@ if st.button("Run batch mapping", disabled=not run_batch_enabled, use_container_
 # ============================================================
 batch_df = st.session_state.get("mapping_batch_df")
 if isinstance(batch_df, pd.DataFrame) and len(batch_df) > 0:
-    batch_df = _ensure_batch_schema(batch_df)
+    batch_df = ensure_batch_schema(batch_df)
     st.session_state["mapping_batch_df"] = batch_df
 
     st.subheader("Batch results")
 
+    # --- Filters (applied here, only the current page is sent to the browser) ---
+    f1, f2, f3 = st.columns([2, 2, 1])
+    with f1:
+        skos_filter = st.multiselect("SKOS", ["exact", "close", "related", "none"], key="batch_filter_skos")
+    with f2:
+        endpoint_filter = st.multiselect(
+            "Endpoint", sorted(batch_df["Endpoint"].astype(str).unique()), key="batch_filter_endpoint"
+        )
+    with f3:
+        only_no_match = st.checkbox("No match only", key="batch_filter_no_match")
+    term_filter = st.text_input("Term contains", key="batch_filter_term")
+
+    view = filter_batch(batch_df, skos_filter, endpoint_filter, only_no_match, term_filter)
+
+    p1, p2, p3 = st.columns([1, 1, 2])
+    with p1:
+        page_size = st.selectbox("Rows per page", [25, 50, 100, 250], key="batch_page_size")
+    n_pages = max(1, -(-len(view) // page_size))
+    # A narrower filter can leave the stored page out of range
+    if st.session_state["batch_page"] > n_pages:
+        st.session_state["batch_page"] = n_pages
+    with p2:
+        page = st.number_input("Page", min_value=1, max_value=n_pages, step=1, key="batch_page")
+    with p3:
+        st.caption(f"{len(view)} of {len(batch_df)} rows match · page {page}/{n_pages}")
+    page_df = view.iloc[(page - 1) * page_size: page * page_size]
+
     # Highlight only rows updated in the last re-evaluation run
     last_run_id = st.session_state.get("last_reeval_run_id") or ""
+    highlighted = set(page_df.index[page_df["last_updated_run"].astype(str) == str(last_run_id)]) if last_run_id else set()
 
     def _highlight_last_run(row):
-        if last_run_id and str(row.get("last_updated_run", "")) == str(last_run_id):
+        if row.name in highlighted:
             return ["background-color: #fff59d"] * len(row)
         return [""] * len(row)
 
-    display_cols = ["Term", "IRI", "SKOS", "explanation"]
+    display_cols = ["Term", "IRI", "SKOS", "explanation", "Status"]
     # If a term was changed, show OriginalTerm too
-    show_original = any(batch_df["OriginalTerm"].astype(str) != batch_df["Term"].astype(str))
+    show_original = bool((batch_df["OriginalTerm"].astype(str) != batch_df["Term"].astype(str)).any())
     if show_original:
         display_cols = ["OriginalTerm"] + display_cols
 
     st.dataframe(
-        batch_df[display_cols].style.apply(_highlight_last_run, axis=1),
+        page_df[display_cols].style.apply(_highlight_last_run, axis=1),
         use_container_width=True,
+        hide_index=True,
     )
 
     st.subheader("Re-evaluate selected terms")
-
-    selected_rowids: List[str] = []
-    for _, r in batch_df.iterrows():
-        label = f"{r['Term']}"
-        if st.checkbox(label, key=f"recheck_{r['RowID']}"):
-            selected_rowids.append(r["RowID"])
-
-    if selected_rowids:
-        st.markdown("**Optional:** Provide a new term for re-evaluation (leave unchanged to re-run the same term).")
-    new_term_by_rowid: Dict[str, str] = {}
-    for rowid in selected_rowids:
-        current_term = str(batch_df.loc[batch_df["RowID"] == rowid, "Term"].iloc[0])
-        new_term_by_rowid[rowid] = st.text_input(
-            f"New term for: {current_term}",
-            value=current_term,
-            key=f"new_term_{rowid}",
-        )
+    st.caption("Tick rows on any page (the selection is kept while paging and filtering). "
+               "Optionally type a new term to re-run the row with it.")
+
+    # {RowID: new term}, kept across pages and reruns
+    selection: Dict[str, str] = st.session_state["reeval_selection"]
+    # Rows removed from the batch (a new job was loaded) drop out of the selection
+    for rowid in [r for r in selection if r not in batch_df.index]:
+        selection.pop(rowid)
+
+    editor_df = pd.DataFrame(
+        {
+            "Re-evaluate": [rowid in selection for rowid in page_df.index],
+            "New term": [selection.get(rowid, term) for rowid, term in zip(page_df.index, page_df["Term"].astype(str))],
+            "Term": page_df["Term"].astype(str).to_numpy(),
+            "IRI": page_df["IRI"].astype(str).to_numpy(),
+            "SKOS": page_df["SKOS"].astype(str).to_numpy(),
+            "Endpoint": page_df["Endpoint"].astype(str).to_numpy(),
+        },
+        index=page_df.index,
+    )
+    edited = st.data_editor(
+        editor_df,
+        # New key per page / filter / selection reset, so stale edits are not replayed
+        key=f"reeval_editor_{st.session_state['reeval_editor_nonce']}_{page}_{page_size}_"
+            f"{hash((tuple(skos_filter), tuple(endpoint_filter), only_no_match, term_filter))}",
+        use_container_width=True,
+        hide_index=True,
+        disabled=["Term", "IRI", "SKOS", "Endpoint"],
+        column_config={
+            "Re-evaluate": st.column_config.CheckboxColumn(width="small"),
+            "New term": st.column_config.TextColumn(help="Leave unchanged to re-run the same term"),
+        },
+    )
+    for rowid, tick, new_term in zip(edited.index, edited["Re-evaluate"], edited["New term"]):
+        if tick:
+            selection[rowid] = (str(new_term or "").strip()) or str(batch_df.at[rowid, "Term"])
+        else:
+            selection.pop(rowid, None)
+
+    s1, s2, s3 = st.columns([1, 1, 2])
+    with s1:
+        if st.button("Select all matching", use_container_width=True):
+            for rowid, term in zip(view.index, view["Term"].astype(str)):
+                selection.setdefault(rowid, term)
+            st.session_state["reeval_editor_nonce"] += 1
+            st.rerun()
+    with s2:
+        if st.button("Clear selection", disabled=not selection, use_container_width=True):
+            selection.clear()
+            st.session_state["reeval_editor_nonce"] += 1
+            st.rerun()
+    with s3:
+        st.caption(f"{len(selection)} row(s) selected")
+
+    selected_rowids: List[str] = list(selection)
+    new_term_by_rowid: Dict[str, str] = dict(selection)
 
     if st.button("Re-evaluate selected", disabled=(len(selected_rowids) == 0), use_container_width=True):
         # Validate BioPortal config if needed for any selected rows
-        endpoints_needed = set(batch_df.loc[batch_df["RowID"].isin(selected_rowids), "Endpoint"].astype(str).tolist())
+        endpoints_needed = set(batch_df.loc[selected_rowids, "Endpoint"].astype(str))
         if ("Bioportal" in endpoints_needed) or ("Multiagent" in endpoints_needed):
-            if not os.environ.get("BIOPORTAL_API_KEY"):
+            if not current_credentials().bioportal_api_key:
                 st.error("BIOPORTAL_API_KEY is required for BioPortal / Multiagent re-evaluation.")
                 st.stop()
             trusted_ontologies = _parse_csv_list(st.session_state.get("trusted_ontologies_input", ""))
@@ -625,94 +810,42 @@ if isinstance(batch_df, pd.DataFrame) and len(batch_df) > 0:
         run_id = str(uuid.uuid4())
         st.session_state["last_reeval_run_id"] = run_id
 
-        progress = st.progress(0)
-        status = st.empty()
-        total = len(selected_rowids)
-
-        for i, rowid in enumerate(selected_rowids, start=1):
-            row = batch_df.loc[batch_df["RowID"] == rowid].iloc[0]
-            endpoint = str(row["Endpoint"])
-            definition = str(row["Definition"])
-            new_term = (new_term_by_rowid.get(rowid) or "").strip() or str(row["Term"])
-
-            status.write(f"Re-evaluating {i}/{total}: **{new_term}** ({endpoint})")
-            progress.progress(int((i / total) * 100))
-
-            if endpoint == "Wikidata":
-                agent = _get_wiki_agent()
-                question = _question_wikidata(new_term, definition)
-
-            elif endpoint == "Bioportal":
-                trusted_ontologies = _parse_csv_list(st.session_state.get("trusted_ontologies_input", ""))
-                term_ontologies = _parse_csv_list(st.session_state.get("term_ontologies_input", ""))
-                agent = _get_bio_agent(trusted_ontologies, term_ontologies)
-                question = _question_bioportal(new_term, definition, term_ontologies, trusted_ontologies)
-
-            else:  # Multiagent
-                trusted_ontologies = _parse_csv_list(st.session_state.get("trusted_ontologies_input", ""))
-                term_ontologies = _parse_csv_list(st.session_state.get("term_ontologies_input", ""))
-                agent = _get_multi_agent(trusted_ontologies, term_ontologies)
-                question = _question_multiagent(new_term, definition)
-
-            result = agent.invoke({"messages": [{"role": "user", "content": question}]})
-            raw = result["messages"][-1].content if isinstance(result, dict) and "messages" in result else str(result)
-            parsed = _parse_agent_json(raw)
-
-            if endpoint == "Wikidata":
-                qid = (parsed.get("qid") or "").strip()
-                skos = (parsed.get("skos") or "").strip()
-                expl = (parsed.get("explanation") or "").strip()
-
-                if qid and qid != "No wiki match":
-                    iri = _wikidata_url(qid)
-                else:
-                    iri, skos, expl = "No wiki match", "", ""
-
-            elif endpoint == "Bioportal":
-                iri = (parsed.get("qid") or "").strip()
-                skos = (parsed.get("skos") or "").strip()
-                expl = (parsed.get("explanation") or "").strip()
-
-                if not iri or iri == "No bioportal match":
-                    iri, skos, expl = "No bioportal match", "", ""
-
-            else:  # Multiagent
-                # ✅ FIX: Multiagent output produced by agentmapping_format → keys: ID, SKOS, SKOS_explanation
-                fields = _extract_multiagent_fields(parsed)
-                iri = fields["iri"]
-                skos = fields["skos"]
-                expl = fields["explanation"]
-
-                if not iri or iri.startswith("No "):
-                    skos, expl = "", ""
-
-            # Update term (and preserve OriginalTerm)
-            idx = batch_df.index[batch_df["RowID"] == rowid][0]
-            if not batch_df.loc[idx, "OriginalTerm"]:
-                batch_df.loc[idx, "OriginalTerm"] = batch_df.loc[idx, "Term"]
-            if batch_df.loc[idx, "OriginalTerm"] == batch_df.loc[idx, "Term"] and new_term != batch_df.loc[idx, "Term"]:
-                batch_df.loc[idx, "OriginalTerm"] = batch_df.loc[idx, "Term"]
-
-            batch_df.loc[idx, "Term"] = new_term
-            batch_df.loc[idx, "IRI"] = iri
-            batch_df.loc[idx, "SKOS"] = skos
-            batch_df.loc[idx, "explanation"] = expl
-            batch_df.loc[idx, "last_updated_run"] = run_id
-
-        status.write("✅ Re-evaluation complete. Updated rows are highlighted (only for this last run).")
-        st.session_state["mapping_batch_df"] = batch_df
+        selected = batch_df.loc[selected_rowids, ["Term", "Definition", "Endpoint", "Engine"]]
+        items = [
+            BatchItem(
+                term=(new_term_by_rowid.get(rowid) or "").strip() or str(term),
+                definition=str(definition),
+                endpoint=str(endpoint),
+                engine=str(engine or "Agent"),
+                key=rowid,
+            )
+            for rowid, term, definition, endpoint, engine in selected.itertuples(name=None)
+        ]
+
+        job_id = st.session_state.get("mapping_job_id")
+
+        def _checkpoint(i: int, item: BatchItem, out: Dict[str, Any]):
+            # Stored per row as it finishes, like a batch run
+            if job_id:
+                _job_store().save_result(job_id, item.key, out, term=item.term, run_id=run_id)
+
+        trusted_ontologies = _parse_csv_list(st.session_state.get("trusted_ontologies_input", ""))
+        term_ontologies = _parse_csv_list(st.session_state.get("term_ontologies_input", ""))
+        config = reeval_config(_job_config(trusted_ontologies, term_ontologies))
+        outs = _run_batch(items, config, on_result=_checkpoint)
+        batch_df = apply_reeval(batch_df, items, outs, run_id)
+        selection.clear()
+        st.session_state["reeval_editor_nonce"] += 1
+
+        st.write("✅ Re-evaluation complete. Updated rows are highlighted (only for this last run).")
+        _set_batch_df(batch_df)
         st.rerun()
 
-    # Batch download (requested 4 columns)
-    output = BytesIO()
-    export_df = batch_df[["Term", "IRI", "SKOS", "explanation"]].copy()
-    with pd.ExcelWriter(output, engine="openpyxl") as writer:
-        export_df.to_excel(writer, index=False, sheet_name="mapping")
-    output.seek(0)
-
+    # Batch download (requested 4 columns + run status); the workbook is only
+    # rebuilt when the results change, not on every rerun
     st.download_button(
         label="Download batch mapping results (.xlsx)",
-        data=output,
+        data=_batch_export(st.session_state["mapping_batch_version"], batch_df),
         file_name="batch_mapping_results.xlsx",
         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         use_container_width=True,
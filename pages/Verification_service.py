@@ -8,76 +8,196 @@ Created on Mon Dec 22 00:04:44 2025
 import streamlit as st
 
 from general_tools.skos_tools import classify_skos_match  # adjust if your path differs
+from general_tools.credentials import credentials_from_session, set_credentials
+from general_tools.result_cache import CACHE_MODES, get_verdict_cache
+from general_tools.bulk_verification import (
+    VERIFY_COLUMNS,
+    read_verification_table,
+    verify_table,
+    summarize,
+    export_xlsx,
+)
 
 
 st.set_page_config(page_title="Verification service", layout="centered")
 st.title("Verification service")
 
+# OpenAI key of this session (see Home.py)
+set_credentials(credentials_from_session(st.session_state))
+
 # Back button
 if st.button("← Back to Home"):
     st.switch_page("Home.py")
 
 st.divider()
 
-# ---- Inputs (5 fields) ----
-term = st.text_input("Term")
-term_def = st.text_area("Term Definition")
-
-label = st.text_input("Label")
-label_def = st.text_area("Label Definition")
 
-provided_skos = st.selectbox(
-    "Term–Label SKOS class (provided)",
-    options=["exact", "close", "related", "none"],
-    index=0,
-)
+@st.cache_resource
+def _verdict_cache():
+    return get_verdict_cache()
+
+
+def _single_pair():
+    # ---- Inputs (5 fields) ----
+    term = st.text_input("Term")
+    term_def = st.text_area("Term Definition")
+
+    label = st.text_input("Label")
+    label_def = st.text_area("Label Definition")
+
+    provided_skos = st.selectbox(
+        "Term–Label SKOS class (provided)",
+        options=["exact", "close", "related", "none"],
+        index=0,
+    )
+
+    st.divider()
+
+    # ---- Result (one field) ----
+    st.subheader("Result")
+
+    if st.button("Verify SKOS match", use_container_width=True):
+        # Basic guards
+        if not term.strip():
+            st.error("Please provide Term.")
+            st.stop()
+        if not term_def.strip():
+            st.error("Please provide Term Definition.")
+            st.stop()
+        if not label.strip():
+            st.error("Please provide Label.")
+            st.stop()
+        if not label_def.strip():
+            st.error("Please provide Label Definition.")
+            st.stop()
+
+        try:
+            out = classify_skos_match(
+                term_a=term.strip(),
+                gen_def=term_def.strip(),
+                term_b=label.strip(),
+                onto_def=label_def.strip(),
+            )
+        except Exception as e:
+            st.error(f"Verification failed: {e}")
+            st.stop()
+
+        predicted = (out.get("mapping_type") or "").strip().lower()
+        explanation = (out.get("explanation") or "").strip()
+        provided = (provided_skos or "").strip().lower()
+
+        if predicted == provided:
+            st.success(f"✅ The provided SKOS class is correct: **{provided}**")
+        else:
+            # If mismatch, show predicted + reasoning
+            msg = (
+                f"⚠️ Provided SKOS class: **{provided}**\n\n"
+                f"Predicted SKOS class (from classify_skos_match): **{predicted or 'unknown'}**\n\n"
+                f"Explanation:\n{explanation or '—'}"
+            )
+            st.warning(msg)
 
-st.divider()
+    else:
+        st.info("Fill the fields above and click **Verify SKOS match** to validate the provided SKOS class.")
 
-# ---- Result (one field) ----
-st.subheader("Result")
-
-if st.button("Verify SKOS match", use_container_width=True):
-    # Basic guards
-    if not term.strip():
-        st.error("Please provide Term.")
-        st.stop()
-    if not term_def.strip():
-        st.error("Please provide Term Definition.")
-        st.stop()
-    if not label.strip():
-        st.error("Please provide Label.")
-        st.stop()
-    if not label_def.strip():
-        st.error("Please provide Label Definition.")
-        st.stop()
-
-    try:
-        out = classify_skos_match(
-            term_a=term.strip(),
-            gen_def=term_def.strip(),
-            term_b=label.strip(),
-            onto_def=label_def.strip(),
-        )
-    except Exception as e:
-        st.error(f"Verification failed: {e}")
-        st.stop()
 
-    predicted = (out.get("mapping_type") or "").strip().lower()
-    explanation = (out.get("explanation") or "").strip()
-    provided = (provided_skos or "").strip().lower()
+def _bulk_upload():
+    uploaded = st.file_uploader(
+        "Upload mapping table (.xlsx or .csv with columns: " + ", ".join(VERIFY_COLUMNS) + ")",
+        type=["xlsx", "csv"],
+        key="verification_upload",
+    )
 
-    if predicted == provided:
-        st.success(f"✅ The provided SKOS class is correct: **{provided}**")
-    else:
-        # If mismatch, show predicted + reasoning
-        msg = (
-            f"⚠️ Provided SKOS class: **{provided}**\n\n"
-            f"Predicted SKOS class (from classify_skos_match): **{predicted or 'unknown'}**\n\n"
-            f"Explanation:\n{explanation or '—'}"
+    col1, col2 = st.columns(2)
+    with col1:
+        max_concurrency = st.number_input(
+            "Parallel verifications", min_value=1, max_value=32, value=8, step=1,
+            key="verification_concurrency_input",
+        )
+    with col2:
+        cache_mode = st.radio(
+            "Verdict cache",
+            CACHE_MODES,
+            format_func={"use": "Use cached verdicts", "refresh": "Re-verify and update", "bypass": "Bypass"}.get,
+            key="verification_cache_mode_input",
+            help="Verdicts are shared across sessions, keyed by the normalized term / label pair, model and "
+                 "classifier prompt version.",
         )
-        st.warning(msg)
 
-else:
-    st.info("Fill the fields above and click **Verify SKOS match** to validate the provided SKOS class.")
+    if uploaded is not None:
+        try:
+            table = read_verification_table(uploaded)
+        except Exception as e:
+            st.error(f"Could not read the file: {e}")
+            st.stop()
+        st.caption(f"{len(table)} row(s) with Term and Label")
+        st.dataframe(table.head(20), use_container_width=True)
+
+        if st.button("Verify all rows", use_container_width=True, disabled=len(table) == 0):
+            progress = st.progress(0)
+            status = st.empty()
+
+            def _tick(done: int, total: int):
+                progress.progress(done / total if total else 1.0)
+                status.write(f"Verified {done}/{total} unique pair(s)")
+
+            try:
+                result = verify_table(
+                    table,
+                    max_concurrency=int(max_concurrency),
+                    cache=_verdict_cache(),
+                    cache_mode=cache_mode,
+                    on_progress=_tick,
+                )
+            except Exception as e:
+                st.error(f"Verification failed: {e}")
+                st.stop()
+            st.session_state["verification_bulk_df"] = result
+            st.session_state["verification_bulk_name"] = getattr(uploaded, "name", "upload")
+
+    result = st.session_state.get("verification_bulk_df")
+    if result is None:
+        st.info("Upload a mapping table and click **Verify all rows**.")
+        return
+
+    stats = summarize(result)
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Rows", stats["rows"])
+    c2.metric("Agree", stats["agree"])
+    c3.metric("Disagree", stats["disagree"])
+    c4.metric("Errors", stats["error"])
+    rate = stats["agreement_rate"]
+    st.caption(
+        (f"Agreement rate: {rate:.1%} · " if rate is not None else "")
+        + f"{stats['cached']} row(s) served from the verdict cache"
+    )
+
+    only_disagreements = st.checkbox("Show disagreements / errors only", key="verification_only_disagree")
+    shown = result[result["Agreement"] != "agree"] if only_disagreements else result
+    st.dataframe(shown, use_container_width=True)
+
+    stem = str(st.session_state.get("verification_bulk_name", "upload")).rsplit(".", 1)[0]
+    d1, d2 = st.columns(2)
+    d1.download_button(
+        label="Download results (.xlsx)",
+        data=export_xlsx(result),
+        file_name=f"{stem}_verification.xlsx",
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        use_container_width=True,
+    )
+    d2.download_button(
+        label="Download results (.csv)",
+        data=result.to_csv(index=False).encode("utf-8"),
+        file_name=f"{stem}_verification.csv",
+        mime="text/csv",
+        use_container_width=True,
+    )
+
+
+mode = st.radio("Mode", ["Single pair", "Bulk upload"], horizontal=True, key="verification_mode_input")
+st.divider()
 
+if mode == "Single pair":
+    _single_pair()
+else:
+    _bulk_upload()
@@ -0,0 +1,112 @@
+import json
+
+from langchain_core.messages import AIMessage, ToolMessage
+
+from general_tools.agent_budget import AgentBudget, RECOMMENDED_BUDGET, run_agent_with_budget
+
+
+def _ai(*tool_names, tokens=10):
+    calls = [{"name": name, "args": {}, "id": f"call_{i}"} for i, name in enumerate(tool_names)]
+    return AIMessage(content="", tool_calls=calls,
+                     usage_metadata={"input_tokens": tokens, "output_tokens": 0, "total_tokens": tokens})
+
+
+def _tool(name, output):
+    return ToolMessage(content=json.dumps(output), name=name, tool_call_id="call_0")
+
+
+def _update(msg):
+    return ((), "updates", {"node": {"messages": [msg]}})
+
+
+class FakeAgent:
+    """Replays stream items and records how many were consumed."""
+
+    def __init__(self, items):
+        self.items = items
+        self.consumed = 0
+        self.closed = False
+
+    def stream(self, inputs, stream_mode=None, subgraphs=False):
+        try:
+            for item in self.items:
+                self.consumed += 1
+                yield item
+        finally:
+            self.closed = True
+
+
+# search -> details -> classify (close) -> details -> classify (exact) -> final answer
+TRAJECTORY = [
+    _update(_ai("WikidataEntityDetails")),
+    _update(_tool("WikidataEntityDetails", {"id": "Q1"})),
+    _update(_ai("classify_skos_match")),
+    _update(_tool("classify_skos_match", {"mapping_type": "close", "explanation": "near"})),
+    _update(_ai("WikidataEntityDetails")),
+    _update(_tool("WikidataEntityDetails", {"id": "Q2"})),
+    _update(_ai("classify_skos_match")),
+    _update(_tool("classify_skos_match", {"mapping_type": "exact", "explanation": "same"})),
+    _update(_ai()),
+    ((), "values", {"messages": ["final"]}),
+]
+
+
+def test_default_budget_limits_nothing():
+    budget = AgentBudget()
+    assert (budget.max_llm_turns, budget.max_tool_calls, budget.max_tokens, budget.max_seconds) == (None,) * 4
+    assert budget.stop_on_exact is False
+
+
+def test_without_budget_the_run_completes():
+    agent = FakeAgent(TRAJECTORY)
+    run = run_agent_with_budget(agent, {})
+    assert run["status"] == "ok"
+    assert run["final_state"] == {"messages": ["final"]}
+    assert agent.consumed == len(TRAJECTORY)
+    assert run["stats"]["llm_turns"] == 5
+    assert run["stats"]["tool_calls"] == 4
+    assert run["stats"]["tokens"] == 50
+
+
+def test_stop_on_exact_exits_early_with_the_candidate():
+    agent = FakeAgent(TRAJECTORY)
+    run = run_agent_with_budget(agent, {}, budget=AgentBudget(stop_on_exact=True))
+    assert run["status"] == "early_exit"
+    assert run["final_state"] is None
+    assert run["candidate"] == {"id": "Q2", "skos": "exact", "explanation": "same"}
+    assert agent.closed
+
+
+def test_tool_call_limit_keeps_best_candidate_so_far():
+    events = []
+    agent = FakeAgent(TRAJECTORY)
+    run = run_agent_with_budget(agent, {}, budget=AgentBudget(max_tool_calls=3), on_event=events.append)
+    assert run["status"] == "budget_exhausted:tool_calls"
+    assert run["candidate"] == {"id": "Q1", "skos": "close", "explanation": "near"}
+    assert events[-1]["type"] == "budget_exhausted"
+    # checked between steps: stops right after the step that reached the limit
+    assert agent.consumed == 5
+
+
+def test_token_limit():
+    run = run_agent_with_budget(FakeAgent(TRAJECTORY), {}, budget=AgentBudget(max_tokens=20))
+    assert run["status"] == "budget_exhausted:tokens"
+
+
+def test_recommended_budget():
+    assert RECOMMENDED_BUDGET == AgentBudget(max_llm_turns=20, max_tool_calls=30, max_seconds=180.0, stop_on_exact=True)
+
+
+def test_failed_tool_calls_are_reported():
+    failed = ToolMessage(content="HTTPError: 503", name="WikidataEntityDetails", tool_call_id="call_0", status="error")
+    items = [
+        _update(_ai("WikidataEntityDetails")),
+        _update(failed),
+        _update(_ai("classify_skos_match")),
+        _update(_tool("classify_skos_match", {"mapping_type": "none", "explanation": "ERROR: rate limited"})),
+    ] + TRAJECTORY
+    run = run_agent_with_budget(FakeAgent(items), {})
+    assert run["status"] == "ok"
+    assert run["errors"] == ["WikidataEntityDetails failed: HTTPError: 503",
+                             "SKOS classification of ? failed: rate limited"]
+    assert run_agent_with_budget(FakeAgent(TRAJECTORY), {})["errors"] == []
@@ -0,0 +1,93 @@
+import sys
+import threading
+import time
+
+import pytest
+
+from benchmarks.import_profile import HEAVY_MODULES, PAGE_MODULES, profile_module
+from general_tools import agent_cache, batch_engine
+from general_tools.credentials import Credentials, current_credentials
+
+
+@pytest.fixture
+def builds(monkeypatch):
+    """Replaces the real agent build; records (endpoint, parallel, openai key) per build."""
+    calls = []
+
+    def fake_build(endpoint, parallel_multiagent=False):
+        calls.append((endpoint, parallel_multiagent, current_credentials().openai_api_key))
+        time.sleep(0.05)
+        return object()
+
+    monkeypatch.setattr(batch_engine, "build_agent", fake_build)
+    monkeypatch.delenv("MAPPING_AGENT_CACHE_SIZE", raising=False)
+    agent_cache.clear()
+    yield calls
+    agent_cache.clear()
+
+
+def test_concurrent_callers_share_one_build(builds):
+    agents = []
+    threads = [threading.Thread(target=lambda: agents.append(agent_cache.get_agent("Wikidata"))) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(builds) == 1
+    assert len({id(a) for a in agents}) == 1
+    assert agent_cache.is_ready("Wikidata")
+    assert agent_cache.cache_stats()["entries"][0]["uses"] == 6
+
+
+def test_parallel_flag_only_matters_for_the_multiagent(builds):
+    assert agent_cache.get_agent("Wikidata", parallel_multiagent=True) is agent_cache.get_agent("Wikidata")
+    assert agent_cache.get_agent("Multiagent", parallel_multiagent=True) is not agent_cache.get_agent("Multiagent")
+    assert [b[:2] for b in builds] == [("Wikidata", False), ("Multiagent", True), ("Multiagent", False)]
+
+
+def test_least_recently_used_agent_is_dropped(builds, monkeypatch):
+    monkeypatch.setenv("MAPPING_AGENT_CACHE_SIZE", "2")
+    evictions = agent_cache.cache_stats()["evictions"]
+    wiki = agent_cache.get_agent("Wikidata")
+    agent_cache.get_agent("Bioportal")
+    agent_cache.get_agent("Wikidata")
+    agent_cache.get_agent("Multiagent")
+    assert not agent_cache.is_ready("Bioportal")
+    assert agent_cache.get_agent("Wikidata") is wiki
+    stats = agent_cache.cache_stats()
+    assert len(builds) == 3
+    assert (stats["size"], stats["max_size"], stats["evictions"] - evictions) == (2, 2, 1)
+
+
+def test_failed_build_is_counted_and_retried(builds, monkeypatch):
+    def broken(endpoint, parallel_multiagent=False):
+        raise RuntimeError("no key")
+
+    monkeypatch.setattr(batch_engine, "build_agent", broken)
+    before = agent_cache.cache_stats()["build_errors"]
+    with pytest.raises(RuntimeError):
+        agent_cache.get_agent("Wikidata")
+    assert agent_cache.cache_stats()["build_errors"] == before + 1
+    assert not agent_cache.is_ready("Wikidata")
+
+
+def test_warmup_runs_once_with_the_given_credentials(builds, monkeypatch):
+    monkeypatch.setattr("general_tools.training_examples.training_examples", lambda: None)
+    assert not agent_cache.start_warmup(Credentials())
+    assert agent_cache.start_warmup(Credentials(openai_api_key="sk-warm"))
+    assert not agent_cache.start_warmup(Credentials(openai_api_key="sk-warm"))
+    for _ in range(100):
+        if agent_cache.is_ready("Wikidata"):
+            break
+        time.sleep(0.02)
+    assert builds == [("Wikidata", False, "sk-warm")]
+    assert not agent_cache.start_warmup(Credentials(openai_api_key="sk-warm"))
+
+
+@pytest.mark.parametrize("module", ["general_tools.credentials", "general_tools.agent_cache"])
+def test_page_modules_do_not_import_the_agent_libraries(module):
+    assert module in PAGE_MODULES
+    result = profile_module(module, python=sys.executable)
+    assert result["ok"], result["error"]
+    assert result["heavy_imported"] == ""
+    assert "deepagents" in HEAVY_MODULES
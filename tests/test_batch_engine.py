@@ -0,0 +1,115 @@
+import threading
+import time
+
+import pytest
+
+from general_tools import batch_engine
+from general_tools.batch_engine import BatchItem, BatchRunner
+
+
+class FakeMapper:
+    """Stands in for map_term; records how many terms per endpoint run at once."""
+
+    def __init__(self, seconds=0.05, fail=()):
+        self.seconds = seconds
+        self.fail = set(fail)
+        self.lock = threading.Lock()
+        self.running = {}
+        self.peak = {}
+        self.started = []
+
+    def __call__(self, endpoint, term, definition, **kwargs):
+        with self.lock:
+            self.started.append(term)
+            self.running[endpoint] = self.running.get(endpoint, 0) + 1
+            self.peak[endpoint] = max(self.peak.get(endpoint, 0), self.running[endpoint])
+        try:
+            time.sleep(self.seconds)
+            if term in self.fail:
+                raise RuntimeError(f"{term} failed")
+            return {"IRI": f"iri:{term}", "SKOS": "exact", "explanation": ""}
+        finally:
+            with self.lock:
+                self.running[endpoint] -= 1
+
+
+@pytest.fixture
+def mapper(monkeypatch):
+    fake = FakeMapper()
+    monkeypatch.setattr(batch_engine, "map_term", fake)
+    return fake
+
+
+def _items(*specs):
+    return [BatchItem(term=term, definition="", endpoint=endpoint, engine="Pipeline") for endpoint, term in specs]
+
+
+def test_results_keep_input_order_and_errors_stay_per_row(mapper):
+    mapper.fail = {"b"}
+    items = _items(("Wikidata", "a"), ("Wikidata", "b"), ("Wikidata", "c"))
+    rows = BatchRunner(max_workers=3, poll_interval=0.01).run(items)
+    assert [r["IRI"] for r in rows] == ["iri:a", "", "iri:c"]
+    assert [r["status"] for r in rows] == ["ok", "error", "ok"]
+    assert "b failed" in rows[1]["explanation"]
+
+
+def test_endpoint_limit_holds_back_only_that_endpoint(mapper):
+    items = _items(("Bioportal", "b1"), ("Bioportal", "b2"), ("Bioportal", "b3"),
+                   ("Wikidata", "w1"), ("Wikidata", "w2"))
+    runner = BatchRunner(max_workers=3, endpoint_limits={"Bioportal": 1}, poll_interval=0.01)
+    rows = runner.run(items)
+    assert all(r["status"] == "ok" for r in rows)
+    assert mapper.peak == {"Bioportal": 1, "Wikidata": 2}
+    # the Wikidata terms start right away instead of queueing behind b2 / b3
+    assert mapper.started[:3] == ["b1", "w1", "w2"]
+
+
+def test_max_workers_bounds_all_endpoints(mapper):
+    items = _items(*[("Wikidata", f"t{i}") for i in range(6)])
+    BatchRunner(max_workers=2, poll_interval=0.01).run(items)
+    assert mapper.peak == {"Wikidata": 2}
+
+
+def test_callbacks_run_in_the_calling_thread(mapper):
+    caller = threading.get_ident()
+    seen = []
+    BatchRunner(max_workers=2, poll_interval=0.01).run(
+        _items(("Wikidata", "a"), ("Wikidata", "b")),
+        on_result=lambda i, item, row: seen.append((i, threading.get_ident())),
+    )
+    assert sorted(i for i, _ in seen) == [0, 1]
+    assert all(thread == caller for _, thread in seen)
+
+
+def test_canonical_key_ignores_spelling_details():
+    a = BatchItem(term="Dry_Matter ", definition="The  mass fraction", endpoint="Bioportal")
+    b = BatchItem(term="dry matter", definition="the mass fraction", endpoint="Bioportal")
+    assert batch_engine.canonical_key(a, ["NCIT", "MESH"], ["ncit"]) == batch_engine.canonical_key(b, ["MESH", "NCIT"], ["NCIT"])
+    assert batch_engine.canonical_key(a) != batch_engine.canonical_key(BatchItem("dry matter", "the mass fraction", "Wikidata"))
+    assert batch_engine.canonical_key(a, ["NCIT"]) != batch_engine.canonical_key(b, ["MESH"])
+
+
+def test_repeated_terms_are_mapped_once_and_fanned_out(mapper):
+    items = _items(("Wikidata", "milk"), ("Wikidata", "cheese"), ("Wikidata", "Milk "))
+    unique, owner = batch_engine.dedupe_items(items)
+    assert [i.term for i in unique] == ["milk", "cheese"]
+    assert owner == [0, 1, 0]
+
+    results = []
+    rows = BatchRunner(max_workers=2, poll_interval=0.01).run(items, on_result=lambda i, item, row: results.append(i))
+    assert sorted(mapper.started) == ["cheese", "milk"]
+    assert [r["IRI"] for r in rows] == ["iri:milk", "iri:cheese", "iri:milk"]
+    assert sorted(results) == [0, 1, 2]
+    # every row gets its own copy
+    assert rows[0] is not rows[2]
+
+
+def test_dedupe_can_be_switched_off(mapper):
+    BatchRunner(max_workers=2, poll_interval=0.01, dedupe=False).run(_items(("Wikidata", "milk"), ("Wikidata", "milk")))
+    assert mapper.started == ["milk", "milk"]
+
+
+def test_shard_of_is_stable_and_groups_repeats():
+    a, b = BatchItem("Dry_matter", "x", "Wikidata"), BatchItem("dry matter", "X", "Bioportal")
+    assert batch_engine.shard_of(a, 8) == batch_engine.shard_of(b, 8)
+    assert {batch_engine.shard_of(BatchItem(f"t{i}", "", "Wikidata"), 4) for i in range(40)} == {0, 1, 2, 3}
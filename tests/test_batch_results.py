@@ -0,0 +1,65 @@
+import pandas as pd
+
+from general_tools.batch_engine import BatchItem
+from general_tools.batch_results import EXPORT_COLUMNS, apply_reeval, ensure_batch_schema, export_xlsx, filter_batch
+
+
+def _frame():
+    return pd.DataFrame({
+        "Term": ["milk", "cheese", "whey"],
+        "Definition": ["a", "b", "c"],
+        "Endpoint": ["Wikidata"] * 3,
+        "IRI": ["iri:milk", "No wiki match", "iri:whey"],
+        "SKOS": ["exact", "", "close"],
+        "explanation": ["", "", ""],
+    })
+
+
+def test_schema_is_added_once_and_rowid_is_the_index():
+    df = ensure_batch_schema(_frame())
+    assert list(df.index) == list(df["RowID"])
+    assert list(df["OriginalTerm"]) == ["milk", "cheese", "whey"]
+    assert set(df["Engine"]) == {"Agent"} and set(df["Status"]) == {"ok"}
+    # already in shape: returned as is, no copy
+    assert ensure_batch_schema(df) is df
+
+
+def test_existing_rowids_are_kept():
+    raw = _frame()
+    raw.insert(0, "RowID", ["r0", "r1", "r2"])
+    df = ensure_batch_schema(raw)
+    assert list(df.index) == ["r0", "r1", "r2"]
+
+
+def test_reeval_updates_only_the_selected_rows():
+    df = ensure_batch_schema(_frame())
+    r0, r1, r2 = df.index
+    items = [BatchItem(term="cheddar", definition="b", endpoint="Wikidata", key=r1),
+             BatchItem(term="milk", definition="a", endpoint="Wikidata", key=r0)]
+    outs = [{"IRI": "iri:cheddar", "SKOS": "close", "explanation": "near", "status": "ok"},
+            {"IRI": "", "SKOS": "", "explanation": "ERROR: boom", "status": "error", "cached": False}]
+    df = apply_reeval(df, items, outs, "run-1")
+
+    assert df.at[r1, "Term"] == "cheddar" and df.at[r1, "OriginalTerm"] == "cheese"
+    assert df.at[r1, "IRI"] == "iri:cheddar" and df.at[r1, "last_updated_run"] == "run-1"
+    assert df.at[r0, "Status"] == "error"
+    assert df.at[r2, "IRI"] == "iri:whey" and df.at[r2, "last_updated_run"] == ""
+
+
+def test_filter_batch():
+    df = ensure_batch_schema(_frame())
+    assert filter_batch(df, [], [], False, "") is df
+    assert list(filter_batch(df, ["none"], [], False, "")["Term"]) == ["cheese"]
+    assert list(filter_batch(df, ["exact", "close"], ["Wikidata"], False, "")["Term"]) == ["milk", "whey"]
+    assert list(filter_batch(df, [], [], True, "")["Term"]) == ["cheese"]
+    assert list(filter_batch(df, [], [], False, "WH")["Term"]) == ["whey"]
+    assert filter_batch(df, [], ["Bioportal"], False, "").empty
+
+
+def test_export_xlsx(tmp_path):
+    df = ensure_batch_schema(_frame())
+    path = tmp_path / "out.xlsx"
+    path.write_bytes(export_xlsx(df))
+    back = pd.read_excel(path, sheet_name="mapping").fillna("")
+    assert list(back.columns) == EXPORT_COLUMNS
+    assert list(back["IRI"]) == ["iri:milk", "No wiki match", "iri:whey"]
@@ -0,0 +1,32 @@
+import batch_worker
+from general_tools import batch_engine
+from general_tools.agent_budget import AgentBudget
+from general_tools.batch_engine import BatchItem
+from general_tools.job_store import JobStore
+
+
+def test_worker_maps_claimed_rows_with_the_job_config(tmp_path, monkeypatch):
+    monkeypatch.setenv("MAPPING_CACHE_DB", str(tmp_path / "cache.sqlite3"))
+    calls = []
+
+    def fake_map_term(endpoint, term, definition, **kwargs):
+        calls.append(kwargs)
+        return {"IRI": f"iri:{term}", "SKOS": "exact", "explanation": "", "status": "ok"}
+
+    monkeypatch.setattr(batch_engine, "map_term", fake_map_term)
+    monkeypatch.setattr(batch_worker, "get_agent", lambda endpoint, parallel_multiagent=False: ("agent", parallel_multiagent))
+
+    store = JobStore(tmp_path / "jobs.sqlite3")
+    items = [BatchItem(term=t, definition="", endpoint="Multiagent", engine="Agent", key=t) for t in ["a", "b"]]
+    config = {"trusted_onts": ["MESH"], "term_onts": ["NCIT"], "budget": {"max_tool_calls": 3},
+              "parallel_multiagent": True, "cache_mode": "bypass", "max_workers": 2}
+    job_id = store.create_job(items, "Multiagent", "Agent", config=config, status="queued", mode="worker")
+
+    worker = batch_worker.Worker(store, "w1", chunk_size=8)
+    assert worker.run_once() == 2
+    assert worker.run_once() == 0
+    assert store.get_job(job_id)["status"] == "done"
+    assert list(store.rows_frame(job_id)["IRI"]) == ["iri:a", "iri:b"]
+    assert calls[0]["agent"] == ("agent", True)
+    assert calls[0]["budget"] == AgentBudget(max_tool_calls=3)
+    assert calls[0]["trusted_onts"] == ["MESH"] and calls[0]["cache_mode"] == "bypass"
@@ -0,0 +1,43 @@
+import pandas as pd
+
+from benchmarks.benchmark_engines import DEFAULT_INPUT, load_cases, score, summarize
+
+
+def test_default_input_is_not_the_training_sheet():
+    assert DEFAULT_INPUT.exists()
+    assert "training" not in DEFAULT_INPUT.name
+    cases = load_cases(DEFAULT_INPUT)
+    assert cases and all(c["term"] and c["definition"] for c in cases)
+
+
+def test_load_cases_reads_expected_columns(tmp_path):
+    path = tmp_path / "cases.csv"
+    pd.DataFrame([
+        {"Term": "milk", "Definition": "white liquid", "Expected_IRI": "https://www.wikidata.org/wiki/Q8495",
+         "Expected_SKOS": "Exact"},
+        {"Term": "cheese", "Definition": None, "Expected_IRI": None, "Expected_SKOS": None},
+    ]).to_csv(path, index=False)
+    milk, cheese = load_cases(path)
+    assert milk["expected"] == {"https://www.wikidata.org/wiki/Q8495": "exact"}
+    assert cheese == {"term": "cheese", "definition": "", "expected": {}}
+
+
+def test_score():
+    expected = {"https://www.wikidata.org/wiki/Q8495": "exact"}
+    assert score({"IRI": "https://www.wikidata.org/wiki/Q8495", "SKOS": "exact"}, expected) == (True, True)
+    assert score({"IRI": "https://www.wikidata.org/wiki/Q8495", "SKOS": "close"}, expected) == (True, False)
+    assert score({"IRI": "No wiki match", "SKOS": ""}, expected) == (False, False)
+    assert score({"IRI": "https://www.wikidata.org/wiki/Q8495", "SKOS": "exact"}, {}) == (None, None)
+
+
+def test_summarize_scores_only_terms_with_expectations():
+    results = pd.DataFrame([
+        {"engine": "Agent", "seconds": 1.0, "tokens": 10, "id_correct": True, "id_and_skos_correct": False},
+        {"engine": "Agent", "seconds": 3.0, "tokens": 30, "id_correct": None, "id_and_skos_correct": None},
+        {"engine": "Pipeline", "seconds": 2.0, "tokens": 5, "id_correct": None, "id_and_skos_correct": None},
+    ])
+    agent, pipeline = summarize(results).to_dict("records")
+    assert agent["terms"] == 2 and agent["scored_terms"] == 1
+    assert agent["id_accuracy"] == 1.0 and agent["id_and_skos_accuracy"] == 0.0
+    assert agent["median_s"] == 2.0 and agent["total_tokens"] == 40
+    assert pipeline["scored_terms"] == 0 and pd.isna(pipeline["id_accuracy"])
@@ -0,0 +1,69 @@
+import pytest
+
+from bioportal_agent_and_tools import bioportal_tools, deep_agent_bioportal
+from bioportal_wikidata_system import multiagent_system
+from general_tools.credentials import Credentials, use_credentials
+from general_tools.training_examples import TrainingExamples
+
+
+@pytest.fixture
+def built(monkeypatch):
+    """Captures the create_deep_agent arguments instead of compiling an agent."""
+    calls = []
+
+    def fake_create(**kwargs):
+        calls.append(kwargs)
+        return kwargs
+
+    for module in (deep_agent_bioportal, multiagent_system):
+        monkeypatch.setattr(module, "create_deep_agent", fake_create)
+        monkeypatch.setattr(module, "training_examples", lambda: TrainingExamples("E", "C", "R"))
+    return calls
+
+
+def test_agents_build_without_a_bioportal_key(built, monkeypatch):
+    monkeypatch.delenv("BIOPORTAL_API_KEY", raising=False)
+    with use_credentials(Credentials(openai_api_key="sk")):
+        deep_agent_bioportal.get_agent_bioportal()
+        multiagent_system.get_multiagent()
+    assert len(built) == 2
+    assert "If the request does not list" not in built[0]["system_prompt"]
+    assert not hasattr(multiagent_system, "trusted_ontologies")
+    assert not hasattr(multiagent_system, "term_ontologies")
+
+
+def test_ontology_arguments_are_deprecated_fallbacks(built):
+    with use_credentials(Credentials(openai_api_key="sk")):
+        with pytest.warns(DeprecationWarning):
+            deep_agent_bioportal.get_agent_bioportal(["MESH"], ["NCIT", "SNOMEDCT"])
+        with pytest.warns(DeprecationWarning):
+            multiagent_system.get_multiagent(trusted_ontologies=["MESH"], term_ontologies=["NCIT"])
+    assert "check the following ontologies ['NCIT', 'SNOMEDCT']" in built[0]["system_prompt"]
+    assert "the trusted ontologies are ['MESH']" in built[0]["system_prompt"]
+    bio_subagent = built[1]["subagents"][0]
+    assert "check the following ontologies ['NCIT']" in bio_subagent["system_prompt"]
+
+
+def test_tools_read_the_bioportal_key_of_each_call(monkeypatch):
+    sent = []
+
+    class Resp:
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return {"collection": []}
+
+    def fake_get(url, params=None, timeout=None):
+        sent.append(params["apikey"])
+        return Resp()
+
+    monkeypatch.setattr(bioportal_tools, "http_get", fake_get)
+    monkeypatch.delenv("BIOPORTAL_API_KEY", raising=False)
+    with use_credentials(Credentials(bioportal_api_key="bp-a")):
+        bioportal_tools.find_pref_label("milk", "NCIT", "x")
+    with use_credentials(Credentials(bioportal_api_key="bp-b")):
+        bioportal_tools.find_pref_label("milk", "NCIT", "x")
+    assert set(sent) == {"bp-a", "bp-b"}
+    with use_credentials(Credentials()), pytest.raises(RuntimeError, match="BIOPORTAL_API_KEY"):
+        bioportal_tools.find_pref_label("milk", "NCIT", "x")
@@ -0,0 +1,93 @@
+from io import BytesIO, StringIO
+
+import pandas as pd
+import pytest
+
+from general_tools import bulk_verification as bv
+from general_tools.result_cache import VerdictCache
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("skos:exactMatch", "exact"),
+    ("Exact match", "exact"),
+    ("close_match", "close"),
+    (" related ", "related"),
+    (None, ""),
+    (float("nan"), ""),
+])
+def test_normalize_skos(value, expected):
+    assert bv.normalize_skos(value) == expected
+
+
+def test_read_accepts_header_variants_and_drops_empty_rows():
+    csv = StringIO("term,Term_Definition,LABEL,label-definition,skos\nmilk,white fluid,Milk,liquid,exact\n,x,y,z,close\n")
+    df = bv.read_verification_table(csv, name="table.csv")
+    assert list(df.columns) == bv.VERIFY_COLUMNS
+    assert df["Term"].tolist() == ["milk"]
+
+    with pytest.raises(ValueError, match="Label Definition"):
+        bv.read_verification_table(StringIO("Term,Definition,Label,SKOS\na,b,c,d\n"), name="t.csv")
+    with pytest.raises(ValueError, match="Unsupported"):
+        bv.read_verification_table(StringIO(""), name="t.txt")
+
+
+@pytest.fixture
+def classified(monkeypatch):
+    """Fake classifier: exact if both terms are equal (case-insensitive), fails for label 'boom'."""
+    pairs_seen = []
+
+    def fake_classify(pairs, max_concurrency=8, on_result=None):
+        for i, pair in enumerate(pairs):
+            pairs_seen.append(pair["term_b"])
+            if pair["term_b"] == "boom":
+                verdict = {"mapping_type": "none", "explanation": "ERROR: timeout"}
+            else:
+                same = pair["term_a"].lower() == pair["term_b"].lower()
+                verdict = {"mapping_type": "exact" if same else "related", "explanation": "fake"}
+            on_result(i, verdict)
+
+    monkeypatch.setattr(bv, "classify_skos_matches", fake_classify)
+    return pairs_seen
+
+
+def _table(rows):
+    return pd.DataFrame(rows, columns=bv.VERIFY_COLUMNS)
+
+
+def test_duplicates_are_classified_once_and_compared(classified, tmp_path):
+    df = _table([
+        ["milk", "white fluid", "Milk", "liquid", "skos:exactMatch"],
+        ["Milk ", "white fluid", "Milk", "liquid", "close"],
+        ["milk", "white fluid", "dairy", "products", "related"],
+        ["egg", "", "boom", "", "exact"],
+    ])
+    progress = []
+    out = bv.verify_table(df, cache=VerdictCache(str(tmp_path / "c.sqlite3")), on_progress=lambda d, t: progress.append((d, t)))
+    assert classified == ["Milk", "dairy", "boom"]
+    assert out["Agreement"].tolist() == ["agree", "disagree", "agree", "error"]
+    assert out["Predicted SKOS"].tolist()[:3] == ["exact", "exact", "related"]
+    assert progress[0] == (0, 3) and progress[-1] == (3, 3)
+    assert bv.summarize(out) == {"rows": 4, "agree": 2, "disagree": 1, "error": 1, "cached": 0,
+                                 "agreement_rate": 0.667}
+
+
+def test_verdicts_are_reused_but_errors_are_not_stored(classified, tmp_path):
+    cache = VerdictCache(str(tmp_path / "c.sqlite3"))
+    df = _table([["milk", "d", "Milk", "l", "exact"], ["egg", "", "boom", "", "exact"]])
+    bv.verify_table(df, cache=cache)
+    classified.clear()
+    out = bv.verify_table(df, cache=cache)
+    assert classified == ["boom"]
+    assert out["Cached"].tolist() == [True, False]
+
+    classified.clear()
+    bv.verify_table(df, cache=cache, cache_mode="refresh")
+    assert classified == ["Milk", "boom"]
+
+
+def test_export_has_a_disagreement_sheet(classified):
+    out = bv.verify_table(_table([["milk", "d", "Milk", "l", "exact"], ["milk", "d", "cheese", "l", "exact"]]),
+                          cache_mode="bypass")
+    sheets = pd.read_excel(BytesIO(bv.export_xlsx(out)), sheet_name=None)
+    assert len(sheets["verification"]) == 2
+    assert sheets["disagreements"]["Label"].tolist() == ["cheese"]
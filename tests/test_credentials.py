@@ -0,0 +1,87 @@
+import asyncio
+import json
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from general_tools.credentials import (
+    Credentials, child_env, credentials_from_session, current_credentials, session_chat_model, use_credentials,
+)
+
+
+def test_context_credentials_fall_back_to_the_environment(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "env-key")
+    monkeypatch.setenv("BIOPORTAL_TERM_ONTOLOGIES", "NCIT, MESH")
+    assert current_credentials().openai_api_key == "env-key"
+    assert current_credentials().term_ontologies == ("NCIT", "MESH")
+    with use_credentials(Credentials(openai_api_key="session-key"), bioportal_api_key="bp"):
+        assert current_credentials().openai_api_key == "session-key"
+        assert child_env()["BIOPORTAL_API_KEY"] == "bp"
+    assert current_credentials().openai_api_key == "env-key"
+
+
+def test_credentials_from_session():
+    creds = credentials_from_session({"OPENAI_API_KEY": " sk ", "trusted_ontologies_input": "MESH,,NCIT"})
+    assert creds.openai_api_key == "sk"
+    assert creds.trusted_ontologies == ("MESH", "NCIT")
+
+
+@pytest.fixture
+def openai_server(monkeypatch):
+    """Minimal chat completions endpoint that records the Authorization header of every request."""
+    seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            seen.append(self.headers.get("Authorization"))
+            body = json.dumps({
+                "id": "c", "object": "chat.completion", "created": 0, "model": "gpt-5.1",
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "ok"}}],
+                "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{server.server_address[1]}/v1")
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    yield seen
+    server.shutdown()
+
+
+def test_one_model_sends_the_key_of_each_caller(openai_server):
+    llm = session_chat_model("gpt-5.1", max_retries=0)
+
+    def call(key):
+        with use_credentials(Credentials(openai_api_key=key)):
+            return llm.invoke("hi").content
+
+    with ThreadPoolExecutor(4) as pool:
+        outs = list(pool.map(lambda k: contextvars.copy_context().run(call, k), [f"key-{i}" for i in range(8)]))
+    assert outs == ["ok"] * 8
+    assert sorted(openai_server) == sorted(f"Bearer key-{i}" for i in range(8))
+
+
+def test_async_calls_use_the_key_of_their_task(openai_server):
+    llm = session_chat_model("gpt-5.1", max_retries=0)
+
+    async def call(key):
+        with use_credentials(Credentials(openai_api_key=key)):
+            return (await llm.ainvoke("hi")).content
+
+    async def main():
+        return await asyncio.gather(*(call(f"key-{i}") for i in range(4)))
+
+    assert asyncio.run(main()) == ["ok"] * 4
+    assert sorted(openai_server) == [f"Bearer key-{i}" for i in range(4)]
@@ -0,0 +1,84 @@
+import requests
+import pytest
+
+from general_tools import http_client
+from general_tools.http_client import ResponseCache, http_get, use_http_session
+
+
+def _resp(status=200, body=b'{"ok": true}', url="https://example.org/x"):
+    resp = requests.Response()
+    resp.status_code = status
+    resp._content = body
+    resp.headers["Content-Type"] = "application/json"
+    resp.url = url
+    return resp
+
+
+class FakeSession:
+    def __init__(self, status=200):
+        self.status = status
+        self.calls = []
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        self.calls.append((url, dict(params or {})))
+        return _resp(self.status, url=url)
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ResponseCache(ttl_seconds=60, max_entries=2)
+    monkeypatch.setattr(http_client, "response_cache", cache)
+    return cache
+
+
+def test_key_ignores_the_apikey_and_param_order():
+    a = ResponseCache.key("https://data.bioontology.org/search", {"q": "milk", "ontologies": "NCIT", "apikey": "a"})
+    b = ResponseCache.key("https://data.bioontology.org/search", {"ontologies": "NCIT", "apikey": "b", "q": "milk"})
+    assert a == b
+    assert a != ResponseCache.key("https://data.bioontology.org/search", {"q": "egg", "ontologies": "NCIT"})
+
+
+def test_hits_are_fresh_copies_and_expire(cache, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(http_client.time, "monotonic", lambda: now[0])
+    cache.put("k", _resp())
+    first, second = cache.get("k"), cache.get("k")
+    assert first is not second and first.json() == {"ok": True}
+    now[0] += 61
+    assert cache.get("k") is None
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 1 and cache.stats()["size"] == 0
+
+
+def test_least_recently_used_entry_is_dropped(cache):
+    cache.put("a", _resp())
+    cache.put("b", _resp())
+    cache.get("a")
+    cache.put("c", _resp())
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_http_get_serves_repeats_from_the_cache(cache):
+    session = FakeSession()
+    with use_http_session(session):
+        for key in ("key-a", "key-b"):
+            resp = http_get("https://example.org/search", params={"q": "milk", "apikey": key})
+            assert resp.json() == {"ok": True}
+    assert len(session.calls) == 1
+    assert http_client.http_session() is not session
+
+
+def test_errors_and_disabled_cache_always_go_upstream(cache):
+    failing = FakeSession(status=500)
+    with use_http_session(failing):
+        http_get("https://example.org/search", params={"q": "milk"})
+        http_get("https://example.org/search", params={"q": "milk"})
+    assert len(failing.calls) == 2
+
+    cache.ttl_seconds = 0
+    ok = FakeSession()
+    with use_http_session(ok):
+        http_get("https://example.org/search", params={"q": "egg"})
+        http_get("https://example.org/search", params={"q": "egg"})
+    assert len(ok.calls) == 2
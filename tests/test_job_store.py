@@ -0,0 +1,107 @@
+import pytest
+
+from general_tools import job_store, mapping_engine
+from general_tools.agent_budget import AgentBudget
+from general_tools.batch_engine import BatchItem, BatchRunner
+from general_tools.job_store import BATCH_COLUMNS, JobStore
+from general_tools.result_cache import ResultCache
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(tmp_path / "jobs.sqlite3")
+
+
+def _items(n, endpoint="Wikidata"):
+    return [BatchItem(term=f"t{i}", definition="", endpoint=endpoint, engine="Pipeline", key=f"r{i}") for i in range(n)]
+
+
+def test_rows_are_checkpointed_and_resumable(store):
+    job_id = store.create_job(_items(3), "Wikidata", "Pipeline", config={"max_workers": 2})
+    assert store.get_job(job_id)["config"] == {"max_workers": 2}
+
+    store.save_result(job_id, "r0", {"IRI": "iri:t0", "SKOS": "exact", "explanation": "", "status": "ok"})
+    store.save_result(job_id, "r1", {"IRI": "", "SKOS": "", "explanation": "ERROR: boom", "status": "error"})
+    assert store.row_counts(job_id) == {"done": 1, "error": 1, "pending": 1}
+    assert [i.key for i in store.pending_items(job_id)] == ["r1", "r2"]
+    assert store.finish_job(job_id) == "incomplete"
+
+    frame = store.rows_frame(job_id)
+    assert list(frame.columns) == BATCH_COLUMNS
+    assert list(frame["Status"]) == ["ok", "error", "pending"]
+
+
+def test_claim_rows_hands_out_each_row_once(store):
+    job_id = store.create_job(_items(5), "Wikidata", "Pipeline", status="queued", mode="worker")
+    job, first = store.claim_rows("w1", limit=3)
+    assert job["job_id"] == job_id and job["status"] == "running"
+    assert [i.key for i in first] == ["r0", "r1", "r2"]
+    _, second = store.claim_rows("w2", limit=3)
+    assert [i.key for i in second] == ["r3", "r4"]
+    assert store.claim_rows("w3") == (None, [])
+
+
+def test_expired_lease_is_claimable_again(store, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(job_store.time, "time", lambda: clock[0])
+    job_id = store.create_job(_items(2), "Wikidata", "Pipeline", status="queued", mode="worker")
+    _, claimed = store.claim_rows("dead-worker", limit=2, lease_seconds=60)
+    assert len(claimed) == 2
+    store.save_result(job_id, "r0", {"IRI": "iri:t0", "status": "ok"})
+
+    clock[0] += 30
+    assert store.claim_rows("w2", lease_seconds=60) == (None, [])
+    clock[0] += 31
+    _, reclaimed = store.claim_rows("w2", lease_seconds=60)
+    assert [i.key for i in reclaimed] == ["r1"]
+
+
+def test_inline_and_finished_jobs_are_not_claimed(store):
+    store.create_job(_items(2), "Wikidata", "Pipeline")
+    cancelled = store.create_job(_items(2), "Wikidata", "Pipeline", status="queued", mode="worker")
+    store.set_job_status(cancelled, "cancelled")
+    assert store.claim_rows("w1") == (None, [])
+
+
+def test_requeue_hands_failed_rows_to_workers(store):
+    job_id = store.create_job(_items(2), "Wikidata", "Pipeline")
+    store.save_result(job_id, "r0", {"IRI": "", "status": "error"})
+    store.save_result(job_id, "r1", {"IRI": "iri:t1", "status": "ok"})
+    store.requeue_job(job_id)
+    job, items = store.claim_rows("w1")
+    assert job["mode"] == "worker"
+    assert [i.key for i in items] == ["r0"]
+
+
+def test_runner_options_restore_the_job_settings():
+    options = job_store.runner_options({
+        "trusted_onts": ["MESH"], "term_onts": ["NCIT"], "max_workers": 6, "bioportal_limit": 2,
+        "budget": {"max_tool_calls": 5, "stop_on_exact": True}, "cache_mode": "refresh",
+        "parallel_multiagent": True,
+    })
+    assert options["budget"] == AgentBudget(max_tool_calls=5, stop_on_exact=True)
+    assert options["max_workers"] == 6
+    assert options["endpoint_limits"] == {"Bioportal": 2, "Multiagent": 2}
+    assert options["cache_mode"] == "refresh" and options["parallel_multiagent"] is True
+    assert (options["trusted_onts"], options["term_onts"]) == (["MESH"], ["NCIT"])
+
+    defaults = job_store.runner_options({})
+    assert defaults["budget"] is None and defaults["max_workers"] == 1 and defaults["cache_mode"] == "use"
+
+
+def test_reeval_maps_an_unchanged_term_again(tmp_path, monkeypatch):
+    calls = []
+
+    def fake_uncached(endpoint, term, *args):
+        calls.append(term)
+        return {"IRI": f"iri:{len(calls)}", "SKOS": "exact", "explanation": "", "status": "ok"}
+
+    monkeypatch.setattr(mapping_engine, "_map_term_uncached", fake_uncached)
+    cache = ResultCache(tmp_path / "cache.sqlite3")
+    config = {"cache_mode": "use"}
+    BatchRunner(cache=cache, **job_store.runner_options(config)).run(_items(1))
+
+    outs = BatchRunner(cache=cache, **job_store.runner_options(job_store.reeval_config(config))).run(_items(1))
+    assert calls == ["t0", "t0"]
+    assert outs[0]["IRI"] == "iri:2" and not outs[0].get("cached")
+    assert job_store.reeval_config({"cache_mode": "bypass"})["cache_mode"] == "bypass"
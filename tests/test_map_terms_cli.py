@@ -0,0 +1,150 @@
+import json
+
+import pandas as pd
+import pytest
+
+import map_terms_cli
+from general_tools import batch_engine
+
+
+@pytest.fixture
+def terms(tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    mapped = []
+
+    def fake_map_term(endpoint, term, definition, **kwargs):
+        mapped.append(term)
+        if term == "broken":
+            raise RuntimeError("lookup failed")
+        return {"IRI": f"iri:{term}", "SKOS": "exact", "explanation": "", "status": "ok"}
+
+    monkeypatch.setattr(batch_engine, "map_term", fake_map_term)
+    path = tmp_path / "terms.csv"
+    pd.DataFrame({"Term": ["milk", "cheese", "whey"], "Definition": ["a", "b", "c"]}).to_csv(path, index=False)
+    return path, mapped
+
+
+def _rows(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def _args(*extra):
+    return ["--engine", "Pipeline", "--cache-mode", "bypass", "--quiet", *extra]
+
+
+def test_maps_every_row(terms, tmp_path):
+    path, _ = terms
+    out = tmp_path / "out.jsonl"
+    assert map_terms_cli.main([str(path), str(out), *_args("--ordered")]) == map_terms_cli.EXIT_OK
+    assert [(r["row"], r["IRI"], r["Status"]) for r in _rows(out)] == [
+        (0, "iri:milk", "ok"), (1, "iri:cheese", "ok"), (2, "iri:whey", "ok")]
+
+
+def test_resume_skips_finished_rows(terms, tmp_path):
+    path, mapped = terms
+    out = tmp_path / "out.jsonl"
+    out.write_text(json.dumps({"row": 0, "IRI": "iri:milk"}) + "\n", encoding="utf-8")
+    assert map_terms_cli.main([str(path), str(out), *_args("--resume")]) == map_terms_cli.EXIT_OK
+    assert sorted(mapped) == ["cheese", "whey"]
+    assert sorted(r["row"] for r in _rows(out)) == [0, 1, 2]
+
+
+def test_resume_retries_failed_rows(terms, tmp_path):
+    path, mapped = terms
+    pd.DataFrame({"Term": ["milk", "broken", "whey"], "Definition": ["a", "b", "c"]}).to_csv(path, index=False)
+    out = tmp_path / "out.jsonl"
+    assert map_terms_cli.main([str(path), str(out), *_args("--ordered")]) == map_terms_cli.EXIT_ROW_ERRORS
+
+    mapped.clear()
+    stats = tmp_path / "stats.json"
+    args = [str(path), str(out), *_args("--resume", "--ordered", "--stats", str(stats))]
+    assert map_terms_cli.main(args) == map_terms_cli.EXIT_ROW_ERRORS
+    assert mapped == ["broken"]
+    assert json.loads(stats.read_text(encoding="utf-8"))["retried_errors"] == 1
+    # the retried row replaces the failed one, in input order
+    assert [(r["row"], r["Status"]) for r in _rows(out)] == [(0, "ok"), (1, "error"), (2, "ok")]
+
+
+def test_failed_rows_give_exit_code_1(terms, tmp_path):
+    path, _ = terms
+    pd.DataFrame({"Term": ["milk", "broken"], "Definition": ["a", "b"]}).to_csv(path, index=False)
+    out = tmp_path / "out.jsonl"
+    stats = tmp_path / "stats.json"
+    assert map_terms_cli.main([str(path), str(out), *_args("--stats", str(stats))]) == map_terms_cli.EXIT_ROW_ERRORS
+    assert json.loads(stats.read_text(encoding="utf-8"))["errors"] == 1
+
+
+def test_bad_input_gives_exit_code_2(terms, tmp_path, monkeypatch):
+    path, _ = terms
+    out = str(tmp_path / "out.jsonl")
+    assert map_terms_cli.main([str(tmp_path / "nope.csv"), out, *_args()]) == map_terms_cli.EXIT_USAGE
+    assert map_terms_cli.main([str(path), str(tmp_path / "out.xlsx"), *_args()]) == map_terms_cli.EXIT_USAGE
+    assert map_terms_cli.main([str(path), out, *_args("--shard", "4/4")]) == map_terms_cli.EXIT_USAGE
+    monkeypatch.delenv("OPENAI_API_KEY")
+    assert map_terms_cli.main([str(path), out, *_args()]) == map_terms_cli.EXIT_USAGE
+
+
+def test_shards_cover_every_row_once(terms, tmp_path):
+    path, mapped = terms
+    shard_dir = tmp_path / "shards"
+    for index in range(3):
+        assert map_terms_cli.main([str(path), str(shard_dir), *_args("--shard", f"{index}/3")]) == map_terms_cli.EXIT_OK
+    assert sorted(mapped) == ["cheese", "milk", "whey"]
+    merged = tmp_path / "merged.jsonl"
+    assert map_terms_cli.main([str(shard_dir), str(merged), "--merge"]) == map_terms_cli.EXIT_OK
+    assert [r["row"] for r in _rows(merged)] == [0, 1, 2]
+
+
+def test_parse_shard():
+    assert map_terms_cli._parse_shard("2/8") == (2, 8)
+    for bad in ["8/8", "-1/4", "1/0", "x"]:
+        with pytest.raises(ValueError):
+            map_terms_cli._parse_shard(bad)
+
+
+def test_restarted_shard_resumes_from_its_file(terms, tmp_path):
+    path, mapped = terms
+    shard_dir = tmp_path / "shards"
+    args = [str(path), str(shard_dir), *_args("--shard", "0/1")]
+    path.write_text("Term,Definition\nmilk,a\nbroken,b\ncheese,c\n", encoding="utf-8")
+    assert map_terms_cli.main(args) == map_terms_cli.EXIT_ROW_ERRORS
+    shard = shard_dir / "shard-0-of-1.jsonl"
+    # failed shards get no .done marker, so the merge reports them
+    assert not (shard_dir / "shard-0-of-1.jsonl.done").exists()
+    assert map_terms_cli.main([str(shard_dir), str(tmp_path / "m.jsonl"), "--merge"]) == map_terms_cli.EXIT_ROW_ERRORS
+
+    mapped.clear()
+    path.write_text("Term,Definition\nmilk,a\nbroken,b\ncheese,c\nwhey,d\n", encoding="utf-8")
+    assert map_terms_cli.main(args) == map_terms_cli.EXIT_ROW_ERRORS
+    # mapped rows of the checkpoint are skipped, the failed and the new row are mapped
+    assert sorted(mapped) == ["broken", "whey"]
+    assert [(r["row"], r["Status"]) for r in _rows(shard)] == [(0, "ok"), (1, "error"), (2, "ok"), (3, "ok")]
+    assert not (shard_dir / "shard-0-of-1.jsonl.done").exists()
+
+    mapped.clear()
+    path.write_text("Term,Definition\nmilk,a\nfixed,b\ncheese,c\nwhey,d\n", encoding="utf-8")
+    assert map_terms_cli.main(args) == map_terms_cli.EXIT_OK
+    assert mapped == ["fixed"]
+    assert [(r["row"], r["Term"]) for r in _rows(shard)] == [(0, "milk"), (1, "fixed"), (2, "cheese"), (3, "whey")]
+    assert (shard_dir / "shard-0-of-1.jsonl.done").exists()
+    assert map_terms_cli.main([str(shard_dir), str(tmp_path / "m.jsonl"), "--merge"]) == map_terms_cli.EXIT_OK
+
+
+def test_local_shards_forward_the_arguments(terms, tmp_path, monkeypatch):
+    path, _ = terms
+    started = []
+
+    class FakeProcess:
+        def __init__(self, cmd):
+            started.append(cmd)
+            map_terms_cli.main(cmd[2:])
+
+        def wait(self):
+            return map_terms_cli.EXIT_OK
+
+    monkeypatch.setattr(map_terms_cli.subprocess, "Popen", FakeProcess)
+    out = tmp_path / "shards"
+    assert map_terms_cli.main([str(path), str(out), "--shards", "2", *_args()]) == map_terms_cli.EXIT_OK
+    assert [cmd[-2:] for cmd in started] == [["--shard", "0/2"], ["--shard", "1/2"]]
+    assert all("--shards" not in cmd for cmd in started)
+    assert [r["row"] for r in _rows(out / "merged.jsonl")] == [0, 1, 2]
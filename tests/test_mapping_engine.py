@@ -0,0 +1,82 @@
+import json
+
+from langchain_core.messages import AIMessage, ToolMessage
+
+from general_tools import mapping_engine
+from general_tools.agent_budget import AgentBudget
+from general_tools.mapping_engine import map_term, result_from_raw
+
+
+def _update(msg):
+    return ((), "updates", {"node": {"messages": [msg]}})
+
+
+class FakeAgent:
+    def __init__(self, items):
+        self.items = items
+
+    def stream(self, inputs, stream_mode=None, subgraphs=False):
+        self.inputs = inputs
+        yield from self.items
+
+
+FINAL = json.dumps({"qid": "Q8495", "skos": "exact", "explanation": "same concept"})
+TRAJECTORY = [
+    _update(AIMessage(content="", tool_calls=[{"name": "WikidataEntityDetails", "args": {"qid": "Q8495"}, "id": "c1"}])),
+    _update(ToolMessage(content=json.dumps({"id": "Q8495"}), name="WikidataEntityDetails", tool_call_id="c1")),
+    _update(ToolMessage(content=json.dumps({"mapping_type": "exact", "explanation": "same concept"}),
+                        name="classify_skos_match", tool_call_id="c2")),
+    ((), "values", {"messages": [AIMessage(content=FINAL)]}),
+]
+
+
+def test_agent_progress_is_streamed_before_the_row():
+    events = []
+    row = map_term("Wikidata", "milk", "white liquid", agent=FakeAgent(TRAJECTORY), on_event=events.append)
+    assert [e["type"] for e in events] == ["tool_call", "candidate", "verdict"]
+    assert events[1]["id"] == "Q8495"
+    assert events[2] == {"type": "verdict", "id": "Q8495", "skos": "exact", "explanation": "same concept"}
+    assert row["IRI"] == "https://www.wikidata.org/wiki/Q8495"
+    assert row["SKOS"] == "exact"
+    assert row["status"] == "ok"
+    assert row["stats"]["tool_calls"] == 1
+
+
+def test_early_exit_row_uses_the_verified_candidate():
+    row = map_term("Wikidata", "milk", "white liquid", agent=FakeAgent(TRAJECTORY),
+                   budget=AgentBudget(stop_on_exact=True))
+    assert row["status"] == "early_exit"
+    assert row["IRI"] == "https://www.wikidata.org/wiki/Q8495"
+    assert row["explanation"] == "same concept"
+
+
+def test_pipeline_events_are_forwarded(monkeypatch):
+    class FakePipeline:
+        def map(self, term, definition, on_event=None):
+            on_event({"type": "candidate", "tool": "Wikidata", "id": "Q8495"})
+            return {"IRI": "https://www.wikidata.org/wiki/Q8495", "SKOS": "close", "explanation": ""}
+
+    monkeypatch.setattr(mapping_engine, "get_pipeline", lambda *a, **k: FakePipeline())
+    events = []
+    row = map_term("Wikidata", "milk", "", engine="Pipeline", on_event=events.append)
+    assert events == [{"type": "candidate", "tool": "Wikidata", "id": "Q8495"}]
+    assert row["status"] == "ok"
+
+
+def test_result_from_raw():
+    assert result_from_raw("Wikidata", "noise " + FINAL) == {
+        "IRI": "https://www.wikidata.org/wiki/Q8495", "SKOS": "exact", "explanation": "same concept"}
+    assert result_from_raw("Wikidata", "not json")["IRI"] == "No wiki match"
+    assert result_from_raw("Bioportal", json.dumps({"qid": "No bioportal match", "skos": "exact"})) == {
+        "IRI": "No bioportal match", "SKOS": "", "explanation": ""}
+    multi = result_from_raw("Multiagent", json.dumps({"ID": "Q42", "SKOS": "close", "SKOS_explanation": "near"}))
+    assert multi == {"IRI": "https://www.wikidata.org/wiki/Q42", "SKOS": "close", "explanation": "near"}
+
+
+def test_agent_row_with_failed_tool_calls_is_an_error():
+    failed = ToolMessage(content="401 Unauthorized", name="find_best_definition", tool_call_id="c0", status="error")
+    row = map_term("Wikidata", "milk", "white liquid", agent=FakeAgent([_update(failed)] + TRAJECTORY))
+    assert row["status"] == "error"
+    # the agent's answer is kept, the failure is reported with it
+    assert row["IRI"] == "https://www.wikidata.org/wiki/Q8495"
+    assert row["explanation"] == "ERROR: find_best_definition failed: 401 Unauthorized | same concept"
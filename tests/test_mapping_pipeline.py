@@ -0,0 +1,98 @@
+import pytest
+
+from general_tools import mapping_pipeline
+from general_tools.mapping_pipeline import MappingPipeline
+
+
+@pytest.fixture
+def sources(monkeypatch):
+    """Fake lookups; tests change the entries of the returned dict."""
+    fake = {
+        "trusted": lambda term, onto: ("http://purl.obolibrary.org/obo/NCIT_C1", "exact"),
+        "best": lambda term, onto: {"mapped_id": f"http://x/{onto}/1", "mapped_type": "exact+Definition",
+                                    "definition": "a dairy product"},
+        "label": lambda term, onto, iri: "Cow Milk",
+        "search": lambda term, limit: ["Q8495"],
+        "details": lambda qids: {q: {"label": "milk", "definition": "white liquid"} for q in qids},
+        "verdicts": None,
+    }
+    monkeypatch.setattr(mapping_pipeline, "find_term_in_ontology", lambda t, o: fake["trusted"](t, o))
+    monkeypatch.setattr(mapping_pipeline, "find_best_definition", lambda t, o: fake["best"](t, o))
+    monkeypatch.setattr(mapping_pipeline, "find_pref_label", lambda t, o, i: fake["label"](t, o, i))
+    monkeypatch.setattr(mapping_pipeline, "search_wikidata_candidates", lambda t, n: fake["search"](t, n))
+    monkeypatch.setattr(mapping_pipeline, "wikidata_entities_details", lambda q: fake["details"](q))
+
+    async def fake_classify(pairs, max_concurrency=8):
+        fake["pairs"] = pairs
+        if fake["verdicts"] is not None:
+            return fake["verdicts"](pairs)
+        return [{"mapping_type": "exact", "explanation": "same"} for _ in pairs]
+
+    monkeypatch.setattr(mapping_pipeline, "aclassify_skos_matches", fake_classify)
+    return fake
+
+
+def _raise(message):
+    def fn(*args):
+        raise RuntimeError(message)
+    return fn
+
+
+def test_trusted_candidate_uses_the_concept_label(sources):
+    pipeline = MappingPipeline("Bioportal", trusted_ontologies=["NCIT"], term_ontologies=["NCIT"])
+    row = pipeline.map("cow_milk", "milk of cows")
+    assert row["IRI"] == "http://purl.obolibrary.org/obo/NCIT_C1"
+    assert row["SKOS"] == "exact"
+    assert "status" not in row
+
+
+def test_classification_compares_with_the_pref_label(sources):
+    pipeline = MappingPipeline("Bioportal", term_ontologies=["FOODON"])
+    row = pipeline.map("cow_milk", "milk of cows")
+    assert row["IRI"] == "http://x/FOODON/1"
+    assert sources["pairs"][0]["term_b"] == "Cow Milk"
+
+
+def test_bioportal_failure_marks_the_row_as_error(sources):
+    sources["best"] = _raise("401 invalid api key")
+    pipeline = MappingPipeline("Bioportal", term_ontologies=["FOODON"])
+    row = pipeline.map("milk", "")
+    assert row["IRI"] == "No bioportal match"
+    assert row["status"] == "error"
+    assert "401 invalid api key" in row["explanation"]
+
+
+def test_wikidata_failure_does_not_abort_the_other_source(sources):
+    sources["search"] = _raise("503 service unavailable")
+    pipeline = MappingPipeline("Multiagent", term_ontologies=["FOODON"])
+    row = pipeline.map("milk", "")
+    # BioPortal result is kept, but the row is not a clean result
+    assert row["IRI"] == "http://x/FOODON/1"
+    assert row["status"] == "error"
+    assert "Wikidata search failed: 503" in row["explanation"]
+
+
+def test_failed_classification_is_an_error_not_a_no_match(sources):
+    sources["verdicts"] = lambda pairs: [{"mapping_type": "none", "explanation": "ERROR: 401 invalid api key"}
+                                         for _ in pairs]
+    pipeline = MappingPipeline("Wikidata")
+    row = pipeline.map("milk", "white liquid")
+    assert row["IRI"] == "No wiki match"
+    assert row["status"] == "error"
+    assert "401 invalid api key" in row["explanation"]
+
+
+def test_best_verdict_wins(sources):
+    sources["search"] = lambda term, limit: ["Q1", "Q2"]
+    sources["verdicts"] = lambda pairs: [{"mapping_type": "related", "explanation": "r"},
+                                         {"mapping_type": "close", "explanation": "c"}]
+    row = MappingPipeline("Wikidata").map("milk", "white liquid")
+    assert (row["IRI"], row["SKOS"], row["explanation"]) == ("https://www.wikidata.org/wiki/Q2", "close", "c")
+    assert "status" not in row
+
+
+def test_skos_rank_is_defined_once():
+    from general_tools import agent_budget, retrieve_rank, skos_tools
+    assert mapping_pipeline.SKOS_RANK is skos_tools.SKOS_RANK
+    assert agent_budget.SKOS_RANK is skos_tools.SKOS_RANK
+    assert retrieve_rank.SKOS_RANK is skos_tools.SKOS_RANK
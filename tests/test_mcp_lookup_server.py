@@ -0,0 +1,42 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("mcp")
+
+import mcp_lookup_server as server
+from bioportal_agent_and_tools import bioportal_tools
+from general_tools.credentials import current_credentials
+from wikidata_agent_and_tools import wikidata_tools
+
+
+def _ctx(headers=None, http=True):
+    request = SimpleNamespace(headers=headers or {}) if http else None
+    return SimpleNamespace(request_context=SimpleNamespace(request=request))
+
+
+@pytest.fixture
+def lookups(monkeypatch):
+    monkeypatch.setattr(bioportal_tools, "find_term_in_ontology",
+                        lambda term, ontology, exact, case_sensitive: (current_credentials().bioportal_api_key, "exact"))
+    monkeypatch.setattr(wikidata_tools, "WikidataEntitySearch", lambda search, entity_type: f"Q1 {search}")
+    monkeypatch.setenv("BIOPORTAL_API_KEY", "server-key")
+    monkeypatch.setattr(server, "ALLOW_SERVER_KEY", False)
+
+
+def test_bioportal_lookups_run_with_the_client_key(lookups):
+    ctx = _ctx({server.BIOPORTAL_KEY_HEADER: "client-key"})
+    assert asyncio.run(server.find_term_in_ontology("milk", "NCIT", ctx)) == ("client-key", "exact")
+
+
+def test_bioportal_lookup_without_key_needs_the_opt_in(lookups, monkeypatch):
+    with pytest.raises(ValueError, match="X-BioPortal-API-Key"):
+        asyncio.run(server.find_term_in_ontology("milk", "NCIT", _ctx()))
+    monkeypatch.setattr(server, "ALLOW_SERVER_KEY", True)
+    assert asyncio.run(server.find_term_in_ontology("milk", "NCIT", _ctx()))[0] == "server-key"
+    assert asyncio.run(server.find_term_in_ontology("milk", "NCIT", _ctx(http=False)))[0] == "server-key"
+
+
+def test_wikidata_lookups_need_no_key(lookups):
+    assert asyncio.run(server.wikidata_entity_search("milk", _ctx())) == "Q1 milk"
@@ -0,0 +1,86 @@
+import sys
+import textwrap
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from general_tools.credentials import Credentials
+from general_tools.mcp_skos_client import McpClientPool, extract_tool_payload
+
+REPO = Path(__file__).resolve().parent.parent
+
+
+def test_extract_tool_payload():
+    assert extract_tool_payload({"mapping_type": "exact"}) == {"mapping_type": "exact"}
+    structured = SimpleNamespace(structuredContent={"result": {"mapping_type": "close", "explanation": "x"}})
+    assert extract_tool_payload(structured) == {"mapping_type": "close", "explanation": "x"}
+    text = SimpleNamespace(structuredContent=None, content=[SimpleNamespace(text='{"mapping_type": "related"}')])
+    assert extract_tool_payload(text) == {"mapping_type": "related"}
+    plain = SimpleNamespace(structuredContent=None, content=[SimpleNamespace(text="not json")])
+    assert extract_tool_payload(plain) == {"mapping_type": "none", "explanation": "not json"}
+
+
+@pytest.fixture
+def server_script(tmp_path):
+    """mcp_skos_server with a deterministic classifier that reports the key it runs with."""
+    pytest.importorskip("mcp")
+    script = tmp_path / "fake_skos_server.py"
+    script.write_text(textwrap.dedent(f"""
+        import os, sys, asyncio
+        sys.path.insert(0, {str(REPO)!r})
+        import mcp_skos_server as server
+
+        async def fake_classify(term_a, gen_def, term_b, onto_def, backoff=None):
+            if term_b == "boom":
+                raise RuntimeError("boom")
+            await asyncio.sleep(0.01 * len(term_b))
+            return {{"mapping_type": "exact" if term_a == term_b else "related",
+                     "explanation": os.environ.get("OPENAI_API_KEY", "")}}
+
+        @server.mcp.tool()
+        def crash_tool() -> str:
+            os._exit(1)
+
+        server.aclassify_skos_match = fake_classify
+        server.mcp.run()
+    """))
+    return str(script)
+
+
+@pytest.fixture
+def pool(server_script):
+    pool = McpClientPool(server_args=[server_script], max_connections=2)
+    yield pool
+    pool.close()
+
+
+def test_one_server_per_key_is_kept_open(pool):
+    a = Credentials(openai_api_key="key-a")
+    assert pool.classify_skos_match("milk", "d", "milk", "d", creds=a) == {"mapping_type": "exact", "explanation": "key-a"}
+    assert pool.classify_skos_match("milk", "d", "dairy", "d", creds=a)["mapping_type"] == "related"
+    assert pool.stats()["connects"] == 1
+    assert pool.classify_skos_match("egg", "d", "egg", "d", creds=Credentials(openai_api_key="key-b"))["explanation"] == "key-b"
+    assert pool.stats()["connects"] == 2
+    pool.classify_skos_match("egg", "d", "egg", "d", creds=Credentials(openai_api_key="key-c"))
+    assert pool.stats()["closed"] == 1
+    assert pool.stats()["open"] == 2
+
+
+def test_batch_results_are_streamed_with_their_index(pool):
+    pairs = [{"term_a": "a", "gen_def": "", "term_b": b, "onto_def": ""} for b in ["aaaaaaaaaa", "a", "boom"]]
+    creds = Credentials(openai_api_key="key-a")
+    streamed = list(pool.stream_skos_matches(pairs, creds=creds))
+    assert sorted(i for i, _ in streamed) == [0, 1, 2]
+    results = pool.classify_skos_matches(pairs, creds=creds)
+    assert [r["mapping_type"] for r in results] == ["related", "exact", "none"]
+    assert results[2]["explanation"].startswith("ERROR:")
+
+
+def test_crashed_server_is_replaced(pool):
+    creds = Credentials(openai_api_key="key-a")
+    pool.classify_skos_match("milk", "d", "milk", "d", creds=creds)
+    with pytest.raises(Exception):
+        pool.call_tool("crash_tool", {}, creds=creds, timeout=10)
+    assert pool.classify_skos_match("milk", "d", "milk", "d", creds=creds)["mapping_type"] == "exact"
+    assert pool.stats()["reconnects"] >= 1
@@ -0,0 +1,46 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("mcp")
+
+import mcp_skos_server as server
+from general_tools.credentials import current_credentials
+
+
+def _ctx(headers=None, http=True):
+    request = SimpleNamespace(headers=headers or {}) if http else None
+    return SimpleNamespace(request_context=SimpleNamespace(request=request))
+
+
+@pytest.fixture
+def classify(monkeypatch):
+    async def fake_classify(term_a, gen_def, term_b, onto_def, backoff=None):
+        return {"mapping_type": "exact", "explanation": current_credentials().openai_api_key}
+
+    monkeypatch.setattr(server, "aclassify_skos_match", fake_classify)
+    monkeypatch.setenv("OPENAI_API_KEY", "server-key")
+    monkeypatch.setattr(server, "ALLOW_SERVER_KEY", False)
+
+
+def _call(ctx):
+    return asyncio.run(server.classify_skos_match_tool("a", "", "b", "", ctx))
+
+
+def test_http_requests_use_the_key_of_their_header(classify):
+    assert _call(_ctx({server.OPENAI_KEY_HEADER: "client-key"}))["explanation"] == "client-key"
+
+
+def test_http_request_without_key_is_rejected(classify):
+    with pytest.raises(ValueError, match="X-OpenAI-API-Key"):
+        _call(_ctx())
+
+
+def test_server_key_fallback_is_opt_in(classify, monkeypatch):
+    monkeypatch.setattr(server, "ALLOW_SERVER_KEY", True)
+    assert _call(_ctx())["explanation"] == "server-key"
+
+
+def test_stdio_uses_the_server_environment(classify):
+    assert _call(_ctx(http=False))["explanation"] == "server-key"
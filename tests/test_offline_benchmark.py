@@ -0,0 +1,92 @@
+import json
+import sys
+
+import pytest
+
+from benchmarks import offline_benchmark
+from benchmarks.http_fixtures import FixtureMissing, FixtureSession, _open
+from benchmarks.stub_llm_server import StubLLMServer, respond
+from bioportal_agent_and_tools import bioportal_tools
+from general_tools.credentials import Credentials, session_chat_model, use_credentials
+from general_tools.http_client import use_http_session
+from wikidata_agent_and_tools import wikidata_tools
+
+SEARCH_URL = "https://data.bioontology.org/search"
+
+
+class LiveSession:
+    def __init__(self):
+        self.calls = 0
+
+    def get(self, url, params=None, headers=None, timeout=None, **kwargs):
+        import requests
+        self.calls += 1
+        resp = requests.Response()
+        resp.status_code = 200
+        resp._content = json.dumps({"collection": [{"@id": "http://x/milk", "prefLabel": "Milk"}]}).encode()
+        resp.headers["Content-Type"] = "application/json"
+        resp.url = url
+        return resp
+
+
+@pytest.mark.parametrize("suffix", [".jsonl", ".jsonl.gz"])
+def test_recorded_responses_are_replayed_without_the_apikey(tmp_path, suffix):
+    path = tmp_path / f"fixtures{suffix}"
+    recorder = FixtureSession(path, mode="record")
+    recorder._live = LiveSession()
+    params = {"q": "milk", "ontologies": "NCIT", "apikey": "secret"}
+    recorder.get(SEARCH_URL, params=params)
+    with _open(path, "r") as fh:
+        assert "secret" not in fh.read()
+
+    replay = FixtureSession(path)
+    assert len(replay) == 1
+    resp = replay.get(SEARCH_URL, params={**params, "apikey": "other"})
+    assert resp.status_code == 200 and resp.json()["collection"][0]["prefLabel"] == "Milk"
+    assert replay.counters() == {"http_requests": 1, "fixture_misses": 0, "recorded": 0}
+
+
+def test_a_miss_reads_as_no_hits_for_the_tools(tmp_path):
+    fixtures = FixtureSession(tmp_path / "none.jsonl")
+    with use_http_session(fixtures), use_credentials(Credentials(bioportal_api_key="bp")):
+        assert bioportal_tools.find_pref_label("milk", "NCIT", "http://x/milk") == ""
+        assert wikidata_tools.search_wikidata_candidates("milk", 5) == []
+        assert wikidata_tools.wikidata_entities_details(["Q8495"]) == {}
+    assert fixtures.counters()["fixture_misses"] == fixtures.counters()["http_requests"] > 0
+
+    strict = FixtureSession(tmp_path / "none.jsonl", strict=True)
+    with pytest.raises(FixtureMissing):
+        strict.get(SEARCH_URL, params={"q": "milk"})
+
+
+def test_benchmark_stops_without_fixtures(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(sys, "argv", ["offline_benchmark", "--fixtures", str(tmp_path / "missing.jsonl")])
+    with pytest.raises(SystemExit) as exc:
+        offline_benchmark.main()
+    assert exc.value.code == 2
+    assert "--record" in capsys.readouterr().err
+
+
+def test_stub_follows_the_scripted_wikidata_trajectory():
+    tools = [{"type": "function", "function": {"name": n}} for n in
+             ["WikidataEntitySearch", "WikidataEntityDetails", "classify_skos_match"]]
+    messages = [{"role": "user", "content": "Map the term \"milk\" with definition \"white fluid\" to a valid identifier"}]
+    step = respond({"messages": messages, "tools": tools})
+    call = step["tool_calls"][0]
+    assert call["function"]["name"] == "WikidataEntitySearch"
+    assert json.loads(call["function"]["arguments"]) == {"search": "milk"}
+
+    messages += [{"role": "assistant", "tool_calls": [{"id": "1", "function": {"name": "WikidataEntitySearch"}}]},
+                 {"role": "tool", "tool_call_id": "1", "content": "Q8495"}]
+    assert respond({"messages": messages, "tools": tools})["tool_calls"][0]["function"]["name"] == "WikidataEntityDetails"
+
+
+def test_stub_server_counts_calls_of_a_real_client(monkeypatch):
+    with StubLLMServer() as server:
+        monkeypatch.setenv("OPENAI_BASE_URL", server.base_url)
+        llm = session_chat_model("gpt-5.1", max_retries=0)
+        with use_credentials(Credentials(openai_api_key="stub")):
+            first = llm.invoke("hello").content
+            assert llm.invoke("hello").content == first
+        stats = server.stats.snapshot()
+    assert stats["llm_calls"] == 2 and stats["completion_tokens"] > 0
@@ -0,0 +1,83 @@
+import asyncio
+
+from bioportal_wikidata_system import parallel_multiagent
+from bioportal_wikidata_system.parallel_multiagent import (
+    ParallelMultiagent, is_confirmed_bioportal, is_trusted_iri, select_mapping,
+)
+
+TRUSTED = ["MESH", "NCIT"]
+MESH_EXACT = {"IRI": "http://purl.bioontology.org/ontology/MESH/D008892", "SKOS": "exact", "explanation": "b", "status": "ok"}
+FOODON_CLOSE = {"IRI": "http://purl.obolibrary.org/obo/FOODON_0001", "SKOS": "close", "explanation": "b", "status": "ok"}
+WIKI_EXACT = {"IRI": "https://www.wikidata.org/wiki/Q8495", "SKOS": "exact", "explanation": "w", "status": "ok"}
+WIKI_CLOSE = {"IRI": "https://www.wikidata.org/wiki/Q8495", "SKOS": "close", "explanation": "w", "status": "ok"}
+NO_BIO = {"IRI": "No bioportal match", "SKOS": "", "explanation": "", "status": "ok"}
+FAILED = {"IRI": "", "SKOS": "", "explanation": "ERROR (Wikidata): 401", "status": "error"}
+
+
+def test_trusted_iri_detection():
+    assert is_trusted_iri("http://purl.obolibrary.org/obo/NCIT_C29821", TRUSTED)
+    assert is_trusted_iri(MESH_EXACT["IRI"], TRUSTED)
+    assert not is_trusted_iri(FOODON_CLOSE["IRI"], TRUSTED)
+
+
+def test_trusted_exact_bioportal_is_confirmed():
+    assert is_confirmed_bioportal(MESH_EXACT, TRUSTED)
+    assert not is_confirmed_bioportal(FOODON_CLOSE, TRUSTED)
+    assert not is_confirmed_bioportal(NO_BIO, TRUSTED)
+
+
+def test_better_skos_class_wins_and_bioportal_wins_ties():
+    assert select_mapping(FOODON_CLOSE, WIKI_EXACT, TRUSTED) is WIKI_EXACT
+    assert select_mapping(FOODON_CLOSE, WIKI_CLOSE, TRUSTED) is FOODON_CLOSE
+    assert select_mapping(NO_BIO, WIKI_CLOSE, TRUSTED) is WIKI_CLOSE
+
+
+def test_no_match_from_both():
+    row = select_mapping(NO_BIO, None, TRUSTED)
+    assert row["IRI"] == "No match"
+    assert row["status"] == "ok"
+
+
+def test_a_failed_side_marks_the_selection_as_error():
+    row = select_mapping(NO_BIO, FAILED, TRUSTED)
+    assert (row["IRI"], row["status"]) == ("No match", "error")
+    assert "401" in row["explanation"]
+
+    row = select_mapping(FOODON_CLOSE, FAILED, TRUSTED)
+    assert (row["IRI"], row["status"]) == (FOODON_CLOSE["IRI"], "error")
+    assert FOODON_CLOSE["status"] == "ok"  # input rows are not modified
+
+
+def _mapper(rows, delays):
+    mapper = ParallelMultiagent.__new__(ParallelMultiagent)
+    mapper.budget, mapper.bio_agent, mapper.wiki_agent = None, "bio", "wiki"
+    finished = []
+
+    async def fake_run(agent, endpoint, *args):
+        await asyncio.sleep(delays[endpoint])
+        finished.append(endpoint)
+        return rows[endpoint]
+
+    mapper._run = fake_run
+    return mapper, finished
+
+
+def test_confirmed_bioportal_cancels_wikidata():
+    mapper, finished = _mapper({"Bioportal": MESH_EXACT, "Wikidata": WIKI_EXACT},
+                               {"Bioportal": 0, "Wikidata": 5})
+    row = mapper.map("milk", "", trusted_ontologies=TRUSTED)
+    assert row is MESH_EXACT
+    assert finished == ["Bioportal"]
+
+
+def test_unconfirmed_bioportal_waits_for_wikidata():
+    mapper, finished = _mapper({"Bioportal": FOODON_CLOSE, "Wikidata": WIKI_EXACT},
+                               {"Bioportal": 0, "Wikidata": 0.01})
+    row = mapper.map("milk", "", trusted_ontologies=TRUSTED)
+    assert row is WIKI_EXACT
+    assert finished == ["Bioportal", "Wikidata"]
+
+
+def test_skos_rank_is_shared():
+    from general_tools.skos_tools import SKOS_RANK
+    assert parallel_multiagent.SKOS_RANK is SKOS_RANK
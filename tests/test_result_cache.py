@@ -0,0 +1,118 @@
+import pytest
+
+from general_tools import mapping_engine
+from general_tools.mapping_engine import map_term
+from general_tools.result_cache import ResultCache, VerdictCache, cache_key, is_cacheable
+
+
+@pytest.mark.parametrize("row, expected", [
+    ({"IRI": "https://www.wikidata.org/wiki/Q8495", "SKOS": "exact", "status": "ok"}, True),
+    # early_exit depends on the budget (stop_on_exact) of the run
+    ({"IRI": "https://www.wikidata.org/wiki/Q8495", "SKOS": "exact", "status": "early_exit"}, False),
+    ({"IRI": "No wiki match", "SKOS": "", "explanation": "", "status": "ok"}, True),
+    ({"IRI": "", "explanation": "ERROR: timeout", "status": "error"}, False),
+    ({"IRI": "https://www.wikidata.org/wiki/Q8495", "status": "budget_exhausted:tool_calls"}, False),
+    # a failure reported inside an otherwise normal looking row
+    ({"IRI": "No match", "explanation": "ERROR (Bioportal): 401 Unauthorized", "status": "ok"}, False),
+    ({"IRI": "No wiki match", "explanation": "ERROR: Wikidata search failed | no candidate", "status": "ok"}, False),
+    ({"IRI": "", "status": "ok"}, False),
+])
+def test_is_cacheable(row, expected):
+    assert is_cacheable(row) is expected
+
+
+def test_key_normalizes_term_and_ignores_ontologies_for_wikidata():
+    a = cache_key("Wikidata", "Agent", "Dry_matter ", "The  mass", ["MESH"], ["NCIT"])
+    assert a == cache_key("Wikidata", "Agent", "dry matter", "the mass")
+    assert cache_key("Bioportal", "Agent", "milk", "", ["MESH"], ["NCIT"]) == \
+        cache_key("Bioportal", "Agent", "milk", "", ["mesh"], ["NCIT"])
+    assert cache_key("Bioportal", "Agent", "milk", "", ["MESH"]) != cache_key("Bioportal", "Agent", "milk", "", ["NCIT"])
+    assert cache_key("Wikidata", "Agent", "milk", "") != cache_key("Wikidata", "Pipeline", "milk", "")
+
+
+def test_key_separates_the_multiagent_modes():
+    assert cache_key("Multiagent", "Agent", "milk", "", parallel_multiagent=True) != \
+        cache_key("Multiagent", "Agent", "milk", "")
+    # only the Multiagent agent has two modes
+    assert cache_key("Wikidata", "Agent", "milk", "", parallel_multiagent=True) == \
+        cache_key("Wikidata", "Agent", "milk", "")
+    assert cache_key("Multiagent", "Pipeline", "milk", "", parallel_multiagent=True) == \
+        cache_key("Multiagent", "Pipeline", "milk", "")
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(tmp_path / "cache.sqlite3")
+
+
+@pytest.fixture
+def mapped(monkeypatch):
+    """Rows the fake engine returns, in order; records every real mapping."""
+    fake = {"rows": [], "calls": 0}
+
+    def fake_uncached(*args):
+        fake["calls"] += 1
+        return dict(fake["rows"].pop(0))
+
+    monkeypatch.setattr(mapping_engine, "_map_term_uncached", fake_uncached)
+    return fake
+
+
+def test_successful_rows_are_served_from_the_cache(cache, mapped):
+    mapped["rows"] = [{"IRI": "iri:milk", "SKOS": "exact", "explanation": "same", "status": "ok"}]
+    first = map_term("Wikidata", "milk", "white liquid", engine="Pipeline", cache=cache)
+    events = []
+    second = map_term("Wikidata", "Milk", "white  liquid", engine="Pipeline", cache=cache, on_event=events.append)
+    assert mapped["calls"] == 1
+    assert "cached" not in first
+    assert second["cached"] is True and second["IRI"] == "iri:milk"
+    assert events[0]["type"] == "cache_hit"
+    assert cache.stats() == {"entries": 1, "hits": 1}
+
+
+def test_failed_rows_are_not_stored(cache, mapped):
+    mapped["rows"] = [
+        {"IRI": "No wiki match", "SKOS": "", "explanation": "ERROR: Wikidata search failed: 503", "status": "error"},
+        {"IRI": "iri:milk", "SKOS": "exact", "explanation": "same", "status": "ok"},
+    ]
+    map_term("Wikidata", "milk", "", engine="Pipeline", cache=cache)
+    assert cache.stats()["entries"] == 0
+    assert map_term("Wikidata", "milk", "", engine="Pipeline", cache=cache)["IRI"] == "iri:milk"
+    assert mapped["calls"] == 2
+
+
+def test_refresh_and_bypass(cache, mapped):
+    mapped["rows"] = [{"IRI": f"iri:{n}", "SKOS": "exact", "explanation": "", "status": "ok"} for n in range(3)]
+    map_term("Wikidata", "milk", "", engine="Pipeline", cache=cache)
+    assert map_term("Wikidata", "milk", "", engine="Pipeline", cache=cache, cache_mode="refresh")["IRI"] == "iri:1"
+    assert map_term("Wikidata", "milk", "", engine="Pipeline", cache=cache, cache_mode="bypass")["IRI"] == "iri:2"
+    assert map_term("Wikidata", "milk", "", engine="Pipeline", cache=cache)["IRI"] == "iri:1"
+
+
+def test_verdict_cache_roundtrip(tmp_path):
+    verdicts = VerdictCache(tmp_path / "cache.sqlite3")
+    key = verdicts.key_for("Milk", "white liquid", "milk", "a liquid")
+    assert key == verdicts.key_for("milk ", "White liquid", "milk", "a  liquid")
+    verdicts.put(key, "Milk", "milk", {"mapping_type": "exact", "explanation": "same"})
+    assert verdicts.get_many([key, "missing"]) == {
+        key: {"mapping_type": "exact", "explanation": "same", "cached": True,
+              "cached_at": verdicts.get(key)["cached_at"]}}
+
+
+def test_multiagent_modes_do_not_share_results(cache, mapped):
+    mapped["rows"] = [{"IRI": f"iri:{n}", "SKOS": "exact", "explanation": "", "status": "ok"} for n in range(2)]
+    map_term("Multiagent", "milk", "", cache=cache)
+    assert map_term("Multiagent", "milk", "", cache=cache, parallel_multiagent=True)["IRI"] == "iri:1"
+    assert map_term("Multiagent", "milk", "", cache=cache)["IRI"] == "iri:0"
+    assert mapped["calls"] == 2
+
+
+def test_early_exit_rows_are_not_stored(cache, mapped):
+    mapped["rows"] = [
+        {"IRI": "iri:milk", "SKOS": "exact", "explanation": "", "status": "early_exit"},
+        {"IRI": "iri:milk", "SKOS": "exact", "explanation": "", "status": "ok"},
+    ]
+    map_term("Wikidata", "milk", "", cache=cache)
+    assert cache.stats()["entries"] == 0
+    assert map_term("Wikidata", "milk", "", cache=cache)["status"] == "ok"
+    assert mapped["calls"] == 2
@@ -0,0 +1,68 @@
+import pytest
+from langchain_core.messages import AIMessage
+
+from general_tools import retrieve_rank
+from general_tools.retrieve_rank import CandidateRanking, RankedCandidate, RetrieveRankMapper
+
+
+CANDIDATES = [
+    {"source": "Wikidata", "id": "Q8495", "label": "milk", "ontology": "", "match_type": "search",
+     "definition": "white liquid", "trusted": False},
+    {"source": "Wikidata", "id": "Q1", "label": "universe", "ontology": "", "match_type": "search",
+     "definition": "everything", "trusted": False},
+]
+
+
+class FakeRankingLLM:
+    def __init__(self, parsed, parsing_error=None):
+        self.out = {
+            "raw": AIMessage(content="", usage_metadata={"input_tokens": 90, "output_tokens": 10, "total_tokens": 100}),
+            "parsed": parsed,
+            "parsing_error": parsing_error,
+        }
+
+    async def ainvoke(self, messages):
+        return self.out
+
+
+@pytest.fixture
+def mapper():
+    mapper = RetrieveRankMapper("Wikidata")
+
+    async def gather(term, errors):
+        return list(CANDIDATES)
+
+    mapper.retriever.gather_candidates = gather
+    return mapper
+
+
+def test_best_skos_class_wins(mapper, monkeypatch):
+    ranking = CandidateRanking(ranking=[
+        RankedCandidate(id="Q1", skos="related", explanation="loosely"),
+        RankedCandidate(id="Q8495", skos="exact", explanation="same concept"),
+    ])
+    monkeypatch.setattr(retrieve_rank, "_get_ranking_llm", lambda: FakeRankingLLM(ranking))
+    row = mapper.map("milk", "white liquid")
+    assert row["IRI"] == "https://www.wikidata.org/wiki/Q8495"
+    assert row["SKOS"] == "exact"
+    assert row["stats"] == {"llm_calls": 1, "tokens": 100}
+    assert "status" not in row
+
+
+def test_unknown_ids_and_none_are_ignored(mapper, monkeypatch):
+    ranking = CandidateRanking(ranking=[
+        RankedCandidate(id="Q999", skos="exact", explanation="not a candidate"),
+        RankedCandidate(id="Q1", skos="none", explanation="different"),
+    ])
+    monkeypatch.setattr(retrieve_rank, "_get_ranking_llm", lambda: FakeRankingLLM(ranking))
+    row = mapper.map("milk", "white liquid")
+    assert row["IRI"] == "No wiki match"
+    assert "status" not in row
+
+
+def test_unparsable_ranking_is_an_error(mapper, monkeypatch):
+    monkeypatch.setattr(retrieve_rank, "_get_ranking_llm", lambda: FakeRankingLLM(None, "invalid json"))
+    row = mapper.map("milk", "white liquid")
+    assert row["status"] == "error"
+    assert row["IRI"] == "No wiki match"
+    assert "invalid json" in row["explanation"]
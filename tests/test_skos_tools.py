@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from general_tools import skos_tools
+from general_tools.training_examples import TrainingExamples
+
+
+class RateLimitError(Exception):
+    pass
+
+
+class _Answer:
+    def __init__(self, exact=False, close=False, related=False, explanation=""):
+        self.exact_match = exact
+        self.close_match = close
+        self.related_match = related
+        self.explanation = explanation
+
+
+class _FakeLLM:
+    """ainvoke raises the queued exceptions first, then answers."""
+
+    def __init__(self, errors=(), answer=None):
+        self.errors = list(errors)
+        self.answer = answer or _Answer(exact=True, explanation="same concept")
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.answer
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    slept = []
+
+    async def fake_sleep(seconds):
+        slept.append(seconds)
+
+    monkeypatch.setattr(skos_tools.asyncio, "sleep", fake_sleep)
+    monkeypatch.setattr(skos_tools.random, "random", lambda: 0.0)
+    return slept
+
+
+def test_backoff_doubles_on_rate_limit_and_halves_on_success():
+    backoff = skos_tools.AdaptiveBackoff(base_delay=1.0, max_delay=5.0)
+    assert [backoff.on_rate_limit() for _ in range(4)] == [1.0, 2.0, 4.0, 5.0]
+    backoff.on_success()
+    assert backoff.delay == 2.5
+    backoff.delay = 1.0
+    backoff.on_success()
+    assert backoff.delay == 0.0
+
+
+def test_rate_limit_retry_sleeps_once_per_error(monkeypatch, sleeps):
+    llm = _FakeLLM(errors=[RateLimitError("429"), RateLimitError("429")])
+    monkeypatch.setattr(skos_tools, "_get_structured_llm", lambda: llm)
+
+    result = asyncio.run(skos_tools.aclassify_skos_match("a", "def a", "b", "def b"))
+
+    assert result == {"mapping_type": "exact", "explanation": "same concept"}
+    assert llm.calls == 3
+    # one sleep per rate-limit error: 1 s, then 2 s
+    assert sleeps == [1.0, 2.0]
+
+
+def test_other_errors_are_raised_without_retry(monkeypatch, sleeps):
+    llm = _FakeLLM(errors=[ValueError("401 invalid api key")])
+    monkeypatch.setattr(skos_tools, "_get_structured_llm", lambda: llm)
+
+    with pytest.raises(ValueError):
+        asyncio.run(skos_tools.aclassify_skos_match("a", "", "b", ""))
+    assert llm.calls == 1
+    assert sleeps == []
+
+
+def test_batch_keeps_order_and_reports_failures(monkeypatch):
+    async def fake_classify(term_a, gen_def, term_b, onto_def, backoff=None, max_retries=5):
+        if term_a == "bad":
+            raise RuntimeError("boom")
+        return {"mapping_type": "close", "explanation": term_a}
+
+    monkeypatch.setattr(skos_tools, "aclassify_skos_match", fake_classify)
+    seen = []
+    pairs = [{"term_a": "x"}, {"term_a": "bad"}, {"term_a": "y"}]
+
+    results = skos_tools.classify_skos_matches(pairs, max_concurrency=2, on_result=lambda i, r: seen.append(i))
+
+    assert [r["explanation"] for r in results] == ["x", "ERROR: boom", "y"]
+    assert results[1]["mapping_type"] == "none"
+    assert sorted(seen) == [0, 1, 2]
+
+
+def test_former_module_names_stay_importable(monkeypatch):
+    monkeypatch.setattr(skos_tools, "training_examples", lambda: TrainingExamples("E", "C", "R"))
+
+    from general_tools.skos_tools import SKOSMatch, build_match_pairs, exact_text
+
+    assert set(SKOSMatch.model_fields) == {"exact_match", "close_match", "related_match", "explanation"}
+    assert "E" in SKOSMatch.model_fields["exact_match"].description
+    assert exact_text == "E"
+    assert callable(build_match_pairs)
@@ -0,0 +1,96 @@
+import json
+
+import pandas as pd
+import pytest
+
+from general_tools.term_io import (
+    ResultWriter, compact_results, done_marker, iter_term_chunks, merge_shards, read_done_rows, shard_file,
+)
+
+
+def test_chunks_keep_input_positions(tmp_path):
+    path = tmp_path / "terms.csv"
+    pd.DataFrame({"Term": ["milk", "", "cheese", "whey"], "Definition": ["a", "b", None, "d"]}).to_csv(path, index=False)
+    chunks = list(iter_term_chunks(path, chunk_size=2))
+    assert chunks == [
+        [{"row": 0, "Term": "milk", "Definition": "a"}],
+        [{"row": 2, "Term": "cheese", "Definition": ""}, {"row": 3, "Term": "whey", "Definition": "d"}],
+    ]
+
+
+@pytest.mark.parametrize("suffix", [".xlsx", ".jsonl"])
+def test_other_input_formats(tmp_path, suffix):
+    df = pd.DataFrame({"Term": ["milk", "cheese"], "Definition": ["a", "b"]})
+    path = tmp_path / f"terms{suffix}"
+    if suffix == ".xlsx":
+        df.to_excel(path, index=False)
+    else:
+        df.to_json(path, orient="records", lines=True)
+    rows = [rec for chunk in iter_term_chunks(path, chunk_size=1) for rec in chunk]
+    assert [(r["row"], r["Term"]) for r in rows] == [(0, "milk"), (1, "cheese")]
+
+
+def test_missing_columns_and_formats_are_rejected(tmp_path):
+    path = tmp_path / "terms.csv"
+    pd.DataFrame({"Term": ["milk"]}).to_csv(path, index=False)
+    with pytest.raises(ValueError, match="Definition"):
+        list(iter_term_chunks(path))
+    with pytest.raises(ValueError, match="Unsupported input format"):
+        list(iter_term_chunks(tmp_path / "terms.txt"))
+    with pytest.raises(ValueError, match="Unsupported output format"):
+        ResultWriter(tmp_path / "out.xlsx")
+
+
+@pytest.mark.parametrize("suffix", [".jsonl", ".csv"])
+def test_resume_reads_back_written_rows(tmp_path, suffix):
+    out = tmp_path / f"out{suffix}"
+    with ResultWriter(out) as writer:
+        writer.write({"row": 3, "Term": "milk", "IRI": "x"})
+    with ResultWriter(out, append=True) as writer:
+        writer.write({"row": 5, "Term": "whey", "IRI": "y"})
+    if suffix == ".jsonl":
+        with open(out, "a", encoding="utf-8") as fh:
+            fh.write('{"row": 7, "Te')  # cut off by a crash
+    else:
+        assert out.read_text(encoding="utf-8").count("row,Term") == 1
+    assert read_done_rows(out) == {3, 5}
+    assert read_done_rows(tmp_path / "missing.jsonl") == set()
+
+
+@pytest.mark.parametrize("suffix", [".jsonl", ".csv"])
+def test_compact_results_drops_failed_rows_and_restores_order(tmp_path, suffix):
+    out = tmp_path / f"out{suffix}"
+    with ResultWriter(out) as writer:
+        for row, status in [(0, "ok"), (1, "error"), (2, "error"), (4, "ok")]:
+            writer.write({"row": row, "Term": f"t{row}", "Status": status})
+    assert read_done_rows(out) == {0, 4}
+    # a resumed run appended a retry of row 1 and the new row 3
+    with ResultWriter(out, append=True) as writer:
+        writer.write({"row": 1, "Term": "t1", "Status": "ok"})
+        writer.write({"row": 3, "Term": "t3", "Status": "error"})
+
+    assert compact_results(out, drop_errors=False) == {"rows": 5, "errors": 2}
+    assert [(r["row"], r["Status"]) for r in _results(out)] == [
+        (0, "ok"), (1, "ok"), (2, "error"), (3, "error"), (4, "ok")]
+    assert compact_results(out) == {"rows": 3, "errors": 2}
+    assert [r["row"] for r in _results(out)] == [0, 1, 4]
+    assert compact_results(tmp_path / "missing.jsonl") == {"rows": 0, "errors": 0}
+
+
+def _results(path):
+    if path.suffix == ".csv":
+        return [{**rec, "row": int(rec["row"])} for rec in pd.read_csv(path, dtype=str).to_dict("records")]
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_merge_shards_orders_and_dedupes(tmp_path):
+    for index, rows in [(0, [0, 2, 2, 5]), (1, [1, 3, 4])]:
+        path = shard_file(tmp_path, index, 3)
+        with ResultWriter(path) as writer:
+            for row in rows:
+                writer.write({"row": row, "Term": f"t{row}"})
+        done_marker(path).write_text("{}", encoding="utf-8")
+    out = tmp_path / "merged.jsonl"
+    result = merge_shards(tmp_path, out)
+    assert [json.loads(line)["row"] for line in out.read_text(encoding="utf-8").splitlines()] == [0, 1, 2, 3, 4, 5]
+    assert result == {"rows": 6, "shards": 2, "missing": [2], "incomplete": []}
@@ -0,0 +1,75 @@
+import contextvars
+import inspect
+from concurrent.futures import ThreadPoolExecutor
+
+from general_tools.tool_memo import ALREADY_CHECKED_NOTE, memoize_tool, tool_memo_scope
+
+
+def _counting_tool():
+    calls = []
+
+    def lookup(q: str, lang: str = "en") -> dict:
+        """Look something up."""
+        calls.append(q)
+        return {"id": q}
+
+    return lookup, calls
+
+
+def test_outside_a_scope_every_call_runs():
+    lookup, calls = _counting_tool()
+    memo = memoize_tool(lookup)
+    assert memo("Q1") == {"id": "Q1"}
+    assert memo("Q1") == {"id": "Q1"}
+    assert calls == ["Q1", "Q1"]
+
+
+def test_identical_call_in_a_scope_is_served_with_a_note():
+    lookup, calls = _counting_tool()
+    memo = memoize_tool(lookup)
+    with tool_memo_scope("test") as run:
+        assert memo("Q1") == {"id": "Q1"}
+        assert memo("Q1") == {"id": "Q1", "note": ALREADY_CHECKED_NOTE}
+        assert memo("Q1", lang="de") == {"id": "Q1"}
+    assert calls == ["Q1", "Q1"]
+    assert run["duplicates"] == {"lookup": 1}
+
+
+def test_scopes_do_not_share_results():
+    lookup, calls = _counting_tool()
+    memo = memoize_tool(lookup)
+    for _ in range(2):
+        with tool_memo_scope():
+            memo("Q1")
+    assert calls == ["Q1", "Q1"]
+
+
+def test_non_dict_results_are_wrapped():
+    memo = memoize_tool(lambda term: ("http://x/1", "exact"))
+    with tool_memo_scope():
+        memo("milk")
+        assert memo("milk") == {"result": ("http://x/1", "exact"), "note": ALREADY_CHECKED_NOTE}
+    text = memoize_tool(lambda term: "found")
+    with tool_memo_scope():
+        text("milk")
+        assert text("milk").endswith(ALREADY_CHECKED_NOTE)
+
+
+def test_worker_threads_with_copied_context_share_the_cache():
+    lookup, calls = _counting_tool()
+    memo = memoize_tool(lookup)
+    with tool_memo_scope() as run:
+        with ThreadPoolExecutor(2) as pool:
+            for _ in range(3):
+                pool.submit(contextvars.copy_context().run, memo, "Q7").result()
+    assert calls == ["Q7"]
+    assert run["duplicates"] == {"lookup": 2}
+
+
+def test_wrapping_keeps_the_tool_schema():
+    lookup, _ = _counting_tool()
+    memo = memoize_tool(lookup)
+    assert memo.__name__ == "lookup"
+    assert memo.__doc__ == "Look something up."
+    assert inspect.signature(memo) == inspect.signature(lookup)
+    assert memoize_tool(memo) is memo
@@ -0,0 +1,69 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from general_tools import training_examples as te
+from general_tools.app_paths import cache_dir, cache_file
+from general_tools.job_store import JobStore
+from general_tools.result_cache import ResultCache
+
+
+@pytest.fixture
+def sheet(tmp_path):
+    path = tmp_path / "training.xlsx"
+    pd.DataFrame([
+        {"term": "milk", "definition": "white fluid", "exactMatch_label": "Milk", "exactMatch_description": "a liquid",
+         "closeMatch_label": None, "closeMatch_description": None,
+         "relatedMatch_label": "dairy", "relatedMatch_description": "milk products"},
+    ]).to_excel(path, index=False)
+    te._loaded.clear()
+    yield path
+    te._loaded.clear()
+
+
+def test_local_files_go_to_the_user_cache_dir(tmp_path, monkeypatch):
+    monkeypatch.delenv("LLM4LDRECO_CACHE_DIR", raising=False)
+    monkeypatch.delenv("MAPPING_JOBS_DB", raising=False)
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "xdg"))
+    monkeypatch.chdir(tmp_path)
+    if os.name != "nt":
+        assert cache_dir() == tmp_path / "xdg" / "llm4ldreco"
+    assert JobStore().path == str(cache_dir() / "mapping_jobs.sqlite3")
+
+    monkeypatch.setenv("LLM4LDRECO_CACHE_DIR", str(tmp_path / "state"))
+    monkeypatch.setenv("MAPPING_CACHE_DB", str(tmp_path / "other.sqlite3"))
+    assert ResultCache().path == str(tmp_path / "other.sqlite3")
+    assert cache_file("x.json", "UNSET_TEST_VAR") == tmp_path / "state" / "x.json"
+    assert not (tmp_path / "mapping_jobs.sqlite3").exists()
+
+
+def test_blocks_are_rendered_once_and_reused_from_the_json_cache(sheet, tmp_path, monkeypatch):
+    cache = tmp_path / "examples.json"
+    ex = te.training_examples(sheet, cache)
+    assert "1) Term A: milk" in ex.exact and "Term B: Milk" in ex.exact
+    assert "Term A" not in ex.close
+    assert "Term B: dairy" in ex.related
+    assert json.loads(cache.read_text(encoding="utf-8"))["blocks"]["exact"] == ex.exact
+
+    # a new process reads the JSON file and does not need pandas
+    te._loaded.clear()
+    monkeypatch.setattr(te, "_render", lambda path: pytest.fail("spreadsheet parsed again"))
+    assert te.training_examples(sheet, cache) == ex
+
+
+def test_changed_spreadsheet_is_rendered_again(sheet, tmp_path):
+    cache = tmp_path / "examples.json"
+    te.training_examples(sheet, cache)
+    pd.DataFrame([{"term": "egg", "definition": "d", "exactMatch_label": "Egg", "exactMatch_description": "e",
+                   "closeMatch_label": None, "closeMatch_description": None,
+                   "relatedMatch_label": None, "relatedMatch_description": None}]).to_excel(sheet, index=False)
+    os.utime(sheet, (1, 1))
+    assert "Term A: egg" in te.training_examples(sheet, cache).exact
+
+
+def test_env_var_moves_the_json_cache(sheet, tmp_path, monkeypatch):
+    monkeypatch.setenv("TRAINING_EXAMPLES_CACHE", str(tmp_path / "moved.json"))
+    te.training_examples(sheet)
+    assert (tmp_path / "moved.json").exists()
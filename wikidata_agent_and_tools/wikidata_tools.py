@@ -13,6 +13,8 @@ import re
 import datetime
 import requests
 
+from general_tools.http_client import http_get
+
 # Wikidata API base URL
 WIKIDATA_API_URL = "https://www.wikidata.org/w/api.php"
 
@@ -75,7 +77,7 @@ def _get_entities(ids: Iterable[str], language: str = "en") -> Dict[str, Any]:
         "languages": language,
         "props": "labels|descriptions|claims",
     }
-    response = requests.get(
+    response = http_get(
         WIKIDATA_API_URL,
         params=params,
         headers=HEADERS,  # <-- important for avoiding 403
@@ -101,7 +103,7 @@ def _get_entity_labels(ids: Iterable[str], language: str = "en") -> Dict[str, st
         "languages": language,
         "props": "labels",
     }
-    response = requests.get(
+    response = http_get(
         WIKIDATA_API_URL,
         params=params,
         headers=HEADERS,  # <-- important for avoiding 403
@@ -153,6 +155,57 @@ def get_wikidata_definition(
     referenced_item_ids = _collect_referenced_item_ids({entity_id: entity})
     referenced_labels = _get_entity_labels(referenced_item_ids, language=language)
 
+    return _build_definition(entity_id, entity, referenced_labels, language=language)
+
+
+def get_wikidata_definitions(
+    entity_ids: Iterable[str],
+    language: str = "en",
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Bulk version of get_wikidata_definition for many Q-IDs at once.
+
+    Uses one wbgetentities call per 50 entities plus one label call per 50
+    referenced items, instead of two calls per entity. Returns
+    { "Q42": <same dict as get_wikidata_definition>, ... }; IDs that cannot be
+    retrieved are left out.
+    """
+    ids_list = [i for i in dict.fromkeys(entity_ids) if i]
+    chunk_size = 50
+
+    entities: Dict[str, Any] = {}
+    for i in range(0, len(ids_list), chunk_size):
+        entities.update(_get_entities(ids_list[i : i + chunk_size], language=language))
+
+    referenced_item_ids = _collect_referenced_item_ids(entities)
+    # entities may reference each other; their labels are already known
+    referenced_labels: Dict[str, str] = {
+        eid: e["labels"][language]["value"]
+        for eid, e in entities.items()
+        if e.get("labels", {}).get(language, {}).get("value")
+    }
+    for i in range(0, len(referenced_item_ids), chunk_size):
+        chunk = referenced_item_ids[i : i + chunk_size]
+        referenced_labels.update(_get_entity_labels(chunk, language=language))
+
+    return {
+        eid: _build_definition(eid, entities[eid], referenced_labels, language=language)
+        for eid in ids_list
+        if eid in entities and "missing" not in entities[eid]
+    }
+
+
+def _build_definition(
+    entity_id: str,
+    entity: Dict[str, Any],
+    referenced_labels: Dict[str, str],
+    language: str = "en",
+) -> Dict[str, Any]:
+    """
+    Build the enriched definition dict for one wbgetentities entity
+    (shared by get_wikidata_definition and get_wikidata_definitions).
+    """
+
     def _value_to_string(datavalue: Dict[str, Any]) -> str:
         """
         Convert a Wikidata datavalue into a human-readable string, using
@@ -337,6 +390,14 @@ def WikidataEntityDetails (q: str):
      return resolved
 
 
+def wikidata_entities_details(qids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    WikidataEntityDetails for many Q-IDs at once: {"Q42": {...}, ...}.
+    """
+    raw = get_wikidata_definitions(qids)
+    return {qid: resolve_qids_and_pids_in_definition(item) for qid, item in raw.items()}
+
+
 def get_nested_value(o: dict, path: list) -> any:
     """
     Safely walk through nested dicts and lists by keys/indexes.
@@ -395,7 +456,7 @@ def WikidataEntitySearch(
         "format": "json",
     }
 
-    response = requests.get(url, headers=headers, params=params)
+    response = http_get(url, headers=headers, params=params)
 
     if response.status_code == 200:
         title = get_nested_value(response.json(), ["query", "search", 0, "title"])
@@ -405,3 +466,39 @@ def WikidataEntitySearch(
         return title.split(":")[-1]
     else:
         return "Sorry, I got an error. Please try again."
+
+
+def search_wikidata_candidates(
+    search: str,
+    limit: int = 5,
+    url: str = "https://www.wikidata.org/w/api.php",
+    user_agent_header: str = 'DeepWikidataMapper/0.1',
+) -> List[str]:
+    """
+    Same search as WikidataEntitySearch (items only), but returns up to
+    `limit` Q-IDs in ranking order instead of only the top hit.
+
+    Used by the non-agent mapping modes, which need several candidates at
+    once. Returns an empty list if nothing was found; a failed request raises
+    (requests.HTTPError etc.), so callers can tell it from "no hits".
+    """
+    headers = {"Accept": "application/json"}
+    if user_agent_header is not None:
+        headers["User-Agent"] = user_agent_header
+
+    params = {
+        "action": "query",
+        "list": "search",
+        "srsearch": search,
+        "srnamespace": 0,
+        "srlimit": limit,
+        "srqiprofile": "classic_noboostlinks",
+        "srwhat": "text",
+        "format": "json",
+    }
+
+    response = http_get(url, headers=headers, params=params, timeout=15)
+    response.raise_for_status()
+
+    hits = get_nested_value(response.json(), ["query", "search"]) or []
+    return [h["title"].split(":")[-1] for h in hits if isinstance(h, dict) and h.get("title")]